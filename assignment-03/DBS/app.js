@@ -1,6 +1,6 @@
 /* ===== CONFIGURATION ===== */
 const MAX_READINGS = 20;
-const POLL_INTERVAL_MS = 2000;
+const CHART_MAX_POINTS = 200; // Server-side LTTB downsampling target for the chart
 
 // Chart visual constants
 const CHART_POINT_RADIUS = 2;
@@ -17,14 +17,18 @@ const State = {
 const API_BASE = "http://localhost:8000/api/v1";
 const ENDPOINT_READINGS = `${API_BASE}/levels`;
 const ENDPOINT_CHANGE = `${API_BASE}/change`;
-const ENDPOINT_MODE = `${API_BASE}/mode`;
-const ENDPOINT_VALVE = `${API_BASE}/valve`;
+const ENDPOINT_STATUS = `${API_BASE}/status`;
 const ENDPOINT_POT = `${API_BASE}/pot`;
+const ENDPOINT_STREAM = `${API_BASE}/stream`;
 const WHO = "dbs"
 
 /* ===== STATE ===== */
 let autoRefreshEnabled = true;
-let refreshIntervalId = null;
+let eventSource = null;
+let streamLost = false;
+let lastSeq = null;         // Sequence number of the last reading shown (see /status)
+let currentMode = State.NOT_AVAILABLE;
+let currentSubstate = null;
 let userInteractingWithSlider = false;
 
 /* ===== DATA STORAGE ===== */
@@ -172,8 +176,9 @@ const chart = new Chart(ctx, {
 
 /* ===== API FUNCTIONS ===== */
 /**
- * Fetches latest sensor readings and system status from the backend.
- * Updates the chart with new data and refreshes UI elements (system state, valve opening).
+ * Reloads the whole chart and the system status from the backend.
+ * Used on first load and when the readings since the last one shown are no
+ * longer available (see refreshStatus).
  * Handles errors gracefully by displaying NOT_AVAILABLE state.
  * 
  * @async
@@ -181,46 +186,177 @@ const chart = new Chart(ctx, {
  */
 async function fetchLatest() {
     try {
-        const response = await fetch(`${ENDPOINT_READINGS}`);
+        // Status first: readings arriving meanwhile are in the chart and
+        // re-sent by the next delta, which only duplicates a point
+        const statusResponse = await fetch(ENDPOINT_STATUS);
+        if (!statusResponse.ok) throw new Error(statusResponse.status);
+        const status = await statusResponse.json();
+
+        const response = await fetch(`${ENDPOINT_READINGS}?points=${CHART_MAX_POINTS}&downsample=lttb`);
         if (!response.ok) throw new Error(response.status);
 
         const data = await response.json();
 
         labels.length = 0;
         values.length = 0;
+        appendReadings(data["levels"]);
 
-        data["levels"].forEach(reading => {
-            labels.push(new Date(reading.timestamp));
-            values.push(reading.water_level);
-        });
-
-        chart.update();
+        lastSeq = status.seq;
+        showStatus(status);
+        updateLastUpdateTimestamp();
 
-        const modeResponse = await fetch(ENDPOINT_MODE);
-        const modeData = await modeResponse.json();
-        const currentState = modeData.mode ?? State.NOT_AVAILABLE;
+    } catch (error) {
+        console.error("Error fetching data:", error);
+        showUnavailable("Update failed");
+    }
+}
 
-        const valveResponse = await fetch(ENDPOINT_VALVE);
-        const valveData = await valveResponse.json();
-        const currentValve = valveData.valve;
+/**
+ * Refreshes the system status in a single request, adding to the chart only
+ * the readings received after the last one shown (`/status?since=`).
+ * Falls back to a full reload when that delta is not available.
+ * 
+ * @async
+ * @returns {Promise<void>}
+ */
+async function refreshStatus() {
+    if (lastSeq === null) return fetchLatest();
+    try {
+        const response = await fetch(`${ENDPOINT_STATUS}?since=${lastSeq}`);
+        if (!response.ok) throw new Error(response.status);
 
-        systemState.textContent = currentState;
-        valveOpening.textContent = currentValve !== undefined ? `${currentValve}%` : "--";
+        const status = await response.json();
+        if (!status.complete) return fetchLatest();
 
-        updateSystemStateBadge(currentState);
-        updateManualControls(currentState);
+        appendReadings(status.levels);
+        lastSeq = status.seq;
+        showStatus(status);
         updateLastUpdateTimestamp();
 
     } catch (error) {
-        console.error("Error fetching data:", error);
-        systemState.textContent = State.NOT_AVAILABLE;
-        valveOpening.textContent = "--";
-        updateSystemStateBadge(State.NOT_AVAILABLE);
-        updateManualControls(State.NOT_AVAILABLE);
-        lastUpdate.textContent = "Update failed";
+        console.error("Error fetching status:", error);
+        showUnavailable("Update failed");
     }
 }
 
+/**
+ * Appends readings to the chart, dropping the oldest points beyond CHART_MAX_POINTS.
+ *
+ * @param {Array} readings - Readings ({water_level, timestamp}), oldest first
+ */
+function appendReadings(readings) {
+    readings.forEach(reading => {
+        labels.push(new Date(reading.timestamp));
+        values.push(reading.water_level);
+    });
+    const excess = labels.length - CHART_MAX_POINTS;
+    if (excess > 0) {
+        labels.splice(0, excess);
+        values.splice(0, excess);
+    }
+    chart.update();
+}
+
+/**
+ * Opens the Server-Sent Events stream of the backend.
+ * Mode, valve and new level readings are pushed as they happen, instead of
+ * being polled. The browser reconnects by itself after errors; on reconnect
+ * the chart is reloaded, since readings may have been missed meanwhile.
+ */
+function openStream() {
+    if (eventSource) return;
+    eventSource = new EventSource(ENDPOINT_STREAM);
+
+    eventSource.onopen = () => {
+        if (streamLost) {
+            streamLost = false;
+            refreshStatus();
+        }
+    };
+
+    eventSource.onerror = () => {
+        streamLost = true;
+        showUnavailable("Connection lost, retrying...");
+    };
+
+    eventSource.addEventListener("mode", (event) => {
+        showMode(JSON.parse(event.data).mode ?? State.NOT_AVAILABLE, currentSubstate);
+        updateLastUpdateTimestamp();
+    });
+
+    eventSource.addEventListener("substate", (event) => {
+        showMode(currentMode, JSON.parse(event.data).substate);
+    });
+
+    eventSource.addEventListener("valve", (event) => {
+        showValve(JSON.parse(event.data).valve);
+        updateLastUpdateTimestamp();
+    });
+
+    eventSource.addEventListener("levels", (event) => {
+        const data = JSON.parse(event.data);
+        appendReadings(data.levels);
+        lastSeq = data.seq;
+        updateLastUpdateTimestamp();
+    });
+}
+
+/**
+ * Closes the Server-Sent Events stream.
+ */
+function closeStream() {
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+        streamLost = false;
+    }
+}
+
+/**
+ * Shows the system mode (with the substate in AUTOMATIC) and enables/disables
+ * the manual controls accordingly.
+ *
+ * @param {string} mode - Current system mode from State enum
+ * @param {string|null} substate - Current AUTOMATIC substate
+ */
+function showMode(mode, substate = null) {
+    currentMode = mode;
+    currentSubstate = substate;
+    systemState.textContent = (mode === State.AUTOMATIC && substate) ? `${mode} (${substate})` : mode;
+    updateSystemStateBadge(mode);
+    updateManualControls(mode);
+}
+
+/**
+ * Shows a `/status` snapshot: mode, substate and valve opening.
+ *
+ * @param {Object} status - Response of the status endpoint
+ */
+function showStatus(status) {
+    showMode(status.mode ?? State.NOT_AVAILABLE, status.substate);
+    showValve(status.valve);
+}
+
+/**
+ * Shows the valve opening percentage ("--" if unknown).
+ *
+ * @param {number|undefined} opening - Valve opening (0-100)
+ */
+function showValve(opening) {
+    valveOpening.textContent = opening !== undefined && opening !== null ? `${opening}%` : "--";
+}
+
+/**
+ * Shows the NOT_AVAILABLE state when the backend cannot be reached.
+ *
+ * @param {string} message - Text for the "last update" field
+ */
+function showUnavailable(message) {
+    showMode(State.NOT_AVAILABLE);
+    showValve(undefined);
+    lastUpdate.textContent = message;
+}
+
 /**
  * Updates the visual appearance of the system state badge based on current mode.
  * Applies Bootstrap color classes: success (automatic), warning (manual), 
@@ -272,7 +408,7 @@ async function switchMode() {
     try {
         const response = await postJson(ENDPOINT_CHANGE, { btn: true });
         if (!response.ok) throw new Error("Failed to switch mode");
-        await fetchLatest();
+        await refreshStatus();
         showToast("Mode Changed", `Switched mode`, 'success');
     } catch (error) {
         console.error("Error switching mode:", error);
@@ -314,7 +450,7 @@ async function sendPot() {
 }
 
 /**
- * Toggles automatic data refresh on/off.
+ * Toggles live updates on/off.
  */
 function toggleAutoRefresh() {
     autoRefreshEnabled = !autoRefreshEnabled;
@@ -331,21 +467,18 @@ function toggleAutoRefresh() {
 }
 
 /**
- * Starts the automatic refresh interval.
+ * Starts live updates, first catching up on the readings missed while paused.
  */
 function startAutoRefresh() {
-    if (refreshIntervalId) return;
-    refreshIntervalId = setInterval(fetchLatest, POLL_INTERVAL_MS);
+    refreshStatus();
+    openStream();
 }
 
 /**
- * Stops the automatic refresh interval.
+ * Stops live updates.
  */
 function stopAutoRefresh() {
-    if (refreshIntervalId) {
-        clearInterval(refreshIntervalId);
-        refreshIntervalId = null;
-    }
+    closeStream();
 }
 
 /* ===== EVENT HANDLERS ===== */
@@ -386,7 +519,7 @@ const tooltipList = [...tooltipTriggerList].map(tooltipTriggerEl => new bootstra
 // Show loading overlay on first load
 loadingOverlay.classList.add('show');
 
-startAutoRefresh();
 fetchLatest().finally(() => {
     loadingOverlay.classList.remove('show');
-});
\ No newline at end of file
+});
+openStream();
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+Level ingestion benchmark: one reading per message vs batched payloads.
+
+Feeds the same readings to a TankRegistry either as single-reading MQTT
+payloads ({"reading": {...}}) or as array payloads of BATCH readings, going
+through JSON decoding, the MQTT-to-bus mapping and the tank FSM, and reports
+readings/second for each.
+
+Usage (from the cus folder):
+    python benchmarks/bench_batch_ingestion.py [-n READINGS] [-b BATCH]
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from config import LEVEL_IN_TOPIC  # noqa: E402
+from services.event_bus import EventBus  # noqa: E402
+from services.mqtt_service import MQTTService  # noqa: E402
+from services.tank_registry import TankRegistry  # noqa: E402
+from utils.topic_matcher import SINGLE_LEVEL, join_topic  # noqa: E402
+
+
+class _Message:
+    def __init__(self, topic: str, payload: bytes):
+        self.topic = topic
+        self.payload = payload
+
+
+class _InlineIngress:
+    """Publishes straight on the bus instead of handing off to an event loop."""
+
+    def __init__(self, bus: EventBus):
+        self.publish = bus.publish
+
+
+def run(messages) -> float:
+    bus = EventBus()
+    registry = TankRegistry(bus)
+    registry.subscribe()
+    mqtt = MQTTService("localhost", 1883, bus)
+    mqtt.configure_messaging(incoming={"tank/+/level": join_topic(LEVEL_IN_TOPIC, SINGLE_LEVEL)})
+    mqtt._ingress = _InlineIngress(bus)
+
+    start = time.perf_counter()
+    for message in messages:
+        mqtt._on_mqtt_message(None, None, message)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--readings", type=int, default=100_000)
+    parser.add_argument("-b", "--batch", type=int, default=100)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    readings = [{"level": 0.1 + (i % 50) * 0.01, "timestamp": i * 100} for i in range(args.readings)]
+    single = [_Message("tank/t1/level", json.dumps({"reading": r}).encode()) for r in readings]
+    batched = [
+        _Message("tank/t1/level", json.dumps(readings[i:i + args.batch]).encode())
+        for i in range(0, len(readings), args.batch)
+    ]
+
+    for label, messages in (("single", single), (f"batch of {args.batch}", batched)):
+        elapsed = run(messages)
+        print(f"{label:>14}: {args.readings / elapsed:>12,.0f} readings/s ({len(messages)} messages)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Payload codec benchmark.
+
+Measures encodes/decodes per second and the payload size of a TMS level
+message ({"reading": {level, timestamp}}, validated against TankLevelPayload
+on decode), of a batch of readings and of a WCS serial state, for each
+codec of models.codecs (cbor only if cbor2 is installed).
+
+Usage (from the cus folder):
+    python benchmarks/bench_codecs.py [-n MESSAGES] [--batch READINGS]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from models.codecs import CODEC_NAMES, Codec, level_codec, serial_codecs  # noqa: E402
+
+
+def run(codec: Codec, message: Any, messages: int) -> Tuple[float, float, int]:
+    """(encodes/s, decodes/s, payload bytes)"""
+    start = time.perf_counter()
+    for _ in range(messages):
+        payload = codec.encode(message)
+    encode_rate = messages / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(messages):
+        codec.decode(payload)
+    decode_rate = messages / (time.perf_counter() - start)
+    return encode_rate, decode_rate, len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--messages", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=32, help="Readings of the batch message")
+    args = parser.parse_args()
+
+    reading = {"level": 42.5, "timestamp": 1_234_567}
+    cases = (
+        ("level", lambda name: level_codec(name), {"reading": reading}),
+        (f"batch x{args.batch}", lambda name: level_codec(name),
+         [{"level": 40.0 + i / 8, "timestamp": 1_234_567 + i * 100} for i in range(args.batch)]),
+        ("serial state", lambda name: serial_codecs(name)[1], {"mode": "AUTOMATIC", "valve": 50.0}),
+    )
+    print(f"{'message':<14} {'codec':<7} {'encode/s':>12} {'decode/s':>12} {'bytes':>6}")
+    for label, factory, message in cases:
+        for name in CODEC_NAMES:
+            try:
+                codec = factory(name)
+            except ImportError:
+                print(f"{label:<14} {name:<7} skipped, cbor2 is not installed")
+                continue
+            encode_rate, decode_rate, size = run(codec, message, args.messages)
+            print(f"{label:<14} {name:<7} {encode_rate:>12,.0f} {decode_rate:>12,.0f} {size:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+EventBus throughput benchmark.
+
+Measures messages/second for a level reading fanned out to three
+subscribers (TankService, HttpService and an MQTT forwarder), comparing
+the previous pypubsub-based wrapper ("before") with the native
+EventBus engine ("after").
+
+Usage (from the cus folder):
+    python benchmarks/bench_event_bus.py [-n MESSAGES]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services.event_bus import EventBus  # noqa: E402
+
+TOPIC = "level_in"
+FANOUT = 3
+
+
+class LegacyEventBus:
+    """Copy of the previous pypubsub wrapper, kept only for comparison."""
+
+    def __init__(self):
+        from pubsub import pub
+        self._engine = pub
+
+    def publish(self, topic: str, **kwargs):
+        try:
+            self._engine.sendMessage(topic, **kwargs)
+            _ = f"[Bus] Published to {topic} with {kwargs}"
+        except Exception:
+            pass
+
+    def subscribe(self, topic: str, callback):
+        self._engine.subscribe(callback, topic)
+
+
+class Sink:
+    """Minimal subscriber with the same signature as the real handlers."""
+
+    def __init__(self):
+        self.count = 0
+
+    def on_reading(self, reading):
+        self.count += 1
+
+
+def run(bus, messages: int) -> float:
+    sinks = [Sink() for _ in range(FANOUT)]
+    for sink in sinks:
+        bus.subscribe(TOPIC, sink.on_reading)
+
+    reading = {"level": 0.42, "timestamp": 123456}
+    start = time.perf_counter()
+    for _ in range(messages):
+        bus.publish(TOPIC, reading=reading)
+    elapsed = time.perf_counter() - start
+
+    assert all(sink.count == messages for sink in sinks)
+    return messages / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--messages", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"Publishing {args.messages} messages with fan-out {FANOUT}")
+    try:
+        before = run(LegacyEventBus(), args.messages)
+        print(f"before (pypubsub): {before:>12,.0f} msg/s")
+    except ImportError:
+        before = None
+        print("before (pypubsub): skipped, pypubsub is not installed")
+
+    after = run(EventBus(), args.messages)
+    print(f"after  (native):   {after:>12,.0f} msg/s")
+    if before:
+        print(f"speed-up:          {after / before:>12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+FSM evaluation benchmark.
+
+Times the AUTOMATIC substate step on the compiled transition table, one
+reading at a time (next_substate) and for a whole batch of tanks at once
+(evaluate_batch), then the full TankRegistry path for the same readings
+fed one bus event at a time versus through handle_levels.
+
+Usage (from the cus folder):
+    python benchmarks/bench_fsm.py [-t TANKS] [-r ROUNDS]
+"""
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from config import LEVEL_IN_TOPIC  # noqa: E402
+from core import transition_table as table  # noqa: E402
+from services.event_bus import EventBus  # noqa: E402
+from services.tank_registry import TankRegistry  # noqa: E402
+from services.tank_service import default_thresholds  # noqa: E402
+from utils.topic_matcher import join_topic  # noqa: E402
+
+
+def bench_table(tanks: int, rounds: int):
+    thresholds = default_thresholds()
+    rng = np.random.default_rng(0)
+    levels = rng.uniform(0.0, 0.8, size=(rounds, tanks))
+    substates = rng.integers(0, 4, size=tanks)
+    elapsed = rng.integers(0, 10_000, size=tanks)
+
+    start = time.perf_counter()
+    for row in levels.tolist():
+        for i, level in enumerate(row):
+            table.next_substate(int(substates[i]), level, int(elapsed[i]), thresholds)
+    scalar = tanks * rounds / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for row in levels:
+        table.evaluate_batch(substates, row, elapsed, thresholds.l1_threshold,
+                             thresholds.l2_threshold, thresholds.t1_duration * 1000)
+    batch = tanks * rounds / (time.perf_counter() - start)
+    return scalar, batch
+
+
+def bench_registry(tanks: int, rounds: int):
+    readings = [
+        (f"t{i}", {"level": 0.1 + ((i + r) % 7) * 0.1, "timestamp": r})
+        for r in range(rounds) for i in range(tanks)
+    ]
+    topics = {f"t{i}": join_topic(LEVEL_IN_TOPIC, f"t{i}") for i in range(tanks)}
+
+    bus = EventBus()
+    registry = TankRegistry(bus, max_tanks=tanks)
+    registry.subscribe()
+    start = time.perf_counter()
+    for tank_id, reading in readings:
+        bus.publish(topics[tank_id], reading=reading)
+    events = len(readings) / (time.perf_counter() - start)
+
+    registry = TankRegistry(EventBus(), max_tanks=tanks)
+    start = time.perf_counter()
+    registry.handle_levels(readings)
+    batched = len(readings) / (time.perf_counter() - start)
+    return events, batched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-t", "--tanks", type=int, default=10_000)
+    parser.add_argument("-r", "--rounds", type=int, default=10)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    scalar, batch = bench_table(args.tanks, args.rounds)
+    print(f"transition table, scalar : {scalar:>14,.0f} evaluations/s")
+    print(f"transition table, batch  : {batch:>14,.0f} evaluations/s")
+    events, batched = bench_registry(args.tanks, args.rounds)
+    print(f"registry, one event each : {events:>14,.0f} readings/s")
+    print(f"registry, handle_levels  : {batched:>14,.0f} readings/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+TankRegistry scaling benchmark.
+
+Registers 1 to 10,000 tanks on a single EventBus and feeds level readings
+round-robin through the per-tank topics ("level_in/<id>"), reporting the
+readings/second handled by the controllers and the memory held per tank
+(FSM context, history ring buffer and analytics, measured with tracemalloc).
+Persistent stores are disabled to time the in-memory path only.
+
+Usage (from the cus folder):
+    python benchmarks/bench_tank_registry.py [-n READINGS]
+"""
+import argparse
+import logging
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from config import LEVEL_IN_TOPIC  # noqa: E402
+from services.event_bus import EventBus  # noqa: E402
+from services.tank_registry import TankRegistry  # noqa: E402
+from utils.topic_matcher import join_topic  # noqa: E402
+
+SIZES = (1, 10, 100, 1_000, 10_000)
+
+
+def run(tanks: int, readings: int):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    bus = EventBus()
+    registry = TankRegistry(bus, tanks={f"t{i}": {} for i in range(tanks)}, max_tanks=tanks)
+    registry.subscribe()
+    per_tank = (tracemalloc.get_traced_memory()[0] - before) / tanks
+    tracemalloc.stop()
+
+    topics = [join_topic(LEVEL_IN_TOPIC, f"t{i}") for i in range(tanks)]
+    # Warm up the routes and fill each tank's history once
+    for topic in topics:
+        bus.publish(topic, reading={"level": 0.1, "timestamp": 0})
+
+    start = time.perf_counter()
+    for i in range(readings):
+        bus.publish(topics[i % tanks], reading={"level": 0.1 + (i % 7) * 0.01, "timestamp": i})
+    elapsed = time.perf_counter() - start
+
+    assert len(registry) == tanks
+    return readings / elapsed, per_tank
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--readings", type=int, default=100_000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    for size in SIZES:
+        rate, per_tank = run(size, args.readings)
+        print(f"{size:>6} tanks: {rate:>10,.0f} readings/s  {per_tank / 1024:>8.1f} KiB/tank")
+
+
+if __name__ == "__main__":
+    main()
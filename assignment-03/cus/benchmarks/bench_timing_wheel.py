@@ -0,0 +1,66 @@
+"""
+Timer benchmark: hierarchical timing wheel vs asyncio's heap.
+
+With N timers already pending (one T2-like timer per tank), measures the
+cost of re-arming a timer (cancel + schedule), the operation the FSM does
+on every state change, for the TimingWheel and for loop.call_later.
+
+Usage (from the cus folder):
+    python benchmarks/bench_timing_wheel.py [-n OPERATIONS]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from utils.timing_wheel import TimingWheel  # noqa: E402
+
+SIZES = (1_000, 10_000, 100_000)
+
+
+def noop():
+    pass
+
+
+def bench_wheel(pending: int, operations: int) -> float:
+    wheel = TimingWheel(0)
+    timers = [wheel.schedule(random.randrange(1, 10_000), noop) for _ in range(pending)]
+    start = time.perf_counter()
+    for i in range(operations):
+        k = i % pending
+        wheel.cancel(timers[k])
+        timers[k] = wheel.schedule(random.randrange(1, 10_000), noop)
+    return operations / (time.perf_counter() - start)
+
+
+async def bench_heap(pending: int, operations: int) -> float:
+    loop = asyncio.get_running_loop()
+    handles = [loop.call_later(random.uniform(1, 10), noop) for _ in range(pending)]
+    start = time.perf_counter()
+    for i in range(operations):
+        k = i % pending
+        handles[k].cancel()
+        handles[k] = loop.call_later(random.uniform(1, 10), noop)
+    elapsed = time.perf_counter() - start
+    for handle in handles:
+        handle.cancel()
+    return operations / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--operations", type=int, default=200_000)
+    args = parser.parse_args()
+
+    for size in SIZES:
+        wheel = bench_wheel(size, args.operations)
+        heap = asyncio.run(bench_heap(size, args.operations))
+        print(f"{size:>7} pending: wheel {wheel:>12,.0f} re-arms/s   asyncio heap {heap:>12,.0f} re-arms/s")
+
+
+if __name__ == "__main__":
+    main()
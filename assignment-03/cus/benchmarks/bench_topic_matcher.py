@@ -0,0 +1,51 @@
+"""
+TopicMatcher lookup benchmark.
+
+Measures lookups/second of a concrete topic against a growing number of
+MQTT-style filters ("tank/<id>/level" plus "tank/+/level" and "site/#"),
+with the per-topic cache disabled to time the trie walk itself.
+
+Usage (from the cus folder):
+    python benchmarks/bench_topic_matcher.py [-n LOOKUPS]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from utils.topic_matcher import TopicMatcher  # noqa: E402
+
+SIZES = (10, 100, 1_000, 10_000)
+
+
+def run(filters: int, lookups: int) -> float:
+    matcher: TopicMatcher[int] = TopicMatcher()
+    for i in range(filters):
+        matcher.add(f"tank/t{i}/level", i)
+    matcher.add("tank/+/level", -1)
+    matcher.add("site/#", -2)
+
+    topics = [f"tank/t{i % filters}/level" for i in range(1024)]
+    start = time.perf_counter()
+    for i in range(lookups):
+        matcher._cache.clear()
+        matches = matcher.match(topics[i & 1023])
+    elapsed = time.perf_counter() - start
+
+    assert len(matches) == 2
+    return lookups / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--lookups", type=int, default=200_000)
+    args = parser.parse_args()
+
+    for size in SIZES:
+        print(f"{size:>6} filters: {run(size, args.lookups):>12,.0f} lookups/s")
+
+
+if __name__ == "__main__":
+    main()
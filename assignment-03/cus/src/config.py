@@ -3,6 +3,10 @@
 # === MQTT Configuration ===
 MQTT_BROKER_HOST = "broker.mqtt-dashboard.com"
 MQTT_BROKER_PORT = 1883
+MQTT_TRANSPORT = "asyncio"  # "asyncio": socket driven by the event loop, "thread": paho's network thread
+MQTT_COALESCE_WINDOW = 0.05  # Seconds: updates of an outgoing topic within the window are published once (latest wins)
+MQTT_RETAIN = True  # Outgoing states are retained by the broker for new subscribers
+MQTT_LEVEL_CODEC = "json"  # Format of the TMS level payloads: "json", "struct" (float32 level + uint32 ms) or "cbor"
 
 LEVEL_IN_TOPIC = "level_in"
 LEVELS_OUT_TOPIC = "level_out"
@@ -10,8 +14,11 @@ POT_TOPIC = "pot"
 MODE_TOPIC = "mode"
 MODE_CHANGE_TOPIC = "btn"
 OPENING_TOPIC = "valve"
+ANALYTICS_TOPIC = "analytics"
+SUBSTATE_TOPIC = "substate"
 
 TOLERANCE = 1 #tolerance for pot changes
+POT_COALESCE_WINDOW = 0.05  # Seconds: during a pot drag only the newest value is applied, once per window
 
 SERIAL_SEND_INTERVAL=0.5  # Time interval to send data to Arduino (in seconds)
 
@@ -19,6 +26,7 @@ SERIAL_SEND_INTERVAL=0.5  # Time interval to send data to Arduino (in seconds)
 # === Serial Configuration ===
 SERIAL_PORT = "/dev/cu.usbmodem1301"  # Change to "/dev/ttyUSB0" on Linux/Mac
 SERIAL_BAUDRATE = 115200
+SERIAL_CODEC = "json"  # Format of the WCS messages: "json" lines, or "struct"/"cbor" frames
 
 # === HTTP Configuration ===
 HTTP_HOST = "localhost"
@@ -27,17 +35,37 @@ ALLOWED_ORIGINS = ["http://127.0.0.1:8080", "http://localhost:8080"]
 ALLOWED_CREDENTIALS = True
 ALLOWED_METHODS = ["*"]
 ALLOWED_HEADERS = ["*"]
+# 0: serve the API on the control event loop; N > 0: serve it from N worker
+# processes reading a shared-memory snapshot (range queries are then unavailable)
+HTTP_WORKERS = 0
+SHARED_SNAPSHOT_TANKS = 64  # Tank slots of the shared snapshot (worker mode)
 
 # === System Configuration ===
 # Water Level Thresholds (in cm)
 L1_THRESHOLD = 0.30  # First warning level
 L2_THRESHOLD = 0.5  # Critical level
-MAX_READINGS = 100  # Maximum number of water level readings to store
+MAX_READINGS = 100  # Capacity of the in-memory level history ring buffer
+
+# Rolling analytics on the level stream
+ANALYTICS_WINDOWS = (10, 60)  # Rolling window sizes (samples), the first gives the rate of rise
+ANALYTICS_EWMA_ALPHA = 0.2    # EWMA smoothing factor
+
+# === Level Store Configuration ===
+LEVEL_STORE_DIR = "data/levels"  # Folder of the persistent level history (None to disable)
+LEVEL_STORE_SEGMENT_RECORDS = 1 << 20  # Readings per segment file (16 bytes each)
 
 # Timing Configuration (in seconds)
 T1_DURATION = 5.0   # Time to wait before opening valve at 50%
 T2_TIMEOUT = 10.0   # Timeout for considering system UNCONNECTED
 
+# === Multi-tank Configuration ===
+# Bus topics are qualified per tank: "<topic>/<tank_id>" (e.g. "level_in/default")
+DEFAULT_TANK_ID = "default"  # Tank of the legacy "tank/level" MQTT topic and of the serial WCS
+# Per-tank overrides of the thresholds above, e.g. {"t1": {"l1_threshold": 0.4}}
+TANKS = {DEFAULT_TANK_ID: {}}
+TANK_AUTO_REGISTER = True  # Create tanks on their first reading (with default thresholds)
+MAX_TANKS = 10000
+
 # === Logging Configuration ===
 LOG_LEVEL = "INFO"  # DEBUG, INFO, WARNING, ERROR, CRITICAL
 LOG_FILE = "logs/cus.log"
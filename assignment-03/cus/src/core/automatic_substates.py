@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Optional
-from models.schemas import AutomaticState as AutomaticStateEnum
+from typing import TYPE_CHECKING, Optional, Tuple
+from models.schemas import AutomaticState as AutomaticStateEnum, TankThresholds
+from core import transition_table as table
 from utils.logger import get_logger
 import config
 
@@ -9,129 +10,118 @@ if TYPE_CHECKING:
 
 logger = get_logger(__name__)
 
+# Timer armed in TRACKING_PRE_ALARM, handled by AutomaticSystemState.handle_timeout
+T1_TIMER = "t1"
+
 
 class AutomaticSubStateBase(ABC):
     """
     Base class for Automatic Sub-States.
-    Each substate manages its own transitions and valve commands.
+    Substates are stateless singletons (see SUBSTATES): their transitions are
+    looked up in the compiled table of core.transition_table by `code`.
     """
-    
+
+    code: int
+
     @abstractmethod
     def get_state_name(self) -> AutomaticStateEnum:
         """Return the enum representing this substate."""
         pass
-    
+
     @abstractmethod
     def get_valve_opening(self) -> float:
         """Return valve opening percentage for this substate."""
         pass
-    
-    @abstractmethod
+
     def evaluate_transition(
-        self, 
-        level: float, 
-        elapsed_ms: int
+        self,
+        level: float,
+        elapsed_ms: int,
+        thresholds: TankThresholds
     ) -> Optional['AutomaticSubStateBase']:
         """
         Evaluate if a transition should occur.
         Returns new substate if transition needed, None otherwise.
         """
-        pass
-    
+        target = table.next_substate(self.code, level, elapsed_ms, thresholds)
+        return SUBSTATES[target] if target != table.NO_TRANSITION else None
+
     def on_enter(self, controller: 'TankService'):
         """Called when entering this substate."""
         opening = self.get_valve_opening()
-        controller.bus.publish(config.OPENING_TOPIC, opening=opening)
-        logger.info(f"Entered {self.get_state_name().value} - valve: {opening}%")
+        controller.publish(config.SUBSTATE_TOPIC, substate=self.get_state_name())
+        controller.publish(config.OPENING_TOPIC, opening=opening)
+        logger.info("Entered %s - valve: %s%%", self.get_state_name().value, opening)
+
+    def on_exit(self, controller: 'TankService'):
+        """Called when leaving this substate."""
+        pass
 
 
 class NormalSubState(AutomaticSubStateBase):
     """NORMAL: 0% valve opening, monitoring for L1 threshold."""
-    
+
+    code = table.NORMAL
+
     def get_state_name(self) -> AutomaticStateEnum:
         return AutomaticStateEnum.NORMAL
-    
+
     def get_valve_opening(self) -> float:
         return 0.0
-    
-    def evaluate_transition(
-        self, 
-        level: float, 
-        elapsed_ms: int
-    ) -> Optional[AutomaticSubStateBase]:
-        if config.L1_THRESHOLD < level < config.L2_THRESHOLD:
-            logger.info(f"L1<{level}<L2 → TRACKING_PRE_ALARM")
-            return TrackingPreAlarmSubState()
-        elif level >= config.L2_THRESHOLD:
-            logger.warning(f"{level}>=L2 → ALARM")
-            return AlarmSubState()
-        return None
 
 
 class TrackingPreAlarmSubState(AutomaticSubStateBase):
     """TRACKING_PRE_ALARM: 0% valve, timer T1 for transition to PRE_ALARM."""
-    
+
+    code = table.TRACKING_PRE_ALARM
+
     def get_state_name(self) -> AutomaticStateEnum:
         return AutomaticStateEnum.TRACKING_PRE_ALARM
-    
+
     def get_valve_opening(self) -> float:
         return 0.0
-    
-    def evaluate_transition(
-        self, 
-        level: float, 
-        elapsed_ms: int
-    ) -> Optional[AutomaticSubStateBase]:
-        if level <= config.L1_THRESHOLD:
-            logger.info(f"{level}<=L1 → NORMAL")
-            return NormalSubState()
-        elif level >= config.L2_THRESHOLD:
-            logger.warning(f"{level}>=L2 → ALARM")
-            return AlarmSubState()
-        elif elapsed_ms > config.T1_DURATION * 1000:
-            logger.warning(f"T1 timeout → PRE_ALARM")
-            return PreAlarmSubState()
-        return None
+
+    def on_enter(self, controller: 'TankService'):
+        super().on_enter(controller)
+        # The table also checks T1 on readings (elapsed > T1): fire just past it
+        controller.start_timer(T1_TIMER, controller.thresholds.t1_duration + 0.001)
+
+    def on_exit(self, controller: 'TankService'):
+        controller.cancel_timer(T1_TIMER)
 
 
 class PreAlarmSubState(AutomaticSubStateBase):
     """PRE_ALARM: 50% valve opening."""
-    
+
+    code = table.PRE_ALARM
+
     def get_state_name(self) -> AutomaticStateEnum:
         return AutomaticStateEnum.PRE_ALARM
-    
+
     def get_valve_opening(self) -> float:
         return 50.0
-    
-    def evaluate_transition(
-        self, 
-        level: float, 
-        elapsed_ms: int
-    ) -> Optional[AutomaticSubStateBase]:
-        if level <= config.L1_THRESHOLD:
-            logger.info(f"{level}<=L1 → NORMAL")
-            return NormalSubState()
-        elif level >= config.L2_THRESHOLD:
-            logger.warning(f"{level}>=L2 → ALARM")
-            return AlarmSubState()
-        return None
 
 
 class AlarmSubState(AutomaticSubStateBase):
     """ALARM: 100% valve opening (critical level)."""
-    
+
+    code = table.ALARM
+
     def get_state_name(self) -> AutomaticStateEnum:
         return AutomaticStateEnum.ALARM
-    
+
     def get_valve_opening(self) -> float:
         return 100.0
-    
-    def evaluate_transition(
-        self, 
-        level: float, 
-        elapsed_ms: int
-    ) -> Optional[AutomaticSubStateBase]:
-        if level <= config.L2_THRESHOLD:
-            logger.info(f"{level}<=L2 → PRE_ALARM")
-            return PreAlarmSubState()
-        return None
+
+
+# Shared instances, indexed by substate code
+NORMAL_SUBSTATE = NormalSubState()
+TRACKING_PRE_ALARM_SUBSTATE = TrackingPreAlarmSubState()
+PRE_ALARM_SUBSTATE = PreAlarmSubState()
+ALARM_SUBSTATE = AlarmSubState()
+SUBSTATES: Tuple[AutomaticSubStateBase, ...] = (
+    NORMAL_SUBSTATE,
+    TRACKING_PRE_ALARM_SUBSTATE,
+    PRE_ALARM_SUBSTATE,
+    ALARM_SUBSTATE,
+)
@@ -1,12 +1,17 @@
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING
-import time
+from typing import TYPE_CHECKING, Sequence
+import numpy as np
 from models.schemas import SystemState as SystemStateEnum
+from core import transition_table as table
 from core.automatic_substates import (
     AutomaticSubStateBase, 
-    NormalSubState
+    NORMAL_SUBSTATE,
+    SUBSTATES,
+    T1_TIMER,
 )
 from utils.logger import get_logger
+from utils.metrics import METRICS
+from utils.tracing import mark
 import config
 
 if TYPE_CHECKING:
@@ -14,11 +19,34 @@ if TYPE_CHECKING:
 
 logger = get_logger(__name__)
 
+# Timer armed while connected (AUTOMATIC or MANUAL), see _arm_t2
+T2_TIMER = "t2"
+
+_SUBSTATE_TRANSITIONS = METRICS.counter(
+    "cus_fsm_substate_transitions_total", "AUTOMATIC substate transitions of all tanks", ("from", "to"))
+
+
+class FsmContext:
+    """
+    Per-tank FSM data. States and substates are shared stateless singletons,
+    so a transition only rebinds these slots and never allocates.
+    """
+
+    __slots__ = ("state", "substate", "substate_since_ms", "timers")
+
+    def __init__(self, state: 'SystemStateBase', now_ms: int):
+        self.state = state
+        self.substate: AutomaticSubStateBase = NORMAL_SUBSTATE
+        self.substate_since_ms = now_ms
+        self.timers: dict = {}  # { timer name: handle } of the armed timers
+
 
 class SystemStateBase(ABC):
     """
     Base class for System States (State Pattern).
     Each state handles its own events and transitions.
+    States are singletons (UNCONNECTED_STATE, MANUAL_STATE, AUTOMATIC_STATE):
+    per-tank data lives in the controller's FsmContext.
     """
     
     @abstractmethod
@@ -43,7 +71,11 @@ class SystemStateBase(ABC):
     
     @abstractmethod
     def check_timeout(self, elapsed_ms: int, controller: 'TankService'):
-        """Check for timeouts (called periodically)."""
+        """Check for timeouts (on T2 expiry, or periodically without a timer service)."""
+        pass
+
+    def handle_timeout(self, timer: str, controller: 'TankService'):
+        """Handle the expiry of a timer armed through controller.start_timer."""
         pass
     
     def on_enter(self, controller: 'TankService'):
@@ -65,8 +97,8 @@ class UnconnectedState(SystemStateBase):
         return SystemStateEnum.UNCONNECTED
     
     def handle_level_event(self, level: float, timestamp: float, controller: 'TankService'):
-        logger.info(f"First level received ({level}cm) → AUTOMATIC")
-        controller.transition_to(AutomaticSystemState())
+        logger.info("First level received (%scm) → AUTOMATIC", level)
+        controller.transition_to(AUTOMATIC_STATE)
     
     def handle_button_pressed(self, controller: 'TankService'):
         logger.debug("Button ignored in UNCONNECTED state")
@@ -79,7 +111,7 @@ class UnconnectedState(SystemStateBase):
     
     def on_enter(self, controller: 'TankService'):
         logger.info("Entered UNCONNECTED state")
-        controller.bus.publish(config.MODE_TOPIC, mode=SystemStateEnum.UNCONNECTED)
+        controller.publish(config.MODE_TOPIC, mode=SystemStateEnum.UNCONNECTED)
 
 
 class ManualState(SystemStateBase):
@@ -97,70 +129,153 @@ class ManualState(SystemStateBase):
     
     def handle_button_pressed(self, controller: 'TankService'):
         logger.info("Button pressed: MANUAL → AUTOMATIC")
-        controller.transition_to(AutomaticSystemState())
+        controller.transition_to(AUTOMATIC_STATE)
     
     def handle_manual_valve(self, opening: float, controller: 'TankService'):
-        logger.debug(f"Manual valve command: {opening}%")
-        controller.bus.publish(config.OPENING_TOPIC, opening=opening)
+        logger.debug("Manual valve command: %s%%", opening)
+        controller.publish(config.OPENING_TOPIC, opening=opening)
     
     def check_timeout(self, elapsed_ms: int, controller: 'TankService'):
         # Check T2 timeout
-        if elapsed_ms > config.T2_TIMEOUT * 1000:
-            logger.warning(f"T2 timeout in MANUAL → UNCONNECTED")
-            controller.transition_to(UnconnectedState())
+        if elapsed_ms > controller.thresholds.t2_timeout * 1000:
+            logger.warning("T2 timeout in MANUAL → UNCONNECTED")
+            controller.transition_to(UNCONNECTED_STATE)
+    
+    def handle_timeout(self, timer: str, controller: 'TankService'):
+        if timer == T2_TIMER:
+            _on_t2_expired(self, controller)
     
     def on_enter(self, controller: 'TankService'):
         logger.info("Entered MANUAL mode")
-        controller.bus.publish(config.MODE_TOPIC, mode=SystemStateEnum.MANUAL)
+        _arm_t2(controller)
+        controller.publish(config.MODE_TOPIC, mode=SystemStateEnum.MANUAL)
+
+    def on_exit(self, controller: 'TankService'):
+        controller.cancel_timer(T2_TIMER)
 
 
 class AutomaticSystemState(SystemStateBase):
     """
     AUTOMATIC: FSM controls valve based on water level.
-    Manages hierarchical substates (NORMAL, TRACKING, PRE_ALARM, ALARM).
+    Manages hierarchical substates (NORMAL, TRACKING, PRE_ALARM, ALARM),
+    kept in the controller's FsmContext and driven by the compiled
+    transition table.
     """
     
-    def __init__(self):
-        self._current_substate: AutomaticSubStateBase = NormalSubState()
-        self._substate_timestamp = int(time.monotonic() * 1000)
-    
     def get_state_name(self) -> SystemStateEnum:
         return SystemStateEnum.AUTOMATIC
     
     def handle_level_event(self, level: float, timestamp: float, controller: 'TankService'):
         # Evaluate substate transition
-        elapsed_ms = int(time.monotonic() * 1000) - self._substate_timestamp
-        new_substate = self._current_substate.evaluate_transition(level, elapsed_ms)
+        fsm = controller.fsm
+        elapsed_ms = controller.clock.monotonic_ms() - fsm.substate_since_ms
+        target = table.next_substate(fsm.substate.code, level, elapsed_ms, controller.thresholds)
         
-        if new_substate is not None:
-            self._transition_substate(new_substate, controller)
+        if target != table.NO_TRANSITION:
+            self._transition_substate(SUBSTATES[target], level, controller)
+
+    def handle_level_run(self, levels: np.ndarray, start: int, controller: 'TankService') -> int:
+        """
+        Evaluate the readings levels[start:] of one tank up to the first one causing
+        a substate transition, which is applied.
+        Same outcome as calling handle_level_event for each of them.
+
+        :return: Index of the first reading not yet evaluated.
+        """
+        fsm = controller.fsm
+        thresholds = controller.thresholds
+        elapsed_ms = controller.clock.monotonic_ms() - fsm.substate_since_ms
+        targets = table.evaluate_batch(fsm.substate.code, levels[start:], elapsed_ms, thresholds.l1_threshold,
+                                       thresholds.l2_threshold, thresholds.t1_duration * 1000)
+        hits = np.flatnonzero(targets != table.NO_TRANSITION)
+        if not len(hits):
+            return len(levels)
+        first = int(hits[0])
+        self._transition_substate(SUBSTATES[targets[first]], float(levels[start + first]), controller)
+        return start + first + 1
+
+    def handle_level_batch(self, levels: Sequence[float], controllers: Sequence['TankService']):
+        """
+        Evaluate one reading for each of many tanks in AUTOMATIC at once.
+        Same outcome as calling handle_level_event for every pair.
+        """
+        count = len(controllers)
+        now_ms = controllers[0].clock.monotonic_ms() if count else 0
+        substates = np.fromiter((c.fsm.substate.code for c in controllers), np.intp, count)
+        since_ms = np.fromiter((c.fsm.substate_since_ms for c in controllers), np.int64, count)
+        l1 = np.fromiter((c.thresholds.l1_threshold for c in controllers), np.float64, count)
+        l2 = np.fromiter((c.thresholds.l2_threshold for c in controllers), np.float64, count)
+        t1_ms = np.fromiter((c.thresholds.t1_duration * 1000 for c in controllers), np.float64, count)
+
+        targets = table.evaluate_batch(substates, levels, now_ms - since_ms, l1, l2, t1_ms)
+        for i in np.flatnonzero(targets != table.NO_TRANSITION).tolist():
+            self._transition_substate(SUBSTATES[targets[i]], levels[i], controllers[i])
     
     def handle_button_pressed(self, controller: 'TankService'):
         logger.info("Button pressed: AUTOMATIC → MANUAL")
-        controller.transition_to(ManualState())
+        controller.transition_to(MANUAL_STATE)
     
     def handle_manual_valve(self, opening: float, controller: 'TankService'):
         logger.debug("Manual valve ignored in AUTOMATIC mode")
     
     def check_timeout(self, elapsed_ms: int, controller: 'TankService'):
         # Check T2 timeout
-        if elapsed_ms > config.T2_TIMEOUT * 1000:
-            logger.warning(f"T2 timeout in AUTOMATIC → UNCONNECTED")
-            controller.transition_to(UnconnectedState())
+        if elapsed_ms > controller.thresholds.t2_timeout * 1000:
+            logger.warning("T2 timeout in AUTOMATIC → UNCONNECTED")
+            controller.transition_to(UNCONNECTED_STATE)
+    
+    def handle_timeout(self, timer: str, controller: 'TankService'):
+        if timer == T2_TIMER:
+            _on_t2_expired(self, controller)
+        elif timer == T1_TIMER:
+            target = table.T1_TARGETS.get(controller.fsm.substate.code, table.NO_TRANSITION)
+            if target != table.NO_TRANSITION:
+                logger.warning("T1 timeout → %s", SUBSTATES[target].get_state_name().value)
+                self._transition_substate(SUBSTATES[target], controller.current_level, controller)
     
     def on_enter(self, controller: 'TankService'):
         logger.info("Entered AUTOMATIC mode")
-        self._current_substate = NormalSubState()
-        self._substate_timestamp = int(time.monotonic() * 1000)
-        self._current_substate.on_enter(controller)
-        controller.bus.publish(config.MODE_TOPIC, mode=SystemStateEnum.AUTOMATIC)
+        fsm = controller.fsm
+        fsm.substate = NORMAL_SUBSTATE
+        fsm.substate_since_ms = controller.clock.monotonic_ms()
+        NORMAL_SUBSTATE.on_enter(controller)
+        _arm_t2(controller)
+        controller.publish(config.MODE_TOPIC, mode=SystemStateEnum.AUTOMATIC)
+
+    def on_exit(self, controller: 'TankService'):
+        controller.fsm.substate.on_exit(controller)
+        controller.cancel_timer(T2_TIMER)
     
-    def _transition_substate(self, new_substate: AutomaticSubStateBase, controller: 'TankService'):
+    def _transition_substate(self, new_substate: AutomaticSubStateBase, level: float, controller: 'TankService'):
         """Internal: transition between automatic substates."""
-        self._current_substate = new_substate
-        self._substate_timestamp = int(time.monotonic() * 1000)
+        fsm = controller.fsm
+        old, new = fsm.substate.get_state_name().value, new_substate.get_state_name().value
+        logger.info("Level %s: %s → %s", level, old, new)
+        _SUBSTATE_TRANSITIONS.labels(old, new).inc()
+        mark("transition")
+        fsm.substate.on_exit(controller)
+        fsm.substate = new_substate
+        fsm.substate_since_ms = controller.clock.monotonic_ms()
         new_substate.on_enter(controller)
-    
-    @property
-    def current_substate(self) -> AutomaticSubStateBase:
-        return self._current_substate
+
+
+def _arm_t2(controller: 'TankService'):
+    """
+    Arm T2 for the instant the last reading becomes older than the timeout.
+    Readings do not touch the timer: on expiry it is re-armed if one arrived meanwhile.
+    """
+    remaining = controller.thresholds.t2_timeout - controller.seconds_since_last_level()
+    # check_timeout needs elapsed_ms > T2 (in whole milliseconds)
+    controller.start_timer(T2_TIMER, remaining + 0.001)
+
+
+def _on_t2_expired(state: SystemStateBase, controller: 'TankService'):
+    controller.check_timeout()
+    if controller.fsm.state is state:
+        _arm_t2(controller)
+
+
+# Shared instances: transitions rebind the controller's FsmContext.state
+UNCONNECTED_STATE = UnconnectedState()
+MANUAL_STATE = ManualState()
+AUTOMATIC_STATE = AutomaticSystemState()
@@ -0,0 +1,128 @@
+from typing import Any, Callable, Tuple
+
+import numpy as np
+
+from models.schemas import AutomaticState as AutomaticStateEnum, TankThresholds
+
+# Substate codes: row index of the transition tables
+NORMAL, TRACKING_PRE_ALARM, PRE_ALARM, ALARM = range(4)
+SUBSTATE_NAMES: Tuple[AutomaticStateEnum, ...] = (
+    AutomaticStateEnum.NORMAL,
+    AutomaticStateEnum.TRACKING_PRE_ALARM,
+    AutomaticStateEnum.PRE_ALARM,
+    AutomaticStateEnum.ALARM,
+)
+NO_TRANSITION = -1
+
+# Level band: column index of the transition tables, band = r1 * 4 + r2 with
+#   r1: relation to L1 (0: level <= L1, 1: level > L1, 2: unordered, i.e. NaN)
+#   r2: relation to L2 (0: level < L2, 1: level == L2, 2: level > L2, 3: unordered)
+# Keeping every comparison outcome apart reproduces the original if/elif
+# chains exactly, whatever the thresholds (even L1 >= L2) or the level.
+LE, GT, NA = 0, 1, 2
+LT2, EQ2, GT2, NA2 = 0, 1, 2, 3
+BANDS = 12
+
+
+def _normal(r1: int, r2: int) -> int:
+    if r1 == GT and r2 == LT2:
+        return TRACKING_PRE_ALARM
+    if r2 in (EQ2, GT2):
+        return ALARM
+    return NO_TRANSITION
+
+
+def _tracking_pre_alarm(r1: int, r2: int) -> int:
+    if r1 == LE:
+        return NORMAL
+    if r2 in (EQ2, GT2):
+        return ALARM
+    return NO_TRANSITION
+
+
+def _pre_alarm(r1: int, r2: int) -> int:
+    if r1 == LE:
+        return NORMAL
+    if r2 in (EQ2, GT2):
+        return ALARM
+    return NO_TRANSITION
+
+
+def _alarm(r1: int, r2: int) -> int:
+    if r2 in (LT2, EQ2):
+        return PRE_ALARM
+    return NO_TRANSITION
+
+
+# Level rules per substate, then the T1 rule checked when they keep the substate
+_LEVEL_RULES: Tuple[Callable[[int, int], int], ...] = (_normal, _tracking_pre_alarm, _pre_alarm, _alarm)
+T1_TARGETS = {TRACKING_PRE_ALARM: PRE_ALARM}
+
+
+def _compile() -> Tuple[np.ndarray, np.ndarray]:
+    """Expand the rules into (level transitions, T1 transitions) tables of shape (substates, bands)."""
+    level_table = np.full((len(_LEVEL_RULES), BANDS), NO_TRANSITION, dtype=np.int8)
+    t1_table = np.full((len(_LEVEL_RULES), BANDS), NO_TRANSITION, dtype=np.int8)
+    for substate, rule in enumerate(_LEVEL_RULES):
+        for r1 in (LE, GT, NA):
+            for r2 in (LT2, EQ2, GT2, NA2):
+                band = r1 * 4 + r2
+                level_table[substate, band] = rule(r1, r2)
+                if level_table[substate, band] == NO_TRANSITION:
+                    t1_table[substate, band] = T1_TARGETS.get(substate, NO_TRANSITION)
+    level_table.setflags(write=False)
+    t1_table.setflags(write=False)
+    return level_table, t1_table
+
+
+LEVEL_TRANSITIONS, T1_TRANSITIONS = _compile()
+# Plain tuples for the scalar path (indexing them avoids NumPy scalar overhead)
+_LEVEL_ROWS = tuple(tuple(int(x) for x in row) for row in LEVEL_TRANSITIONS)
+_T1_ROWS = tuple(tuple(int(x) for x in row) for row in T1_TRANSITIONS)
+
+
+def level_band(level: float, l1: float, l2: float) -> int:
+    """Column of the transition tables for a level."""
+    r1 = LE if level <= l1 else GT if level > l1 else NA
+    r2 = LT2 if level < l2 else EQ2 if level == l2 else GT2 if level > l2 else NA2
+    return r1 * 4 + r2
+
+
+def next_substate(substate: int, level: float, elapsed_ms: int, thresholds: TankThresholds) -> int:
+    """
+    Substate code reached from `substate` on a level reading, or NO_TRANSITION.
+
+    :param substate: Current substate code.
+    :param level: Water level.
+    :param elapsed_ms: Time spent in the current substate.
+    :param thresholds: Control policy of the tank.
+    """
+    band = level_band(level, thresholds.l1_threshold, thresholds.l2_threshold)
+    target = _LEVEL_ROWS[substate][band]
+    if target == NO_TRANSITION and elapsed_ms > thresholds.t1_duration * 1000:
+        target = _T1_ROWS[substate][band]
+    return target
+
+
+def evaluate_batch(
+    substates: np.ndarray,
+    levels: np.ndarray,
+    elapsed_ms: np.ndarray,
+    l1: Any,
+    l2: Any,
+    t1_ms: Any,
+) -> np.ndarray:
+    """
+    Vectorized next_substate over many (tank, level) pairs.
+    Thresholds may be per-pair arrays or scalars shared by every pair.
+
+    :return: Target substate codes, NO_TRANSITION where the substate is kept.
+    """
+    levels = np.asarray(levels, dtype=np.float64)
+    r1 = np.where(levels <= l1, LE, np.where(levels > l1, GT, NA))
+    r2 = np.where(levels < l2, LT2, np.where(levels == l2, EQ2, np.where(levels > l2, GT2, NA2)))
+    band = r1 * 4 + r2
+    substates = np.asarray(substates, dtype=np.intp)
+    target = LEVEL_TRANSITIONS[substates, band]
+    timed_out = (target == NO_TRANSITION) & (np.asarray(elapsed_ms) > t1_ms)
+    return np.where(timed_out, T1_TRANSITIONS[substates, band], target)
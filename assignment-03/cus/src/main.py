@@ -1,13 +1,17 @@
 import asyncio
 import signal
 
-from services.event_bus import EventBus
+from models.codecs import level_codec
+from services.event_bus import EventBus, MailboxPolicy
 from services.serial_service import SerialService
-from services.mqtt_service import MQTTService, QOSLevel
+from services.mqtt_service import MQTTService, MQTTTransport, QOSLevel
 from services.http_service import HttpService
-from services.tank_service import TankService
+from services.worker_gateway import WorkerGateway
+from services.tank_registry import TankRegistry
+from services.timer_service import TimerService
 from config import *
 from utils.logger import get_logger
+from utils.topic_matcher import SINGLE_LEVEL, join_topic
 
 logger = get_logger(__name__)
 
@@ -16,23 +20,32 @@ async def main():
     # 1. Event Bus
     bus = EventBus()
 
-    # 2. Controller (FSM)
-    controller = TankService(event_bus=bus)
-
-    bus.subscribe(MODE_CHANGE_TOPIC, controller._on_button_pressed)
-    bus.subscribe(POT_TOPIC, controller._on_manual_valve)
-    bus.subscribe(LEVEL_IN_TOPIC, controller._on_level_event)
+    # 2. Controller: one FSM per tank, each with its persistent level history,
+    #    T1/T2 timeouts fired by a shared timer service
+    timer_service = TimerService(bus)
+    controller = TankRegistry(
+        event_bus=bus,
+        tanks=TANKS,
+        auto_register=TANK_AUTO_REGISTER,
+        max_tanks=MAX_TANKS,
+        level_store_dir=LEVEL_STORE_DIR,
+        segment_records=LEVEL_STORE_SEGMENT_RECORDS,
+        timers=timer_service,
+    )
+    controller.subscribe()
 
-    # 3. Serial Service
+    # 3. Serial Service (the Window Control Unit drives the default tank)
     serial_service = SerialService(
         port=SERIAL_PORT,
         baudrate=SERIAL_BAUDRATE,
         event_bus=bus,
         send_interval=SERIAL_SEND_INTERVAL,
+        tank_id=DEFAULT_TANK_ID,
+        codec=SERIAL_CODEC,
     )
 
-    bus.subscribe(MODE_TOPIC, serial_service.on_mode_change)
-    bus.subscribe(OPENING_TOPIC, serial_service.on_valve_command)
+    bus.subscribe(join_topic(MODE_TOPIC, DEFAULT_TANK_ID), serial_service.on_mode_change)
+    bus.subscribe(join_topic(OPENING_TOPIC, DEFAULT_TANK_ID), serial_service.on_valve_command)
 
     # 4. MQTT Service
     mqtt_service = MQTTService(
@@ -40,29 +53,59 @@ async def main():
         port=MQTT_BROKER_PORT,
         event_bus=bus,
         qos=QOSLevel.AT_LEAST_ONCE,
+        coalesce_window=MQTT_COALESCE_WINDOW,
+        retain=MQTT_RETAIN,
+        transport=MQTTTransport(MQTT_TRANSPORT),
     )
 
+    levels_codec = level_codec(MQTT_LEVEL_CODEC)
     mqtt_service.configure_messaging(
         incoming={
-            "tank/level": LEVEL_IN_TOPIC,
-        }
+            "tank/level": join_topic(LEVEL_IN_TOPIC, DEFAULT_TANK_ID),
+            "tank/+/level": join_topic(LEVEL_IN_TOPIC, SINGLE_LEVEL),
+        },
+        codecs={
+            "tank/level": levels_codec,
+            "tank/+/level": levels_codec,
+        },
     )
 
-    # 5. HTTP Service
-    http_service = HttpService(
-        event_bus=bus,
-        host=HTTP_HOST,
-        port=HTTP_PORT,
-        publish_interval=10.0,
-        api_prefix="/api/v1",
-    )
+    # 5. HTTP Service: on the control loop, or in worker processes fed by a shared snapshot
+    if HTTP_WORKERS > 0:
+        http_service = WorkerGateway(
+            event_bus=bus,
+            host=HTTP_HOST,
+            port=HTTP_PORT,
+            workers=HTTP_WORKERS,
+            api_prefix="/api/v1",
+            max_tanks=SHARED_SNAPSHOT_TANKS,
+            capacity=MAX_READINGS,
+        )
+    else:
+        http_service = HttpService(
+            event_bus=bus,
+            host=HTTP_HOST,
+            port=HTTP_PORT,
+            publish_interval=10.0,
+            api_prefix="/api/v1",
+            level_stores=controller.level_stores,
+        )
 
-    bus.subscribe(LEVELS_OUT_TOPIC, http_service.on_levels_out)
-    bus.subscribe(MODE_TOPIC, http_service.on_mode_update)
-    bus.subscribe(OPENING_TOPIC, http_service.on_valve_update)
+    # Dashboard data only needs the latest value: conflate it in dedicated mailboxes
+    # so slow HTTP-side handlers never delay the controller. Mailboxes conflate per
+    # concrete topic, i.e. per tank, so they must hold one entry for every tank.
+    for topic, callback in (
+        (LEVELS_OUT_TOPIC, http_service.on_levels_out),
+        (MODE_TOPIC, http_service.on_mode_update),
+        (OPENING_TOPIC, http_service.on_valve_update),
+        (ANALYTICS_TOPIC, http_service.on_analytics_update),
+        (SUBSTATE_TOPIC, http_service.on_substate_update),
+    ):
+        bus.subscribe(join_topic(topic, SINGLE_LEVEL), callback, policy=MailboxPolicy.CONFLATE, maxsize=MAX_TANKS)
 
     # 6. Start services
     services = [
+        timer_service,
         controller,
         serial_service,
         mqtt_service,
@@ -87,6 +130,7 @@ async def main():
             *(s.stop() for s in services),
             return_exceptions=True,
         )
+        await bus.close()
 
 
 if __name__ == "__main__":
@@ -2,12 +2,22 @@ from .schemas import (
     SystemState,
     ValveRequest,
     StatusResponse,
-    LevelReading
+    LevelReading,
+    TankThresholds,
+    Command,
+    CommandBatch
 )
+from .level_history import LevelHistory
+from .level_store import LevelStore
 
 __all__ = [
     "SystemState",
     "ValveRequest",
     "StatusResponse",
-    "LevelReading"
+    "LevelReading",
+    "TankThresholds",
+    "Command",
+    "CommandBatch",
+    "LevelHistory",
+    "LevelStore"
 ]
@@ -0,0 +1,248 @@
+"""
+Wire formats of the messages exchanged with the devices (MQTT payloads and
+serial frames).
+
+A codec converts between the bytes on the wire and the message published
+on the bus: a dict, or a list of records for a batch. JSON is the default
+everywhere; the binary formats are chosen per MQTT topic or per serial port
+and must match what the device sends:
+
+- "struct": records with a fixed layout, e.g. a float32 level and a uint32
+  timestamp (8 bytes instead of ~45 of JSON); several records in one
+  payload are a batch;
+- "cbor": the JSON structure in CBOR (requires the optional cbor2 package).
+"""
+import json
+import struct
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter
+
+from models.schemas import SystemState, TankLevelPayload, WcsPayload
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+# Record layouts of the struct codec: (field, struct format), little endian.
+# Dotted fields are nested ("pot.val": record["pot"]["val"])
+LEVEL_FIELDS = (("level", "f"), ("timestamp", "I"))
+SERIAL_IN_FIELDS = (("pot.val", "h"), ("btn", "?"))
+# Values implied by the layout: not sent, added to the decoded records
+SERIAL_IN_CONSTANTS = {"pot.who": "wcs"}
+SERIAL_OUT_FIELDS = (("mode", "B"), ("valve", "f"))
+# Text fields of the struct layouts, sent as their index in these values
+SERIAL_OUT_CHOICES = {"mode": tuple(state.value for state in SystemState)}
+
+
+class Codec(ABC):
+    """
+    Converts messages to and from bytes. With a `schema`, every decoded record
+    is validated against it (ValueError if invalid): the record of a single
+    message is the value under `key` (e.g. {"reading": {...}}), or the whole
+    message without a key, while a list is a batch of records.
+    """
+    name = "codec"
+    # Binary payloads may contain newlines: on serial ports they are framed (see SerialService)
+    binary = True
+
+    def __init__(self, schema: Optional[Type[BaseModel]] = None, key: Optional[str] = None):
+        """
+        :param schema: Optional model the decoded records must match.
+        :param key: Key of the record in a single message.
+        """
+        self.schema = schema
+        self.key = key
+        # A batch is validated in one call
+        self._batch = TypeAdapter(List[schema]) if schema is not None else None
+
+    @abstractmethod
+    def encode(self, message: Any) -> bytes:
+        """Payload of a message; ValueError if the format cannot represent it."""
+        pass
+
+    def decode(self, data: bytes) -> Any:
+        """Message of a payload; ValueError if it is malformed or does not match the schema."""
+        message = self._decode(data)
+        if self.schema is not None:
+            self.validate(message)
+        return message
+
+    @abstractmethod
+    def _decode(self, data: bytes) -> Any:
+        """Message of a payload, not validated yet."""
+        pass
+
+    def validate(self, message: Any):
+        """Raise ValueError if a record of the message does not match the schema."""
+        # pydantic's ValidationError is a ValueError
+        if isinstance(message, list):
+            self._batch.validate_python(message)
+        elif self.key is None:
+            self.schema.model_validate(message)
+        elif isinstance(message, dict) and self.key in message:
+            self.schema.model_validate(message[self.key])
+        else:
+            raise ValueError(f"Message without '{self.key}'")
+
+
+class JsonCodec(Codec):
+    """UTF-8 JSON, compact (the default format)."""
+    name = "json"
+    binary = False
+
+    def encode(self, message: Any) -> bytes:
+        return json.dumps(message, separators=(",", ":")).encode("utf-8")
+
+    def _decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class CborCodec(Codec):
+    """CBOR (RFC 8949): the JSON structure with binary numbers."""
+    name = "cbor"
+
+    def __init__(self, schema: Optional[Type[BaseModel]] = None, key: Optional[str] = None):
+        if cbor2 is None:
+            raise ImportError("The cbor codec requires the cbor2 package")
+        super().__init__(schema, key)
+
+    def encode(self, message: Any) -> bytes:
+        return cbor2.dumps(message)
+
+    def _decode(self, data: bytes) -> Any:
+        return cbor2.loads(data)
+
+
+class StructCodec(Codec):
+    """
+    Fixed-layout records packed with `struct`. A payload of several records
+    is decoded as a batch (list); a single record is wrapped under `key`.
+    The layout is checked against the schema once: the unpacked values have
+    the layout's types, so decoded records are not validated again.
+    """
+    name = "struct"
+
+    def __init__(self, fields: Sequence[Tuple[str, str]], schema: Optional[Type[BaseModel]] = None,
+                 key: Optional[str] = None, choices: Optional[Dict[str, Sequence[str]]] = None,
+                 constants: Optional[Dict[str, Any]] = None):
+        """
+        :param fields: Layout of a record: (field, struct format) in order, dotted fields being nested.
+        :param schema: Optional model the decoded records must match.
+        :param key: Key of the record in a single message.
+        :param choices: { field: values } of text fields, packed as the value's index.
+        :param constants: { field: value } added to every decoded record, not packed.
+        """
+        super().__init__(schema, key)
+        self.fields = tuple(name for name, _ in fields)
+        self._struct = struct.Struct("<" + "".join(fmt for _, fmt in fields))
+        self.size = self._struct.size
+        self._paths = tuple(tuple(name.split(".")) for name in self.fields)
+        self._constants = [(tuple(name.split(".")), value) for name, value in (constants or {}).items()]
+        self._flat = not self._constants and all(len(path) == 1 for path in self._paths)
+        top = {path[0] for path in self._paths} | {path[0] for path, _ in self._constants}
+        if schema is not None and top != set(schema.model_fields):
+            raise ValueError(f"Layout {self.fields} does not match {schema.__name__} {tuple(schema.model_fields)}")
+        # { position in the record: values } and { position in the record: { value: index } }
+        self._choices = {self.fields.index(name): tuple(values) for name, values in (choices or {}).items()}
+        self._indexes = {i: {value: index for index, value in enumerate(values)} for i, values in self._choices.items()}
+
+    def encode(self, message: Any) -> bytes:
+        if isinstance(message, list):
+            return b"".join(self._pack(record) for record in message)
+        return self._pack(message[self.key] if self.key is not None else message)
+
+    def _pack(self, record: Dict[str, Any]) -> bytes:
+        try:
+            values = [_get(record, path) for path in self._paths]
+            for i, indexes in self._indexes.items():
+                values[i] = indexes[getattr(values[i], "value", values[i])]
+            return self._struct.pack(*values)
+        except (KeyError, TypeError, struct.error) as e:
+            raise ValueError(f"Record not packable as {self._struct.format}: {e}") from e
+
+    def validate(self, message: Any):
+        """Nothing to check: the layout matches the schema (checked on creation)."""
+
+    def _decode(self, data: bytes) -> Any:
+        if not data or len(data) % self.size:
+            raise ValueError(f"{len(data)} bytes is not a whole number of {self.size} byte records")
+        records = [self._unpack(values) for values in self._struct.iter_unpack(data)]
+        if len(records) > 1:
+            return records
+        return {self.key: records[0]} if self.key is not None else records[0]
+
+    def _unpack(self, values: Tuple[Any, ...]) -> Dict[str, Any]:
+        if self._choices:
+            values = list(values)
+            try:
+                for i, choices in self._choices.items():
+                    values[i] = choices[values[i]]
+            except IndexError as e:
+                raise ValueError(f"Unknown value index in {values}") from e
+        if self._flat:
+            return dict(zip(self.fields, values))
+        record: Dict[str, Any] = {}
+        for path, value in zip(self._paths, values):
+            _set(record, path, value)
+        for path, value in self._constants:
+            _set(record, path, value)
+        return record
+
+
+def _get(record: Dict[str, Any], path: Tuple[str, ...]) -> Any:
+    for name in path:
+        record = record[name]
+    return record
+
+
+def _set(record: Dict[str, Any], path: Tuple[str, ...], value: Any):
+    for name in path[:-1]:
+        record = record.setdefault(name, {})
+    record[path[-1]] = value
+
+
+# Codec of the payloads without a configured format
+JSON_CODEC = JsonCodec()
+
+CODEC_NAMES = ("json", "struct", "cbor")
+
+
+def make_codec(name: str, fields: Optional[Sequence[Tuple[str, str]]] = None,
+               schema: Optional[Type[BaseModel]] = None, key: Optional[str] = None,
+               choices: Optional[Dict[str, Sequence[str]]] = None,
+               constants: Optional[Dict[str, Any]] = None) -> Codec:
+    """
+    Codec by name ("json", "struct" or "cbor").
+
+    :param fields: Record layout, required by the struct codec.
+    :param choices: Text fields of the layout (struct codec).
+    :param constants: Fields implied by the layout (struct codec).
+    """
+    if name == "json":
+        return JsonCodec(schema, key)
+    if name == "cbor":
+        return CborCodec(schema, key)
+    if name == "struct":
+        if fields is None:
+            raise ValueError("The struct codec requires a record layout")
+        return StructCodec(fields, schema, key, choices, constants)
+    raise ValueError(f"Unknown codec '{name}', expected one of {CODEC_NAMES}")
+
+
+def level_codec(name: str = "json") -> Codec:
+    """Codec of the TMS level messages: {"reading": {level, timestamp}} or a list of readings."""
+    return make_codec(name, LEVEL_FIELDS, schema=TankLevelPayload, key="reading")
+
+
+def serial_codecs(name: str = "json") -> Tuple[Codec, Codec]:
+    """
+    (incoming, outgoing) codecs of the WCS serial messages:
+    {pot: {val, who}, btn} in (validated against WcsPayload), {mode, valve} out.
+    """
+    return (
+        make_codec(name, SERIAL_IN_FIELDS, schema=WcsPayload, constants=SERIAL_IN_CONSTANTS),
+        make_codec(name, SERIAL_OUT_FIELDS, choices=SERIAL_OUT_CHOICES),
+    )
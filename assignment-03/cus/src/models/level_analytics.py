@@ -0,0 +1,201 @@
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+
+class RollingWindow:
+    """
+    Sliding window over the last `size` (timestamp, level) samples.
+
+    Mean, variance and the least-squares slope of level over time are kept
+    with add/remove Welford updates, so every sample costs O(1) whatever
+    the window size. Times are stored relative to a reference instant, and
+    the moments are rebuilt exactly once per `size` samples (amortized O(1))
+    so that rounding errors cannot accumulate.
+    """
+
+    def __init__(self, size: int):
+        if size < 2:
+            raise ValueError("Rolling window size must be at least 2")
+        self.size = size
+        self._samples: Deque[Tuple[float, float]] = deque()  # (relative time, level)
+        self._origin: Optional[float] = None
+        self._pushes = 0
+        self._mean_t = 0.0
+        self._mean_y = 0.0
+        self._m2_t = 0.0   # sum of squared time deviations
+        self._m2_y = 0.0   # sum of squared level deviations
+        self._c_ty = 0.0   # co-moment of time and level
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def push(self, timestamp: float, level: float):
+        if self._origin is None:
+            self._origin = timestamp
+        t = timestamp - self._origin
+        if len(self._samples) == self.size:
+            self._remove(*self._samples.popleft())
+        self._samples.append((t, level))
+        self._add(t, level)
+
+        self._pushes += 1
+        if self._pushes >= self.size:
+            self._rebuild()
+
+    def push_many(self, timestamps: Sequence[float], levels: Sequence[float]):
+        """Push a batch of samples, oldest first."""
+        if len(levels) < self.size:
+            for timestamp, level in zip(timestamps, levels):
+                self.push(timestamp, level)
+            return
+        # Only the newest `size` samples stay in the window: compute it from them alone
+        self._origin = timestamps[-self.size]
+        times = np.asarray(timestamps[-self.size:], dtype=np.float64) - self._origin
+        values = np.asarray(levels[-self.size:], dtype=np.float64)
+        self._samples = deque(zip(times.tolist(), values.tolist()))
+        self._mean_t = float(times.mean())
+        self._mean_y = float(values.mean())
+        dt = times - self._mean_t
+        dy = values - self._mean_y
+        self._m2_t = float(dt @ dt)
+        self._m2_y = float(dy @ dy)
+        self._c_ty = float(dt @ dy)
+        self._pushes = 0
+
+    def _rebuild(self):
+        """Recompute the moments from the stored samples, rebasing times on the oldest one."""
+        shift = self._samples[0][0]
+        self._origin += shift
+        samples = [(t - shift, y) for t, y in self._samples]
+        self._samples = deque()
+        self._mean_t = self._mean_y = self._m2_t = self._m2_y = self._c_ty = 0.0
+        for t, y in samples:
+            self._samples.append((t, y))
+            self._add(t, y)
+        self._pushes = 0
+
+    def _add(self, t: float, y: float):
+        n = len(self._samples)
+        dt = t - self._mean_t
+        dy = y - self._mean_y
+        self._mean_t += dt / n
+        self._mean_y += dy / n
+        self._m2_t += dt * (t - self._mean_t)
+        self._m2_y += dy * (y - self._mean_y)
+        self._c_ty += dt * (y - self._mean_y)
+
+    def _remove(self, t: float, y: float):
+        n = len(self._samples)
+        if n == 0:
+            self._mean_t = self._mean_y = self._m2_t = self._m2_y = self._c_ty = 0.0
+            return
+        dt = t - self._mean_t
+        dy = y - self._mean_y
+        self._mean_t -= dt / n
+        self._mean_y -= dy / n
+        self._m2_t -= dt * (t - self._mean_t)
+        self._m2_y -= dy * (y - self._mean_y)
+        self._c_ty -= dt * (y - self._mean_y)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self._mean_y if self._samples else None
+
+    @property
+    def variance(self) -> Optional[float]:
+        """Sample variance of the level (None with fewer than 2 samples)."""
+        n = len(self._samples)
+        return max(self._m2_y, 0.0) / (n - 1) if n > 1 else None
+
+    @property
+    def rate(self) -> Optional[float]:
+        """Least-squares slope of level over time (level units per second)."""
+        if len(self._samples) < 2 or self._m2_t <= 1e-12:
+            return None
+        return self._c_ty / self._m2_t
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "count": len(self._samples),
+            "mean": self.mean,
+            "variance": self.variance,
+            "rate": self.rate,
+        }
+
+
+class LevelAnalytics:
+    """
+    Incremental statistics of the water level stream: EWMA, rolling
+    mean/variance over one or more sample windows and rate of rise.
+    Each update does constant work per configured window.
+    """
+
+    def __init__(self, windows: Iterable[int] = (10, 60), ewma_alpha: float = 0.2):
+        """
+        :param windows: Sizes (in samples) of the rolling windows; the first one
+                        provides the headline rate of rise.
+        :param ewma_alpha: Smoothing factor of the EWMA, in (0, 1].
+        """
+        if not 0.0 < ewma_alpha <= 1.0:
+            raise ValueError("ewma_alpha must be in (0, 1]")
+        self._alpha = ewma_alpha
+        self._windows: List[RollingWindow] = [RollingWindow(size) for size in windows]
+        if not self._windows:
+            raise ValueError("At least one rolling window is required")
+        self._ewma: Optional[float] = None
+        self._last: Dict[str, Any] = {}
+
+    @property
+    def ewma(self) -> Optional[float]:
+        return self._ewma
+
+    @property
+    def rate_of_rise(self) -> Optional[float]:
+        return self._windows[0].rate
+
+    def update(self, level: float, timestamp: float) -> Dict[str, Any]:
+        """
+        Account for a new reading and return the updated analytics.
+
+        :param level: Water level.
+        :param timestamp: Reading time in seconds.
+        """
+        self._ewma = level if self._ewma is None else self._ewma + self._alpha * (level - self._ewma)
+        for window in self._windows:
+            window.push(timestamp, level)
+        self._last = self.snapshot(level, timestamp)
+        return self._last
+
+    def update_many(self, levels: Sequence[float], timestamps: Sequence[float]) -> Dict[str, Any]:
+        """
+        Account for a batch of readings (oldest first) and return the analytics
+        after the last one. Same result as calling update() for each reading
+        (up to rounding): windows shorter than the batch are recomputed from it.
+        """
+        alpha = self._alpha
+        ewma = self._ewma
+        for level in levels:
+            ewma = level if ewma is None else ewma + alpha * (level - ewma)
+        self._ewma = ewma
+        for window in self._windows:
+            window.push_many(timestamps, levels)
+        if len(levels):
+            self._last = self.snapshot(levels[-1], timestamps[-1])
+        return self._last
+
+    def snapshot(self, level: Optional[float] = None, timestamp: Optional[float] = None) -> Dict[str, Any]:
+        """JSON-ready view of the current analytics."""
+        return {
+            "level": level,
+            "timestamp": timestamp,
+            "ewma": self._ewma,
+            "rate_of_rise": self.rate_of_rise,
+            "windows": [window.snapshot() for window in self._windows],
+        }
+
+    @property
+    def latest(self) -> Dict[str, Any]:
+        """Analytics computed by the last update (empty before the first reading)."""
+        return self._last
@@ -0,0 +1,151 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+
+class LevelHistory:
+    """
+    Fixed-capacity ring buffer of water level readings, stored column-wise
+    in float64 arrays (one for levels, one for timestamps).
+
+    Every sample is written twice (at i and i + capacity), so the most recent
+    n samples are always a contiguous slice: windows are zero-copy NumPy views
+    and statistics are vectorized over them.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        :param capacity: Maximum number of readings kept (oldest are overwritten).
+        """
+        if capacity < 1:
+            raise ValueError("LevelHistory capacity must be at least 1")
+        self._capacity = capacity
+        self._levels = np.zeros(2 * capacity, dtype=np.float64)
+        self._timestamps = np.zeros(2 * capacity, dtype=np.float64)
+        self._next = 0      # slot written by the next append, in [0, capacity)
+        self._size = 0
+        self._total = 0     # readings appended since creation
+
+    @classmethod
+    def from_window(cls, capacity: int, levels, timestamps, total: int) -> 'LevelHistory':
+        """
+        Rebuild a history from its most recent readings and the number of
+        readings it had received (e.g. a copy held by another process).
+        """
+        history = cls(capacity)
+        history.extend(levels, timestamps)
+        history._total = max(total, history._total)
+        return history
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def total(self) -> int:
+        """Number of readings appended since creation (including overwritten ones)."""
+        return self._total
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def append(self, level: float, timestamp: float):
+        """Store a reading in O(1), overwriting the oldest one when full."""
+        i = self._next
+        self._levels[i] = self._levels[i + self._capacity] = level
+        self._timestamps[i] = self._timestamps[i + self._capacity] = timestamp
+        self._next = (i + 1) % self._capacity
+        self._total += 1
+        if self._size < self._capacity:
+            self._size += 1
+
+    def extend(self, levels, timestamps):
+        """Store many readings at once (sequences or arrays of equal length)."""
+        levels = np.asarray(levels, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if levels.shape != timestamps.shape or levels.ndim != 1:
+            raise ValueError("levels and timestamps must be 1-D and of equal length")
+        count = len(levels)
+        if count == 0:
+            return
+        self._total += count
+        if count >= self._capacity:
+            # Only the newest `capacity` readings survive: rewrite the whole ring
+            levels, timestamps = levels[-self._capacity:], timestamps[-self._capacity:]
+            self._levels[:] = np.concatenate((levels, levels))
+            self._timestamps[:] = np.concatenate((timestamps, timestamps))
+            self._next = 0
+            self._size = self._capacity
+            return
+
+        slots = (self._next + np.arange(count)) % self._capacity
+        self._levels[slots] = self._levels[slots + self._capacity] = levels
+        self._timestamps[slots] = self._timestamps[slots + self._capacity] = timestamps
+        self._next = (self._next + count) % self._capacity
+        self._size = min(self._size + count, self._capacity)
+
+    def clear(self):
+        self._next = 0
+        self._size = 0
+
+    def window(self, last: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Zero-copy (levels, timestamps) views of the most recent readings, oldest first.
+        The views are only valid until the next append.
+
+        :param last: Number of readings (default: all stored readings).
+        """
+        n = self._size if last is None else max(0, min(last, self._size))
+        # Thanks to the mirror, [end - n, end) never wraps for n <= capacity
+        end = self._next + self._capacity
+        return self._levels[end - n:end], self._timestamps[end - n:end]
+
+    def latest(self) -> Optional[Tuple[float, float]]:
+        """Most recent (level, timestamp), or None if empty."""
+        if not self._size:
+            return None
+        i = self._next - 1
+        return float(self._levels[i + self._capacity]), float(self._timestamps[i + self._capacity])
+
+    def latest_level(self, default: float = 0.0) -> float:
+        latest = self.latest()
+        return latest[0] if latest is not None else default
+
+    # ===================== Vectorized statistics =====================
+    def min(self, last: Optional[int] = None) -> Optional[float]:
+        levels, _ = self.window(last)
+        return float(levels.min()) if len(levels) else None
+
+    def max(self, last: Optional[int] = None) -> Optional[float]:
+        levels, _ = self.window(last)
+        return float(levels.max()) if len(levels) else None
+
+    def mean(self, last: Optional[int] = None) -> Optional[float]:
+        levels, _ = self.window(last)
+        return float(levels.mean()) if len(levels) else None
+
+    def slope(self, last: Optional[int] = None) -> Optional[float]:
+        """Least-squares trend of the level over time (level units per timestamp unit)."""
+        levels, timestamps = self.window(last)
+        if len(levels) < 2:
+            return None
+        t = timestamps - timestamps.mean()
+        denom = float(np.dot(t, t))
+        if denom == 0.0:
+            return None
+        return float(np.dot(t, levels - levels.mean()) / denom)
+
+    # ===================== Serialization =====================
+    def to_list(self, last: Optional[int] = None) -> List[Dict[str, float]]:
+        """Readings as JSON-ready dicts, same shape as models.schemas.LevelReading."""
+        return readings_to_list(*self.window(last))
+
+
+def readings_to_list(levels: np.ndarray, timestamps: np.ndarray) -> List[Dict[str, float]]:
+    """Level/timestamp columns as JSON-ready dicts, same shape as models.schemas.LevelReading."""
+    return [
+        {"water_level": level, "timestamp": timestamp}
+        for level, timestamp in zip(levels.tolist(), timestamps.tolist())
+    ]
@@ -0,0 +1,237 @@
+import bisect
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# On-disk record: little-endian float64 timestamp (Unix seconds) + float64 level
+RECORD_DTYPE = np.dtype([("timestamp", "<f8"), ("level", "<f8")])
+RECORD_SIZE = RECORD_DTYPE.itemsize
+_RECORD = struct.Struct("<dd")
+SEGMENT_SUFFIX = ".seg"
+
+
+class _Segment:
+    """
+    One append-only segment file, read through a memory map.
+    Keeps a sparse index with the timestamp of every `stride`-th record.
+    """
+
+    def __init__(self, path: Path, stride: int):
+        self.path = path
+        self.stride = stride
+        self.count = 0
+        self._index: List[float] = []
+        self._mmap: Optional[mmap.mmap] = None
+        self._mapped_count = 0
+
+        size = path.stat().st_size if path.exists() else 0
+        if size % RECORD_SIZE:
+            # Torn write from a crash: drop the partial trailing record
+            logger.warning(f"[LevelStore] Truncating partial record in {path.name}")
+            size -= size % RECORD_SIZE
+            os.truncate(path, size)
+        self.count = size // RECORD_SIZE
+        if self.count:
+            records = self.records()
+            self._index = records["timestamp"][::stride].tolist()
+
+    @property
+    def first_timestamp(self) -> Optional[float]:
+        return self._index[0] if self._index else None
+
+    def on_append(self, timestamp: float):
+        """Account for a record appended by the writer."""
+        if self.count % self.stride == 0:
+            self._index.append(timestamp)
+        self.count += 1
+
+    def on_extend(self, timestamps: np.ndarray):
+        """Account for a block of records appended by the writer."""
+        first = -self.count % self.stride
+        self._index.extend(timestamps[first::self.stride].tolist())
+        self.count += len(timestamps)
+
+    def records(self) -> np.ndarray:
+        """Zero-copy structured view over the (flushed) records."""
+        if self._mmap is None or self._mapped_count != self.count:
+            self.close()
+            if self.count == 0:
+                return np.empty(0, dtype=RECORD_DTYPE)
+            with open(self.path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), self.count * RECORD_SIZE, access=mmap.ACCESS_READ)
+            self._mapped_count = self.count
+        return np.frombuffer(self._mmap, dtype=RECORD_DTYPE, count=self.count)
+
+    def range(self, start: float, end: float) -> np.ndarray:
+        """Records with start <= timestamp <= end, located through the sparse index."""
+        # Candidate blocks from the sparse index, then binary search inside them
+        lo_block = max(bisect.bisect_left(self._index, start) - 1, 0)
+        hi_block = bisect.bisect_right(self._index, end)
+        lo = lo_block * self.stride
+        hi = min(hi_block * self.stride, self.count)
+        block = self.records()[lo:hi]
+        timestamps = block["timestamp"]
+        i = int(np.searchsorted(timestamps, start, side="left"))
+        j = int(np.searchsorted(timestamps, end, side="right"))
+        return block[i:j]
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Still referenced by a returned view: let the GC release it
+                pass
+            self._mmap = None
+            self._mapped_count = 0
+
+
+class LevelStore:
+    """
+    Persistent append-only time series of water level readings.
+
+    Readings are fixed-size binary records (timestamp, level) appended to
+    segment files of at most `segment_records` records. Range queries pick
+    the overlapping segments, narrow down with a sparse in-memory timestamp
+    index and binary-search a memory-mapped view, so their cost does not
+    depend on the total retention. Timestamps must be non-decreasing.
+    """
+
+    def __init__(self, directory: str, segment_records: int = 1 << 20, index_stride: int = 1024):
+        """
+        :param directory: Folder holding the segment files (created if missing).
+        :param segment_records: Maximum number of records per segment file.
+        :param index_stride: One sparse index entry every `index_stride` records.
+        """
+        self._dir = Path(directory)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._segment_records = segment_records
+        self._stride = index_stride
+        self._segments: List[_Segment] = [
+            _Segment(path, index_stride)
+            for path in sorted(self._dir.glob(f"*{SEGMENT_SUFFIX}"))
+        ]
+        self._writer = None
+        self._last_timestamp = float("-inf")
+        # The last segment may be empty (created by a crash before its first flush)
+        for segment in reversed(self._segments):
+            if segment.count:
+                self._last_timestamp = float(segment.records()["timestamp"][-1])
+                break
+        logger.info(f"[LevelStore] Opened {self._dir} ({len(self)} readings in {len(self._segments)} segments)")
+
+    def __len__(self) -> int:
+        return sum(segment.count for segment in self._segments)
+
+    def append(self, level: float, timestamp: float):
+        """Append a reading. Out-of-order timestamps are rejected with ValueError."""
+        if timestamp < self._last_timestamp:
+            raise ValueError(f"Timestamp {timestamp} is older than the last stored one ({self._last_timestamp})")
+        if self._writer is None or self._segments[-1].count >= self._segment_records:
+            self._roll_segment()
+        self._writer.write(_RECORD.pack(timestamp, level))
+        self._segments[-1].on_append(timestamp)
+        self._last_timestamp = timestamp
+
+    def extend(self, levels, timestamps):
+        """
+        Append many readings with one write per segment touched.
+        Timestamps must be non-decreasing and not older than the last stored one (ValueError).
+        """
+        levels = np.asarray(levels, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if levels.shape != timestamps.shape or levels.ndim != 1:
+            raise ValueError("levels and timestamps must be 1-D and of equal length")
+        count = len(levels)
+        if count == 0:
+            return
+        if timestamps[0] < self._last_timestamp or np.any(np.diff(timestamps) < 0):
+            raise ValueError("Timestamps must be non-decreasing and not older than the last stored one")
+
+        records = np.empty(count, dtype=RECORD_DTYPE)
+        records["timestamp"] = timestamps
+        records["level"] = levels
+        written = 0
+        while written < count:
+            if self._writer is None or self._segments[-1].count >= self._segment_records:
+                self._roll_segment()
+            segment = self._segments[-1]
+            chunk = records[written:written + self._segment_records - segment.count]
+            self._writer.write(chunk.tobytes())
+            segment.on_extend(chunk["timestamp"])
+            written += len(chunk)
+        self._last_timestamp = float(timestamps[-1])
+
+    def flush(self):
+        """Make appended readings visible to readers (and durable against process crashes)."""
+        if self._writer is not None:
+            self._writer.flush()
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None,
+              limit: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Readings with start <= timestamp <= end, oldest first.
+
+        :param start: Lower bound (Unix seconds), unbounded if None.
+        :param end: Upper bound (Unix seconds), unbounded if None.
+        :param limit: If given, only the most recent `limit` readings of the range.
+        :return: (levels, timestamps) arrays.
+        """
+        self.flush()
+        start = float("-inf") if start is None else start
+        end = float("inf") if end is None else end
+
+        segments = [segment for segment in self._segments if segment.count]
+        # First segment that can contain `start`: the last one starting before it
+        # (readings equal to `start` may end the previous segment)
+        firsts = [segment.first_timestamp for segment in segments]
+        first = max(bisect.bisect_left(firsts, start) - 1, 0)
+        # One past the last segment that can contain `end`
+        last = bisect.bisect_right(firsts, end)
+        chunks = []
+        if limit is None:
+            for segment in segments[first:last]:
+                chunk = segment.range(start, end)
+                if len(chunk):
+                    chunks.append(chunk)
+        elif limit > 0:
+            # Newest segments first, stopping once `limit` readings are found:
+            # only those are copied, not the whole range
+            remaining = limit
+            for segment in reversed(segments[first:last]):
+                chunk = segment.range(start, end)[-remaining:]
+                if len(chunk):
+                    chunks.append(chunk)
+                    remaining -= len(chunk)
+                    if remaining == 0:
+                        break
+            chunks.reverse()
+
+        records = np.concatenate(chunks) if chunks else np.empty(0, dtype=RECORD_DTYPE)
+        return records["level"].copy(), records["timestamp"].copy()
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for segment in self._segments:
+            segment.close()
+
+    def _roll_segment(self):
+        """Open the last segment for writing, starting a new one if it is full."""
+        if self._writer is not None:
+            self._writer.close()
+        if self._segments and self._segments[-1].count < self._segment_records:
+            path = self._segments[-1].path
+        else:
+            number = int(self._segments[-1].path.stem) + 1 if self._segments else 0
+            path = self._dir / f"{number:08d}{SEGMENT_SUFFIX}"
+            self._segments.append(_Segment(path, self._stride))
+        self._writer = open(path, "ab")
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional
+from typing import Any, List, Literal, Optional
 from datetime import datetime
 from pydantic import BaseModel, Field
 
@@ -28,6 +28,16 @@ class ValveRequest(BaseModel):
     opening: float = Field(..., ge=0, le=100, description="Opening percentage (0-100)")
 
 
+class TankThresholds(BaseModel):
+    """
+    Control policy parameters of a single tank.
+    """
+    l1_threshold: float = Field(..., description="First warning level")
+    l2_threshold: float = Field(..., description="Critical level")
+    t1_duration: float = Field(..., gt=0, description="Seconds above L1 before opening the valve at 50%")
+    t2_timeout: float = Field(..., gt=0, description="Seconds without readings before UNCONNECTED")
+
+
 class TankLevelPayload(BaseModel):
     """
     MQTT payload for tank/level topic.
@@ -40,6 +50,22 @@ class TankLevelPayload(BaseModel):
         return datetime.fromtimestamp(self.timestamp / 1000.0)
 
 
+class PotPayload(BaseModel):
+    """
+    Potentiometer value and the subsystem that sent it.
+    """
+    val: float = Field(..., description="Potentiometer value (valve opening percentage)")
+    who: str = Field(..., description="Source of the value (e.g. wcs, dbs)")
+
+
+class WcsPayload(BaseModel):
+    """
+    Serial message from the WCS.
+    """
+    btn: bool = Field(False, description="Mode button pressed since the last message")
+    pot: Optional[PotPayload] = Field(None, description="Local potentiometer")
+
+
 class LevelReading(BaseModel):
     """
     Water level reading from the sensor.
@@ -48,6 +74,27 @@ class LevelReading(BaseModel):
     timestamp: float  # Unix timestamp in seconds
 
 
+class Command(BaseModel):
+    """
+    One command of a POST /commands batch.
+    """
+    command: Literal["pot", "change"]
+    tank: Optional[str] = Field(None, description="Tank id (default tank if omitted)")
+    pot: Any = Field(None, description="Potentiometer value, for 'pot' commands")
+    btn: bool = Field(False, description="Button pressed, for 'change' commands")
+    idempotency_key: Optional[str] = Field(
+        None, min_length=1, max_length=128,
+        description="Commands retried with the same key are only applied once",
+    )
+
+
+class CommandBatch(BaseModel):
+    """
+    Ordered list of commands, applied together.
+    """
+    commands: List[Command] = Field(..., min_length=1, max_length=100)
+
+
 class StatusResponse(BaseModel):
     """
     Current status of the system.
@@ -0,0 +1,224 @@
+import json
+import time
+from multiprocessing import shared_memory
+from typing import Dict, NamedTuple, Optional
+import numpy as np
+
+from models.level_history import LevelHistory
+from models.schemas import AutomaticState, SystemState
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_MAGIC = 0x43555353  # "CUSS"
+_LAYOUT_VERSION = 1
+
+_HEADER_DTYPE = np.dtype([
+    ("magic", "<u4"),
+    ("version", "<u4"),
+    ("slots", "<u4"),        # tank slots in the segment
+    ("capacity", "<u4"),     # readings kept per tank
+    ("blob_size", "<u4"),    # bytes for the analytics JSON per tank
+    ("tanks", "<u4"),        # slots in use
+    ("generation", "<u8"),   # bumped after every write: cheap "anything changed?" check
+], align=True)
+
+_MODES = tuple(SystemState)
+_SUBSTATES = tuple(AutomaticState)
+_MODE_CODES = {mode: code for code, mode in enumerate(_MODES)}
+_SUBSTATE_CODES = {substate: code for code, substate in enumerate(_SUBSTATES)}
+_UNSET = object()
+_MAX_READ_RETRIES = 10_000
+
+
+def _slot_dtype(capacity: int, blob_size: int) -> np.dtype:
+    return np.dtype([
+        ("seq", "<u8"),            # seqlock: odd while the slot is being written
+        ("tank", "S64"),
+        ("mode", "i1"),            # index in SystemState, -1 if unknown
+        ("substate", "i1"),        # index in AutomaticState, -1 if none
+        ("valve", "<f8"),          # NaN if unknown
+        ("total", "<u8"),          # readings received (LevelHistory.total)
+        ("count", "<u4"),          # readings in the window below
+        ("levels", "<f8", (capacity,)),
+        ("timestamps", "<f8", (capacity,)),
+        ("analytics_size", "<u4"),
+        ("analytics", "u1", (blob_size,)),
+    ], align=True)
+
+
+class TankSnapshot(NamedTuple):
+    """Consistent copy of one tank's slot."""
+    tank_id: str
+    mode: Optional[SystemState]
+    substate: Optional[AutomaticState]
+    valve: Optional[float]
+    analytics: Optional[dict]
+    levels: Optional[LevelHistory]
+
+
+class SharedSnapshot:
+    """
+    Compact state of the tanks (mode, substate, valve, analytics, recent
+    readings) in a multiprocessing.shared_memory segment: written by the
+    control process, read by any number of read-side worker processes.
+
+    Each tank slot is protected by a seqlock. The single writer makes the
+    sequence number odd, updates the slot and makes it even again; readers
+    copy the slot and retry if the number was odd or changed meanwhile, so
+    they never block the writer and never see a half-written slot. This
+    relies on the writer's stores becoming visible in program order, as on
+    x86-64.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self._owner = owner
+        self._header = np.ndarray((), dtype=_HEADER_DTYPE, buffer=shm.buf)
+        if int(self._header["magic"]) != _MAGIC or int(self._header["version"]) != _LAYOUT_VERSION:
+            raise ValueError(f"Shared memory '{shm.name}' is not a tank snapshot (layout {_LAYOUT_VERSION})")
+        self.capacity = int(self._header["capacity"])
+        self.blob_size = int(self._header["blob_size"])
+        slots = int(self._header["slots"])
+        self._slots = np.ndarray(
+            (slots,), dtype=_slot_dtype(self.capacity, self.blob_size),
+            buffer=shm.buf, offset=_HEADER_DTYPE.itemsize,
+        )
+        self._index: Dict[str, int] = {}   # { tank_id: slot } (writer side)
+        self._warned = set()
+
+    @classmethod
+    def create(cls, slots: int = 64, capacity: int = 100, blob_size: int = 2048,
+               name: Optional[str] = None) -> 'SharedSnapshot':
+        """Create the segment (writer side); the creator unlinks it in close()."""
+        size = _HEADER_DTYPE.itemsize + slots * _slot_dtype(capacity, blob_size).itemsize
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((), dtype=_HEADER_DTYPE, buffer=shm.buf)
+        header[()] = (_MAGIC, _LAYOUT_VERSION, slots, capacity, blob_size, 0, 0)
+        snapshot = cls(shm, owner=True)
+        snapshot._slots["seq"] = 0
+        snapshot._slots["mode"] = -1
+        snapshot._slots["substate"] = -1
+        snapshot._slots["valve"] = np.nan
+        return snapshot
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedSnapshot':
+        """Open an existing segment (reader side)."""
+        return cls(shared_memory.SharedMemory(name=name, track=False), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def generation(self) -> int:
+        return int(self._header["generation"])
+
+    @property
+    def tank_count(self) -> int:
+        return int(self._header["tanks"])
+
+    def close(self):
+        # Views must be released before the buffer can be
+        self._header = self._slots = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    # ===================== Writer =====================
+    def write(self, tank_id: str, mode=_UNSET, substate=_UNSET, valve=_UNSET, analytics=_UNSET,
+              levels: Optional[LevelHistory] = None) -> bool:
+        """
+        Update the given fields of a tank's slot (the slot is assigned on first
+        write). Returns False if the tank cannot be stored (no free slot).
+        """
+        if self._slots is None:
+            return False  # Closed
+        index = self._slot_of(tank_id)
+        if index is None:
+            return False
+        if analytics is not _UNSET:
+            blob = json.dumps(analytics, separators=(",", ":")).encode()
+            if len(blob) > self.blob_size:
+                self._warn_once(("analytics", tank_id), f"Analytics of '{tank_id}' too large for the snapshot")
+                blob = b""
+
+        slots = self._slots
+        seq = slots["seq"]
+        seq[index] += 1  # odd: write in progress
+        if mode is not _UNSET:
+            slots["mode"][index] = _MODE_CODES.get(mode, -1) if mode is not None else -1
+        if substate is not _UNSET:
+            slots["substate"][index] = _SUBSTATE_CODES.get(substate, -1) if substate is not None else -1
+        if valve is not _UNSET:
+            slots["valve"][index] = valve if valve is not None else np.nan
+        if analytics is not _UNSET:
+            slots["analytics"][index, :len(blob)] = np.frombuffer(blob, dtype=np.uint8)
+            slots["analytics_size"][index] = len(blob)
+        if levels is not None:
+            window_levels, window_timestamps = levels.window(self.capacity)
+            count = len(window_levels)
+            slots["levels"][index, :count] = window_levels
+            slots["timestamps"][index, :count] = window_timestamps
+            slots["count"][index] = count
+            slots["total"][index] = levels.total
+        seq[index] += 1  # even: consistent again
+        self._header["generation"] += 1
+        return True
+
+    def _slot_of(self, tank_id: str) -> Optional[int]:
+        index = self._index.get(tank_id)
+        if index is not None:
+            return index
+        encoded = tank_id.encode()
+        if len(encoded) > self._slots.dtype["tank"].itemsize:
+            self._warn_once(("id", tank_id), f"Tank id '{tank_id}' too long for the snapshot")
+            return None
+        index = self.tank_count
+        if index >= len(self._slots):
+            self._warn_once(("full", None), f"No free snapshot slot for '{tank_id}' ({len(self._slots)} slots)")
+            return None
+        self._slots["tank"][index] = encoded
+        self._index[tank_id] = index
+        self._header["tanks"] = index + 1
+        return index
+
+    def _warn_once(self, key, message: str):
+        if key not in self._warned:
+            self._warned.add(key)
+            logger.warning(f"[SharedSnapshot] {message}")
+
+    # ===================== Readers =====================
+    def slot_seq(self, index: int) -> int:
+        """Sequence number of a slot: unchanged (and even) means nothing was written since."""
+        return int(self._slots["seq"][index])
+
+    def read(self, index: int) -> TankSnapshot:
+        """Consistent copy of a slot (retries while the writer is updating it)."""
+        seq = self._slots["seq"]
+        for attempt in range(_MAX_READ_RETRIES):
+            before = int(seq[index])
+            if not before & 1:
+                record = self._slots[index].copy()
+                if int(seq[index]) == before:
+                    return _to_snapshot(record, self.capacity)
+            if attempt > 100:
+                time.sleep(0)  # The writer was preempted mid-write: let it run
+        raise TimeoutError(f"Snapshot slot {index} kept changing while being read")
+
+
+def _to_snapshot(record: np.void, capacity: int) -> TankSnapshot:
+    mode, substate, valve = int(record["mode"]), int(record["substate"]), float(record["valve"])
+    size = int(record["analytics_size"])
+    count = int(record["count"])
+    total = int(record["total"])
+    return TankSnapshot(
+        tank_id=record["tank"].decode(),
+        mode=_MODES[mode] if mode >= 0 else None,
+        substate=_SUBSTATES[substate] if substate >= 0 else None,
+        valve=None if np.isnan(valve) else valve,
+        analytics=json.loads(record["analytics"][:size].tobytes()) if size else None,
+        levels=LevelHistory.from_window(capacity, record["levels"][:count], record["timestamps"][:count], total)
+        if total else None,
+    )
@@ -0,0 +1,175 @@
+"""
+Deterministic replay of recorded level traces through the control stack.
+
+Readings are published on the EventBus as the MQTT service would, and the
+TankRegistry FSMs run on a virtual clock: time jumps from one reading (or
+timer deadline) to the next, so weeks of data replay in seconds. Every mode
+and valve output is recorded with its virtual timestamp.
+
+Traces are either CSV files (`timestamp,level[,tank]`, Unix seconds, with a
+header row) or LevelStore directories (binary segment files).
+
+Usage (from the cus folder):
+    python src/replay.py TRACE [--tank ID] [--l1 L1] [--l2 L2] [--t1 T1] [--t2 T2] [--out OUTPUTS.csv]
+"""
+import argparse
+import csv
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+
+from config import DEFAULT_TANK_ID, LEVEL_IN_TOPIC, MODE_TOPIC, OPENING_TOPIC
+from models.level_store import LevelStore
+from models.schemas import TankThresholds
+from services.event_bus import EventBus
+from services.tank_registry import TankRegistry
+from services.tank_service import default_thresholds
+from services.timer_service import TimerService
+from utils.clock import VirtualClock
+from utils.logger import get_logger
+from utils.topic_matcher import SINGLE_LEVEL, join_topic
+
+logger = get_logger(__name__)
+
+# (timestamp in Unix seconds, level, tank id)
+TraceReading = Tuple[float, float, str]
+
+
+class ReplayOutput(NamedTuple):
+    """An output of the control stack, stamped with the virtual time it was published at."""
+    timestamp: float
+    tank: str
+    output: str   # "mode" or "valve"
+    value: object
+
+
+def read_csv_trace(path: str, tank_id: str = DEFAULT_TANK_ID) -> Iterator[TraceReading]:
+    """Readings of a CSV trace with a `timestamp,level[,tank]` header, in file order."""
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            yield float(row["timestamp"]), float(row["level"]), row.get("tank") or tank_id
+
+
+def read_store_trace(directory: str, tank_id: str = DEFAULT_TANK_ID,
+                     start: Optional[float] = None, end: Optional[float] = None) -> Iterator[TraceReading]:
+    """Readings persisted by a LevelStore (one tank per store directory)."""
+    store = LevelStore(directory)
+    try:
+        levels, timestamps = store.query(start, end)
+    finally:
+        store.close()
+    for timestamp, level in zip(timestamps.tolist(), levels.tolist()):
+        yield timestamp, level, tank_id
+
+
+def read_trace(path: str, tank_id: str = DEFAULT_TANK_ID) -> Iterator[TraceReading]:
+    """CSV file or LevelStore directory, depending on the path."""
+    if Path(path).is_dir():
+        return read_store_trace(path, tank_id)
+    return read_csv_trace(path, tank_id)
+
+
+class ReplayDriver:
+    """
+    Feeds readings to a TankRegistry on a virtual clock and records its outputs.
+    Nothing depends on wall time: the same trace always gives the same outputs.
+    """
+
+    def __init__(self, thresholds: Optional[TankThresholds] = None, tanks: Optional[dict] = None):
+        """
+        :param thresholds: Control policy of every tank (from config if None).
+        :param tanks: { tank_id: threshold overrides } for specific tanks.
+        """
+        self.clock = VirtualClock()
+        self.bus = EventBus()
+        self.timers = TimerService(self.bus, clock=self.clock)
+        self.registry = TankRegistry(self.bus, tanks=tanks, thresholds=thresholds,
+                                     max_tanks=sys.maxsize, timers=self.timers, clock=self.clock)
+        self.registry.subscribe()
+        self.outputs: List[ReplayOutput] = []
+        self.readings = 0
+        self.first_timestamp: Optional[float] = None
+
+        self.bus.subscribe(join_topic(MODE_TOPIC, SINGLE_LEVEL), self._on_mode)
+        self.bus.subscribe(join_topic(OPENING_TOPIC, SINGLE_LEVEL), self._on_valve)
+
+    def _on_mode(self, mode, wildcards: Tuple[str, ...]):
+        self.outputs.append(ReplayOutput(self.clock.time(), wildcards[0], "mode", getattr(mode, "value", mode)))
+
+    def _on_valve(self, opening: float, wildcards: Tuple[str, ...]):
+        self.outputs.append(ReplayOutput(self.clock.time(), wildcards[0], "valve", opening))
+
+    def run_until(self, until: float):
+        """Move the virtual clock to `until`, firing every timer due on the way at its deadline."""
+        while True:
+            deadline = self.timers.next_deadline()
+            if deadline is None or deadline > until:
+                break
+            self.clock.set(deadline)
+            self.timers.advance(deadline)
+        self.clock.set(until)
+
+    def feed(self, readings: Iterable[TraceReading]) -> List[ReplayOutput]:
+        """Replay readings (oldest first) and return the outputs recorded so far."""
+        topics = {}
+        for timestamp, level, tank_id in readings:
+            if self.first_timestamp is None:
+                self.first_timestamp = timestamp
+            self.run_until(timestamp)
+            topic = topics.get(tank_id)
+            if topic is None:
+                topic = topics[tank_id] = join_topic(LEVEL_IN_TOPIC, tank_id)
+            # The TMS sends its timestamps in milliseconds
+            self.bus.publish(topic, reading={"level": level, "timestamp": timestamp * 1000})
+            self.readings += 1
+        return self.outputs
+
+
+def write_outputs(outputs: Iterable[ReplayOutput], out: TextIO):
+    writer = csv.writer(out)
+    writer.writerow(ReplayOutput._fields)
+    writer.writerows(outputs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", help="CSV trace file or LevelStore directory")
+    parser.add_argument("--tank", default=DEFAULT_TANK_ID, help="Tank id of readings without one")
+    defaults = default_thresholds()
+    parser.add_argument("--l1", type=float, default=defaults.l1_threshold)
+    parser.add_argument("--l2", type=float, default=defaults.l2_threshold)
+    parser.add_argument("--t1", type=float, default=defaults.t1_duration)
+    parser.add_argument("--t2", type=float, default=defaults.t2_timeout)
+    parser.add_argument("--drain", type=float, default=0.0,
+                        help="Keep the clock running this many seconds after the last reading (fires pending timeouts)")
+    parser.add_argument("--out", help="Write the outputs as CSV here (default: stdout)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Keep the INFO/WARNING logging of the control stack")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    thresholds = TankThresholds(l1_threshold=args.l1, l2_threshold=args.l2, t1_duration=args.t1, t2_timeout=args.t2)
+    driver = ReplayDriver(thresholds=thresholds)
+
+    started = time.perf_counter()
+    driver.feed(read_trace(args.trace, args.tank))
+    if args.drain:
+        driver.run_until(driver.clock.time() + args.drain)
+    elapsed = time.perf_counter() - started
+
+    if args.out:
+        with open(args.out, "w", newline="") as f:
+            write_outputs(driver.outputs, f)
+    else:
+        write_outputs(driver.outputs, sys.stdout)
+
+    span = driver.clock.time() - (driver.first_timestamp or 0.0)
+    print(f"Replayed {driver.readings} readings ({span:.0f} s of virtual time) in {elapsed:.2f} s: "
+          f"{driver.readings / elapsed:,.0f} readings/s, {span / elapsed:,.0f}x real time, "
+          f"{len(driver.outputs)} outputs", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,8 @@ from .base_service import BaseService
 from .mqtt_service import MQTTService
 from .serial_service import SerialService
 from .http_service import HttpService
-from .event_bus import EventBus
+from .event_bus import EventBus, Mailbox, MailboxPolicy, ThreadSafeIngress
+from .timer_service import TimerService
 from .base_service import BaseService
 
 
@@ -12,5 +13,9 @@ __all__ = [
     'SerialService',
     'HttpService',
     'EventBus',
+    'Mailbox',
+    'MailboxPolicy',
+    'ThreadSafeIngress',
+    'TimerService',
     'BaseService'
 ]
\ No newline at end of file
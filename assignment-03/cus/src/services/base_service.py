@@ -1,34 +1,208 @@
 from abc import ABC, abstractmethod
 import asyncio
+import inspect
+from typing import Any, Callable, List, Optional, Set
 from services.event_bus import EventBus
 from utils.logger import get_logger
+from utils.metrics import METRICS
 
 logger = get_logger(__name__)
 
+# Measured on the ticks of the periodic jobs, so it costs no extra wakeups
+_LOOP_LAG = METRICS.histogram("cus_event_loop_lag_seconds", "Delay of periodic jobs behind their schedule")
+
+
+class Job:
+    """
+    A unit of work run by the Scheduler on the event loop: periodically, when
+    triggered, or both. The callback may be a plain function or a coroutine
+    function; runs of a job never overlap, and triggers arriving while a run
+    is pending or in progress are coalesced into (at most) one more run.
+    """
+
+    __slots__ = ("name", "_callback", "_is_async", "_loop", "_interval", "_next_run",
+                 "_timer", "_pending", "_task", "_rerun", "_cancelled", "_on_cancel", "_scheduler")
+
+    def __init__(self, scheduler: 'Scheduler', callback: Callable[[], Any], name: str,
+                 interval: Optional[float] = None):
+        self.name = name
+        self._scheduler = scheduler
+        self._callback = callback
+        self._is_async = inspect.iscoroutinefunction(callback)
+        self._loop = asyncio.get_running_loop()
+        self._interval = interval
+        self._next_run = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._pending = False
+        self._task: Optional[asyncio.Task] = None
+        self._rerun = False
+        self._cancelled = False
+        self._on_cancel: Optional[Callable[[], None]] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def trigger(self):
+        """Run the job as soon as possible (on the next loop iteration)."""
+        if self._cancelled:
+            return
+        if self._task is not None:
+            self._rerun = True
+        elif not self._pending:
+            self._pending = True
+            self._loop.call_soon(self._run)
+
+    def cancel(self):
+        if self._cancelled:
+            return
+        self._cancelled = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._task is not None:
+            self._task.cancel()
+        if self._on_cancel is not None:
+            self._on_cancel()
+        self._scheduler._jobs.discard(self)
+
+    # ---- periodic schedule ----
+    def _start_periodic(self, first: float):
+        self._next_run = self._loop.time() + first
+        self._timer = self._loop.call_at(self._next_run, self._on_tick)
+
+    def _on_tick(self):
+        # Fixed rate: next run on the original grid, skipping the ticks already missed
+        now = self._loop.time()
+        _LOOP_LAG.observe(now - self._next_run)
+        self._next_run += self._interval
+        if self._next_run <= now:
+            self._next_run += (int((now - self._next_run) / self._interval) + 1) * self._interval
+        self._timer = self._loop.call_at(self._next_run, self._on_tick)
+        self.trigger()
+
+    # ---- execution ----
+    def _run(self):
+        self._pending = False
+        if self._cancelled:
+            return
+        if self._is_async:
+            self._task = self._loop.create_task(self._run_async())
+            return
+        try:
+            self._callback()
+        except Exception as e:
+            logger.exception(f"[Scheduler] Job '{self.name}' failed: {e}")
+
+    async def _run_async(self):
+        try:
+            await self._callback()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"[Scheduler] Job '{self.name}' failed: {e}")
+        finally:
+            self._task = None
+            if self._rerun:
+                self._rerun = False
+                self.trigger()
+
+
+class Scheduler:
+    """
+    Event-loop scheduler shared by the services, in place of per-service
+    sleep loops: periodic jobs wake the loop exactly when due, event jobs
+    only when triggered, and readiness jobs only when a file descriptor has
+    data. Nothing wakes up while there is nothing to do.
+
+    Jobs are bound to the running event loop when created.
+    """
+
+    def __init__(self):
+        self._jobs: Set[Job] = set()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def every(self, interval: float, callback: Callable[[], Any], name: Optional[str] = None,
+              first: Optional[float] = None) -> Job:
+        """
+        Run callback every `interval` seconds, at a fixed rate.
+
+        :param first: Delay of the first run (default: one interval).
+        """
+        if interval <= 0:
+            raise ValueError("Job interval must be positive")
+        job = self._add(Job(self, callback, name or _callback_name(callback), interval))
+        job._start_periodic(interval if first is None else first)
+        return job
+
+    def on_trigger(self, callback: Callable[[], Any], name: Optional[str] = None) -> Job:
+        """Run callback whenever job.trigger() is called (e.g. from a bus callback)."""
+        return self._add(Job(self, callback, name or _callback_name(callback)))
+
+    def when_readable(self, fileobj: Any, callback: Callable[[], Any], name: Optional[str] = None) -> Optional[Job]:
+        """
+        Run callback whenever `fileobj` (a file descriptor or an object with
+        fileno()) has data to read. The callback must be a plain function that
+        consumes the available data. Returns None if the event loop cannot watch
+        it (e.g. the Windows proactor loop): the caller must then poll.
+        """
+        try:
+            fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+        except (AttributeError, OSError, ValueError):
+            return None
+        job = Job(self, callback, name or _callback_name(callback))
+        try:
+            # Run inline: the data is there now, and coalescing would delay the read
+            job._loop.add_reader(fd, job._run)
+        except (NotImplementedError, OSError, ValueError):
+            return None
+        job._on_cancel = lambda: job._loop.remove_reader(fd)
+        return self._add(job)
+
+    def _add(self, job: Job) -> Job:
+        self._jobs.add(job)
+        return job
+
+
+def _callback_name(callback: Callable) -> str:
+    return getattr(callback, "__qualname__", None) or repr(callback)
+
+
+# Scheduler of the services that are not given one
+DEFAULT_SCHEDULER = Scheduler()
+
+
 class BaseService(ABC):
     """
     Abstract base class for all asynchronous services.
     Handles lifecycle management and event bus dependency injection.
+    Periodic and event-driven work is registered as scheduler jobs (every,
+    on_trigger, when_readable), which are cancelled when the service stops.
     """
 
-    def __init__(self, name: str, event_bus: EventBus):
+    def __init__(self, name: str, event_bus: EventBus, scheduler: Optional[Scheduler] = None):
         """
         Initialize the service.
-        
+
         :param name: Unique name for the service.
         :param event_bus: Injected instance of EventBus.
+        :param scheduler: Scheduler of the service jobs (shared DEFAULT_SCHEDULER if None).
         """
         self.name = name
         self.bus = event_bus
+        self.scheduler = scheduler or DEFAULT_SCHEDULER
         self._running = False
         self._task: asyncio.Task | None = None
+        self._jobs: List[Job] = []
 
     async def start(self):
         """Start the service by creating an asynchronous task."""
         if self._running:
             logger.warning(f"[{self.name}] Service is already running.")
             return
-            
+
         self._running = True
         logger.info(f"[{self.name}] Starting service...")
         self._task = asyncio.create_task(self._run_wrapper())
@@ -43,6 +217,7 @@ class BaseService(ABC):
         except Exception as e:
             logger.exception(f"[{self.name}] Critical error in service: {e}")
         finally:
+            self.cancel_jobs()
             await self.cleanup()
             self._running = False
 
@@ -50,7 +225,7 @@ class BaseService(ABC):
         """Stop the service and wait for the task to finish."""
         if not self._running:
             return
-            
+
         logger.info(f"[{self.name}] Stopping service...")
         self._running = False
         if self._task:
@@ -68,5 +243,32 @@ class BaseService(ABC):
 
     @abstractmethod
     async def run(self) -> None:
-        """Main execution loop to be implemented by concrete services."""
+        """Main execution logic to be implemented by concrete services."""
         pass
+
+    # ===================== Scheduler jobs =====================
+    def every(self, interval: float, callback: Callable[[], Any], first: Optional[float] = None) -> Job:
+        """Register a periodic job of this service (see Scheduler.every)."""
+        return self._own(self.scheduler.every(interval, callback, f"{self.name}.{_callback_name(callback)}", first))
+
+    def on_trigger(self, callback: Callable[[], Any]) -> Job:
+        """Register an event job of this service (see Scheduler.on_trigger)."""
+        return self._own(self.scheduler.on_trigger(callback, f"{self.name}.{_callback_name(callback)}"))
+
+    def when_readable(self, fileobj: Any, callback: Callable[[], Any]) -> Optional[Job]:
+        """Register a readiness job of this service (see Scheduler.when_readable)."""
+        job = self.scheduler.when_readable(fileobj, callback, f"{self.name}.{_callback_name(callback)}")
+        return self._own(job) if job is not None else None
+
+    def cancel_jobs(self):
+        for job in self._jobs:
+            job.cancel()
+        self._jobs.clear()
+
+    def _own(self, job: Job) -> Job:
+        self._jobs.append(job)
+        return job
+
+    async def wait_until_stopped(self):
+        """For run() of services whose work is all in jobs and callbacks: returns when stop() cancels it."""
+        await asyncio.get_running_loop().create_future()
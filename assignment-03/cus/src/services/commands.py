@@ -0,0 +1,160 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import ValidationError
+
+from models.schemas import Command, CommandBatch
+from services.event_bus import EventBus
+from utils.topic_matcher import SEPARATOR, is_wildcard, join_topic
+
+try:
+    from config import POT_TOPIC, MODE_CHANGE_TOPIC, DEFAULT_TANK_ID
+except ImportError:
+    POT_TOPIC = "pot"
+    MODE_CHANGE_TOPIC = "mode_change"
+    DEFAULT_TANK_ID = "default"
+
+
+class CommandError(ValueError):
+    """A command batch was rejected: nothing was applied."""
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__(f"{len(errors)} invalid command(s)")
+        self.errors = errors
+
+
+class CommandProcessor:
+    """
+    Write side of the HTTP API: turns POST /pot, /change and /commands
+    payloads into bus publications. Used by HttpService in the control process,
+    and by the WorkerGateway for commands forwarded by read-side workers.
+    """
+
+    KINDS = ("pot", "change", "commands")
+
+    def __init__(self, event_bus: EventBus, idempotency_keys: int = 4096):
+        """
+        :param event_bus: Bus the commands are published on.
+        :param idempotency_keys: Idempotency keys of applied commands remembered to discard retries.
+        """
+        self.bus = event_bus
+        self._applied_commands = _IdempotencyLog(idempotency_keys)
+
+    def submit(self, kind: str, payload: Union[dict, CommandBatch]) -> Any:
+        """
+        Apply a command of the given kind and return the response body.
+        Raises CommandError for rejected commands, ValueError for malformed ones.
+        """
+        if kind == "pot":
+            return self.pot(payload)
+        if kind == "change":
+            return self.change(payload)
+        if kind == "commands":
+            if not isinstance(payload, CommandBatch):
+                payload = CommandBatch.model_validate(payload)
+            return self.run(payload)
+        raise ValueError(f"Unknown command kind '{kind}'")
+
+    def pot(self, payload: dict) -> Any:
+        command = self._single("pot", payload)
+        self._send_pot(command.tank or DEFAULT_TANK_ID, command.pot)
+        return {"status": "success", "sent": command.pot}
+
+    def change(self, payload: dict) -> Any:
+        command = self._single("change", payload)
+        self._send_button(command.tank or DEFAULT_TANK_ID, command.btn)
+        return {"status": "success", "sent": command.btn}
+
+    @staticmethod
+    def _single(kind: str, payload: dict) -> Command:
+        """The command of a POST /pot or /change payload, checked like the commands of a batch."""
+        fields = {**payload, "command": kind}
+        if fields.get("tank") is not None:
+            fields["tank"] = str(fields["tank"])
+        try:
+            command = Command.model_validate(fields)
+        except ValidationError as e:
+            raise CommandError([
+                {"message": f"{'.'.join(map(str, error['loc']))}: {error['msg']}"} for error in e.errors()
+            ]) from None
+        message = _command_error(command)
+        if message is not None:
+            raise CommandError([{"message": message}])
+        return command
+
+    def run(self, batch: CommandBatch) -> Dict[str, Any]:
+        """
+        Apply a batch of commands in order, all or nothing: if any command is
+        invalid none is applied (CommandError). The commands are published back
+        to back on the event loop, so no other event is handled in between.
+        A command whose idempotency key was already applied is not applied again
+        and reports the original result as a duplicate.
+        """
+        errors = [
+            {"index": index, "message": message}
+            for index, command in enumerate(batch.commands)
+            if (message := _command_error(command)) is not None
+        ]
+        if errors:
+            raise CommandError(errors)
+
+        now = time.time()
+        results = []
+        for index, command in enumerate(batch.commands):
+            key = command.idempotency_key
+            applied = self._applied_commands.get(key) if key is not None else None
+            if applied is not None:
+                results.append({**applied, "index": index, "status": "duplicate"})
+                continue
+
+            tank_id = command.tank or DEFAULT_TANK_ID
+            if command.command == "pot":
+                self._send_pot(tank_id, command.pot)
+            else:
+                self._send_button(tank_id, command.btn)
+            result = {"index": index, "status": "success", "command": command.command, "tank": tank_id,
+                      "applied_at": now}
+            if key is not None:
+                self._applied_commands.put(key, result)
+            results.append(result)
+        return {"results": results, "timestamp": now}
+
+    def _send_pot(self, tank_id: str, pot: Any):
+        self.bus.publish(join_topic(POT_TOPIC, tank_id), pot=pot)
+
+    def _send_button(self, tank_id: str, btn: Any):
+        self.bus.publish(join_topic(MODE_CHANGE_TOPIC, tank_id), btn=btn)
+
+
+def _command_error(command: Command) -> Optional[str]:
+    if command.tank is not None and (not command.tank or SEPARATOR in command.tank or is_wildcard(command.tank)):
+        return f"Invalid tank id '{command.tank}'"
+    if command.command == "pot" and command.pot is None:
+        return "Missing pot value"
+    if command.command == "change" and not command.btn:
+        return "Button not pressed"
+    return None
+
+
+class _IdempotencyLog:
+    """Results of the most recently applied idempotency keys (bounded LRU)."""
+
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        result = self._results.get(key)
+        if result is not None:
+            self._results.move_to_end(key)
+        return result
+
+    def put(self, key: str, result: Dict[str, Any]):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        while len(self._results) > self._capacity:
+            self._results.popitem(last=False)
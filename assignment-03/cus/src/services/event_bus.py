@@ -1,32 +1,478 @@
-from pubsub import pub
-from typing import Callable
+import asyncio
+import enum
+import logging
+import sys
+import threading
+import weakref
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from time import perf_counter
+from typing import Any, Callable, Deque, Dict, Iterable, Optional, Tuple
 from utils.logger import get_logger
+from utils.metrics import METRICS, CounterValue, HistogramValue
+from utils.topic_matcher import SEPARATOR, TopicMatcher, is_wildcard
+from utils.tracing import CURRENT_TRACE, Trace
 
 logger = get_logger(__name__)
 
+# Topics kept in the route cache, least recently published evicted first
+_ROUTE_CACHE_LIMIT = 1 << 12
+
+# Buses of the process, for the mailbox metrics collected at scrape time
+_BUSES: "weakref.WeakSet[EventBus]" = weakref.WeakSet()
+
+
+def _collect_mailboxes(attribute: str) -> Iterable[Tuple[Tuple[str, str], float]]:
+    for bus in list(_BUSES):
+        for mailbox in bus.mailboxes():
+            yield (mailbox.topic, _callback_name(mailbox.callback)), getattr(mailbox, attribute)
+
+
+# Topics are labelled by their first level: "level_in/t1" and "level_in/t2" count as "level_in"
+_PUBLISHED = METRICS.counter(
+    "cus_bus_published_total", "Events published on the bus, per topic (first level)", ("topic",))
+_HANDLER_SECONDS = METRICS.histogram(
+    "cus_bus_handler_seconds", "Time spent in bus listeners, per subscription", ("subscription", "subscriber"))
+_HANDLER_ERRORS = METRICS.counter(
+    "cus_bus_handler_errors_total", "Exceptions raised by bus listeners", ("subscription", "subscriber"))
+METRICS.gauge(
+    "cus_bus_mailbox_pending", "Events waiting in subscriber mailboxes", ("subscription", "subscriber"),
+    collect=lambda: _collect_mailboxes("pending"))
+METRICS.counter(
+    "cus_bus_mailbox_dropped_total", "Events discarded by full subscriber mailboxes", ("subscription", "subscriber"),
+    collect=lambda: _collect_mailboxes("dropped"))
+
+
+class _HandlerStats:
+    """Latency histogram and error counter of one subscription."""
+    __slots__ = ("seconds", "errors")
+
+    def __init__(self, topic: str, callback: Callable):
+        name = _callback_name(callback)
+        self.seconds: HistogramValue = _HANDLER_SECONDS.labels(topic, name)
+        self.errors: CounterValue = _HANDLER_ERRORS.labels(topic, name)
+
+
+class _Route:
+    """Deliveries of a concrete topic: (callback, stats) pairs, stats None for mailboxes (they time their listener)."""
+    __slots__ = ("deliveries", "published")
+
+    def __init__(self, topic: str, deliveries: Tuple[Tuple[Callable, Optional[_HandlerStats]], ...]):
+        self.deliveries = deliveries
+        self.published: CounterValue = _PUBLISHED.labels(topic.split(SEPARATOR, 1)[0])
+
+
+class MailboxPolicy(enum.Enum):
+    """Overflow policy of a subscriber mailbox."""
+    BLOCK = "block"              # async publishers wait for room
+    DROP_OLDEST = "drop_oldest"  # the oldest pending event is discarded
+    CONFLATE = "conflate"        # only the latest event per topic is kept
+
+
+class Mailbox:
+    """
+    Bounded queue owned by a single subscriber, drained by its own task.
+    Decouples a (possibly slow) listener from the publisher and from the
+    other listeners of the same topic.
+    """
+
+    def __init__(self, topic: str, callback: Callable, policy: MailboxPolicy, maxsize: int):
+        """
+        :param topic: Topic this mailbox is subscribed to.
+        :param callback: Listener invoked by the drain task.
+        :param policy: What to do when the mailbox is full.
+        :param maxsize: Maximum number of pending events.
+        """
+        if maxsize < 1:
+            raise ValueError("Mailbox maxsize must be at least 1")
+        self.topic = topic
+        self.callback = callback
+        self.policy = policy
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.stats = _HandlerStats(topic, callback)
+
+        # CONFLATE keeps { topic: kwargs }, the other policies a FIFO of (topic, kwargs)
+        self._pending: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._ready: Optional[asyncio.Event] = None
+        self._room: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __call__(self, **kwargs):
+        """Entry point used by EventBus.publish."""
+        self.offer(self.topic, kwargs)
+
+    def __len__(self) -> int:
+        return len(self._latest) if self.policy is MailboxPolicy.CONFLATE else len(self._pending)
+
+    @property
+    def pending(self) -> int:
+        return len(self)
+
+    def offer(self, topic: str, kwargs: Dict[str, Any]) -> bool:
+        """
+        Enqueue an event without waiting.
+        Returns False if the event was discarded because the mailbox is full.
+        """
+        if not self._ensure_task():
+            # No running loop (e.g. during wiring or in scripts): deliver inline
+            self._deliver(topic, kwargs)
+            return True
+
+        if self.policy is MailboxPolicy.CONFLATE:
+            if topic not in self._latest and len(self._latest) >= self.maxsize:
+                self._latest.pop(next(iter(self._latest)))
+                self.dropped += 1
+            self._latest[topic] = kwargs
+        elif len(self._pending) < self.maxsize:
+            self._pending.append((topic, kwargs))
+        elif self.policy is MailboxPolicy.DROP_OLDEST:
+            self._pending.popleft()
+            self._pending.append((topic, kwargs))
+            self.dropped += 1
+        else:
+            # BLOCK: a synchronous publisher cannot wait, the new event is lost
+            self.dropped += 1
+            logger.warning(f"[Bus] Mailbox of {_callback_name(self.callback)} full on {topic}, event dropped")
+            return False
+
+        self._ready.set()
+        return True
+
+    async def put(self, topic: str, kwargs: Dict[str, Any]):
+        """Enqueue an event, waiting for room if the policy is BLOCK."""
+        if self.policy is MailboxPolicy.BLOCK and self._ensure_task():
+            while len(self._pending) >= self.maxsize:
+                self._room.clear()
+                await self._room.wait()
+        self.offer(topic, kwargs)
+
+    def _ensure_task(self) -> bool:
+        """Lazily start the drain task on the running loop."""
+        if self._task is not None:
+            return True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self._ready = asyncio.Event()
+        self._room = asyncio.Event()
+        self._task = loop.create_task(self._drain())
+        return True
+
+    async def _drain(self):
+        """Deliver pending events one at a time, yielding to the loop in between."""
+        while True:
+            if not self._pending and not self._latest:
+                self._ready.clear()
+                await self._ready.wait()
+
+            if self.policy is MailboxPolicy.CONFLATE:
+                topic = next(iter(self._latest))
+                kwargs = self._latest.pop(topic)
+            else:
+                topic, kwargs = self._pending.popleft()
+                self._room.set()
+
+            self._deliver(topic, kwargs)
+            await asyncio.sleep(0)
+
+    def _deliver(self, topic: str, kwargs: Dict[str, Any]):
+        start = perf_counter()
+        try:
+            self.callback(**kwargs)
+        except Exception as e:
+            self.stats.errors.inc()
+            logger.error(f"[Bus] Error delivering {topic} to {_callback_name(self.callback)}: {e}")
+        self.stats.seconds.observe(perf_counter() - start)
+
+    def cancel(self):
+        """Cancel the drain task without waiting for it."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def close(self):
+        """Stop the drain task, discarding pending events."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self._pending.clear()
+        self._latest.clear()
+
+
 class EventBus:
     """
-    Instance-based Event Bus wrapper.
-    Hides pypubsub and allows true Dependency Injection.
+    Instance-based Event Bus.
+    Each instance owns its own topic table, so services only share
+    what they are explicitly wired to share (true Dependency Injection).
+
+    Subscribers are stored as an immutable tuple per (interned) topic,
+    rebuilt only when the subscription set changes: publishing is a
+    single dict lookup followed by a plain loop over the tuple.
+    Listeners are called inline unless they subscribe with a mailbox.
+
+    Topics may be MQTT-style filters ('+' and '#'): wildcard listeners are
+    also called with the captured levels as the ``wildcards`` keyword.
     """
 
     def __init__(self):
-        # We use the global pub instance internally, 
-        # but the services only interact with this wrapper instance.
-        self._engine = pub
+        # { topic: (callback_or_mailbox, ...) } for exact subscriptions
+        self._subscribers: Dict[str, Tuple[Callable, ...]] = {}
+        # Wildcard subscriptions: { filter: (callback_or_mailbox, ...) } plus their trie of (filter, entry)
+        self._wildcard_subscribers: Dict[str, Tuple[Callable, ...]] = {}
+        self._matcher: TopicMatcher[Tuple[str, Callable]] = TopicMatcher()
+        # { topic: route } resolved per published topic (bounded LRU), reset on (un)subscribe
+        self._routes: "OrderedDict[str, _Route]" = OrderedDict()
+        # { (topic or filter, inline listener): stats } (mailboxes keep their own)
+        self._stats: Dict[Tuple[str, Callable], _HandlerStats] = {}
+        _BUSES.add(self)
 
     def publish(self, topic: str, **kwargs):
         """Publish an event to a specific topic."""
-        try:
-            self._engine.sendMessage(topic, **kwargs)
+        route = self._routes.get(topic)
+        if route is None:
+            route = self._route(topic)
+        else:
+            self._routes.move_to_end(topic)
+        route.published.value += 1
+        if logger.isEnabledFor(logging.DEBUG):
             logger.debug(f"[Bus] Published to {topic} with {kwargs}")
-        except Exception as e:
-            logger.error(f"[Bus] Error publishing to {topic}: {e}")
 
-    def subscribe(self, topic: str, callback: Callable):
-        """Subscribe a listener to a specific topic."""
+        # The end of a delivery is the start of the next one: one clock read per listener
+        start = perf_counter()
+        for callback, stats in route.deliveries:
+            try:
+                callback(**kwargs)
+            except Exception as e:
+                if stats is not None:
+                    stats.errors.value += 1
+                logger.error(f"[Bus] Error delivering {topic} to {_callback_name(callback)}: {e}")
+            end = perf_counter()
+            if stats is not None:  # None for mailboxes: enqueuing is not the listener's time
+                seconds = stats.seconds
+                elapsed = end - start
+                seconds.counts[bisect_left(seconds.bounds, elapsed)] += 1
+                seconds.sum += elapsed
+            start = end
+
+    async def publish_async(self, topic: str, **kwargs):
+        """
+        Publish an event, waiting for room in subscriber mailboxes
+        with the BLOCK policy instead of dropping the event.
+        """
+        route = self._routes.get(topic)
+        if route is None:
+            route = self._route(topic)
+        else:
+            self._routes.move_to_end(topic)
+        route.published.value += 1
+        for callback, stats in route.deliveries:
+            if stats is None:
+                await callback.put(topic, kwargs)
+                continue
+            start = perf_counter()
+            try:
+                if isinstance(callback, _WildcardDelivery):
+                    await callback.put(topic, kwargs)
+                else:
+                    callback(**kwargs)
+            except Exception as e:
+                stats.errors.value += 1
+                logger.error(f"[Bus] Error delivering {topic} to {_callback_name(callback)}: {e}")
+            stats.seconds.observe(perf_counter() - start)
+
+    def _route(self, topic: str) -> _Route:
+        """Resolve (and cache) the deliveries of a concrete topic."""
+        deliveries = tuple((entry, self._stats_of(topic, entry)) for entry in self._subscribers.get(topic, ()))
+        if len(self._matcher):
+            deliveries += tuple(
+                (_WildcardDelivery(entry, topic, captures), self._stats_of(topic_filter, entry))
+                for (topic_filter, entry), captures in self._matcher.match(topic)
+            )
+        route = _Route(topic, deliveries)
+        if len(self._routes) >= _ROUTE_CACHE_LIMIT:
+            self._routes.popitem(last=False)
+        self._routes[sys.intern(topic)] = route
+        return route
+
+    def _stats_of(self, topic: str, entry: Callable) -> Optional[_HandlerStats]:
+        return None if isinstance(entry, Mailbox) else self._stats[(topic, entry)]
+
+    def subscribe(
+        self,
+        topic: str,
+        callback: Callable,
+        policy: Optional[MailboxPolicy] = None,
+        maxsize: int = 100,
+    ):
+        """
+        Subscribe a listener to a specific topic.
+
+        :param topic: Topic (or MQTT-style wildcard filter) to listen to.
+        :param callback: Listener, called with the published keyword arguments.
+        :param policy: If given, the listener gets its own bounded mailbox and
+                       drain task, and overflows are handled with this policy.
+        :param maxsize: Mailbox capacity (pending events, or topics for CONFLATE).
+        """
+        topic = sys.intern(topic)
+        wildcard = is_wildcard(topic)
+        table = self._wildcard_subscribers if wildcard else self._subscribers
+        callbacks = table.get(topic, ())
+        if any(_unwrap(cb) == callback for cb in callbacks):
+            logger.warning(f"[Bus] {_callback_name(callback)} already subscribed to: {topic}")
+            return
+        entry = callback if policy is None else Mailbox(topic, callback, policy, maxsize)
+        if policy is None:
+            self._stats[(topic, entry)] = _HandlerStats(topic, callback)
+        if wildcard:
+            self._matcher.add(topic, (topic, entry))
+        table[topic] = callbacks + (entry,)
+        self._routes.clear()
+        logger.info(f"[Bus] New subscription on: {topic}" + (f" ({policy.value} mailbox)" if policy else ""))
+
+    def unsubscribe(self, topic: str, callback: Callable):
+        """Remove a listener from a specific topic."""
+        wildcard = is_wildcard(topic)
+        table = self._wildcard_subscribers if wildcard else self._subscribers
+        callbacks = table.get(topic, ())
+        remaining = tuple(cb for cb in callbacks if _unwrap(cb) != callback)
+        if len(remaining) == len(callbacks):
+            logger.warning(f"[Bus] {_callback_name(callback)} is not subscribed to: {topic}")
+            return
+        for cb in callbacks:
+            if _unwrap(cb) != callback:
+                continue
+            if wildcard:
+                self._matcher.remove(topic, (topic, cb))
+            if isinstance(cb, Mailbox):
+                cb.cancel()
+            else:
+                self._stats.pop((topic, cb), None)
+        if remaining:
+            table[topic] = remaining
+        else:
+            del table[topic]
+        self._routes.clear()
+        logger.info(f"[Bus] Removed subscription on: {topic}")
+
+    def has_subscribers(self, topic: str) -> bool:
+        """Return True if at least one listener would receive an event on the topic."""
+        route = self._routes.get(topic)
+        if route is None:
+            route = self._route(topic)
+        else:
+            self._routes.move_to_end(topic)
+        return bool(route.deliveries)
+
+    def mailboxes(self) -> Tuple[Mailbox, ...]:
+        """All mailbox subscriptions, e.g. to inspect backlog and drop counters."""
+        tables = (self._subscribers, self._wildcard_subscribers)
+        return tuple(
+            cb for table in tables for callbacks in table.values() for cb in callbacks
+            if isinstance(cb, Mailbox)
+        )
+
+    async def close(self):
+        """Stop all mailbox drain tasks."""
+        await asyncio.gather(*(mailbox.close() for mailbox in self.mailboxes()))
+
+
+class _WildcardDelivery:
+    """Delivery of a concrete topic to a wildcard subscription, with its captures."""
+    __slots__ = ("target", "topic", "captures")
+
+    def __init__(self, target: Callable, topic: str, captures: Tuple[str, ...]):
+        self.target = target
+        self.topic = topic
+        self.captures = captures
+
+    def __call__(self, **kwargs):
+        kwargs["wildcards"] = self.captures
+        if isinstance(self.target, Mailbox):
+            # Mailboxes conflate per concrete topic, not per filter
+            self.target.offer(self.topic, kwargs)
+        else:
+            self.target(**kwargs)
+
+    async def put(self, topic: str, kwargs: Dict[str, Any]):
+        kwargs = {**kwargs, "wildcards": self.captures}
+        if isinstance(self.target, Mailbox):
+            await self.target.put(topic, kwargs)
+        else:
+            self.target(**kwargs)
+
+
+class ThreadSafeIngress:
+    """
+    Batched hand-off of events produced on foreign threads (e.g. paho's
+    network thread) into the asyncio loop that owns the EventBus.
+
+    Producers only append to a queue; the loop is woken with a single
+    call_soon_threadsafe per batch, and all dispatch happens on the loop thread.
+    The producer's current trace (utils.tracing) is carried with each event
+    and is current again while the event is dispatched.
+    """
+
+    def __init__(self, bus: EventBus, loop: asyncio.AbstractEventLoop):
+        """
+        :param bus: Bus events are published to.
+        :param loop: Loop owning the bus (where listeners must run).
+        """
+        self._bus = bus
+        self._loop = loop
+        self._queue: Deque[Tuple[str, Dict[str, Any], Optional[Trace]]] = deque()
+        self._lock = threading.Lock()
+        self._wakeup_pending = False
+
+    def publish(self, topic: str, **kwargs):
+        """Queue an event for publication on the loop thread. Safe to call from any thread."""
+        self._queue.append((topic, kwargs, CURRENT_TRACE.get()))
+        with self._lock:
+            if self._wakeup_pending:
+                return
+            self._wakeup_pending = True
         try:
-            self._engine.subscribe(callback, topic)
-            logger.info(f"[Bus] New subscription on: {topic}")
-        except Exception as e:
-            logger.error(f"[Bus] Error subscribing to {topic}: {e}")
+            self._loop.call_soon_threadsafe(self._flush)
+        except RuntimeError:
+            # Loop already closed (shutdown in progress)
+            with self._lock:
+                self._wakeup_pending = False
+            logger.warning(f"[Bus] Event loop closed, dropping event on {topic}")
+
+    def _flush(self):
+        """Publish the queued batch. Runs on the loop thread."""
+        with self._lock:
+            # Cleared before draining: events queued from now on schedule a new flush
+            self._wakeup_pending = False
+        publish = self._bus.publish
+        popleft = self._queue.popleft
+        for _ in range(len(self._queue)):
+            topic, kwargs, trace = popleft()
+            if trace is None:
+                publish(topic, **kwargs)
+                continue
+            trace.mark("dispatched")
+            token = CURRENT_TRACE.set(trace)
+            try:
+                publish(topic, **kwargs)
+            finally:
+                CURRENT_TRACE.reset(token)
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+
+def _unwrap(callback: Callable) -> Callable:
+    """Return the listener behind a subscription entry."""
+    if isinstance(callback, _WildcardDelivery):
+        callback = callback.target
+    return callback.callback if isinstance(callback, Mailbox) else callback
+
+
+def _callback_name(callback: Callable) -> str:
+    """Human readable name of a callback, used in log messages."""
+    callback = _unwrap(callback)
+    return getattr(callback, "__qualname__", repr(callback))
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from typing import AsyncIterator, Dict, Optional, Set
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Comment line sent on idle streams so proxies and browsers keep the connection open
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+
+def sse_frame(event: str, data: dict) -> bytes:
+    """A Server-Sent Events message, ready to be written to the socket."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+class EventStream:
+    """
+    Fan-out of dashboard updates to Server-Sent Events clients, per tank.
+
+    Each update is serialized once into an SSE frame and the same bytes are
+    queued to every client of the tank. Client queues are bounded: a client
+    that stops reading loses its oldest frames instead of growing memory or
+    slowing the others down. The last frame of each event type is kept and
+    replayed to new clients, so they start from the current state.
+
+    Must be used from the event loop thread.
+    """
+
+    def __init__(self, client_queue_size: int = 256, keepalive: float = 15.0):
+        """
+        :param client_queue_size: Frames buffered per client before the oldest are dropped.
+        :param keepalive: Seconds of silence before a keepalive comment is sent.
+        """
+        self._client_queue_size = client_queue_size
+        self._keepalive = keepalive
+        # { tank_id: client queues }
+        self._clients: Dict[str, Set[asyncio.Queue]] = {}
+        # { tank_id: { event: last frame } }, replayed on connect
+        self._last_frames: Dict[str, Dict[str, bytes]] = {}
+        self._closed = False
+
+    @property
+    def client_count(self) -> int:
+        return sum(len(clients) for clients in self._clients.values())
+
+    def has_clients(self, tank_id: str) -> bool:
+        return bool(self._clients.get(tank_id))
+
+    def broadcast(self, tank_id: str, event: str, data: dict, replay: bool = True):
+        """
+        Serialize an update once and queue it to every client of the tank.
+
+        :param replay: Keep the frame for clients connecting later (latest-value
+            events such as mode and valve); incremental events pass False.
+        """
+        clients = self._clients.get(tank_id)
+        if not clients and not replay:
+            return
+        frame = sse_frame(event, data)
+        if replay:
+            self._last_frames.setdefault(tank_id, {})[event] = frame
+        if clients:
+            for queue in clients:
+                _put_latest(queue, frame)
+
+    async def subscribe(self, tank_id: str) -> AsyncIterator[bytes]:
+        """
+        Frames for one client of a tank: the latest known state first, then
+        live updates and keepalives until the stream is closed or the client
+        goes away (the generator is then cancelled or closed).
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._client_queue_size)
+        for frame in self._last_frames.get(tank_id, {}).values():
+            _put_latest(queue, frame)
+        self._clients.setdefault(tank_id, set()).add(queue)
+        logger.debug(f"[EventStream] Client connected to '{tank_id}' ({self.client_count} total)")
+        try:
+            while not self._closed:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), self._keepalive)
+                except asyncio.TimeoutError:
+                    frame = KEEPALIVE_FRAME
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            clients = self._clients.get(tank_id)
+            if clients is not None:
+                clients.discard(queue)
+                if not clients:
+                    del self._clients[tank_id]
+            logger.debug(f"[EventStream] Client disconnected from '{tank_id}' ({self.client_count} total)")
+
+    def close(self):
+        """End every open stream (the server can then shut down without waiting for clients)."""
+        self._closed = True
+        for clients in self._clients.values():
+            for queue in clients:
+                _put_latest(queue, None)
+
+
+def _put_latest(queue: asyncio.Queue, frame: Optional[bytes]):
+    """Queue a frame, dropping the oldest one if the client is too far behind."""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(frame)
@@ -1,26 +1,35 @@
 import asyncio
-from collections import deque
+import logging
 import time
+import numpy as np
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Callable, Any, Dict, Optional
+from fastapi.responses import StreamingResponse
+from typing import Callable, Any, Dict, List, Literal, Mapping, Optional, Tuple, Union
 
 from services.event_bus import EventBus
+from models.level_history import LevelHistory, readings_to_list
+from models.level_store import LevelStore
+from models.schemas import CommandBatch, SystemState
 from .base_service import BaseService
+from .commands import CommandError, CommandProcessor
+from .event_stream import EventStream
+from .snapshot_cache import SnapshotCache, serialize
+from utils.downsampling import bucket_aggregate, lttb
 from utils.logger import get_logger
+from utils.metrics import CONTENT_TYPE, METRICS
+from utils.tracing import TRACER
 
 # Import CORS settings from config
 try:
-    from config import (ALLOWED_ORIGINS, ALLOWED_CREDENTIALS, ALLOWED_METHODS, ALLOWED_HEADERS,
-                        POT_TOPIC, MODE_CHANGE_TOPIC)
+    from config import ALLOWED_ORIGINS, ALLOWED_CREDENTIALS, ALLOWED_METHODS, ALLOWED_HEADERS, DEFAULT_TANK_ID
 except ImportError:
     ALLOWED_ORIGINS = ["*"]
     ALLOWED_CREDENTIALS = True
     ALLOWED_METHODS = ["*"]
     ALLOWED_HEADERS = ["*"]
-    POT_TOPIC = "pot"
-    MODE_CHANGE_TOPIC = "mode_change"
+    DEFAULT_TANK_ID = "default"
 
 logger = get_logger(__name__)
 
@@ -30,17 +39,35 @@ class HttpService(BaseService):
     HTTP Infrastructure Adapter.
     Exposes REST API with FastAPI, translates HTTP POST/PUT into EventBus publications,
     and publishes periodic data to EventBus topics.
+    Every resource is per tank, selected by the `tank` query parameter.
+    Mode, valve, analytics and new level readings are also pushed to dashboards
+    as Server-Sent Events (GET /stream), serialized once per update.
+    Latest-value GETs are served from a versioned snapshot cache with ETags.
     """
 
     def __init__(self, event_bus: EventBus, host: str = "0.0.0.0", port: int = 8000,
-                 publish_interval: float = 10.0, api_prefix: str = "/api/v1"):
+                 publish_interval: float = 10.0, api_prefix: str = "/api/v1",
+                 level_stores: Optional[Mapping[str, LevelStore]] = None,
+                 gzip_min_size: Optional[int] = 1024, idempotency_keys: int = 4096):
+        """
+        :param level_stores: { tank_id: LevelStore } for range queries on the persistent history.
+        :param gzip_min_size: Cached responses at least this large are also served
+            gzip-compressed (None: never compress).
+        :param idempotency_keys: Idempotency keys of applied commands remembered to discard retries.
+        """
         super().__init__("http_service", event_bus)
         self.host = host
         self.port = port
         self._publish_interval = publish_interval
-        self._last_publish_time = 0.0
         self._api_prefix = api_prefix.rstrip("/")
-        self._latest_received: Dict[str, Any] = {}
+        # { tank_id: { "mode" | "substate" | "valve" | "analytics" | "levels": latest value } }
+        self._latest_received: Dict[str, Dict[str, Any]] = {}
+        self._level_stores: Mapping[str, LevelStore] = level_stores if level_stores is not None else {}
+        self._stream = EventStream()
+        self._snapshots = SnapshotCache(gzip_min_size)
+        self._commands = CommandProcessor(event_bus, idempotency_keys)
+        # { tank_id: LevelHistory.total already streamed }
+        self._streamed_levels: Dict[str, int] = {}
 
         self._publish_topics: Dict[str, Callable[[], Any]] = {}
 
@@ -67,34 +94,186 @@ class HttpService(BaseService):
 
     def _setup_routes(self):
         # GET endpoints
+        @self._app.get(f"{self._api_prefix}/tanks")
+        async def get_tanks():
+            return {"tanks": sorted(self._latest_received), "timestamp": time.time()}
+
+        @self._app.get(f"{self._api_prefix}/status")
+        async def get_status(
+            request: Request,
+            since: Optional[int] = Query(None, ge=0, description="Also return the readings after this sequence number"),
+            tank: str = Query(DEFAULT_TANK_ID, description="Tank id"),
+        ):
+            if since is not None:
+                # Deltas depend on the client's position: small, built per request
+                return self._status(tank, since)
+            return self._snapshot_response(request, tank, "status", lambda: self._status(tank))
+
         @self._app.get(f"{self._api_prefix}/mode")
-        async def get_mode():
-            return {"mode": self._latest_received.get("mode"), "timestamp": time.time()}
+        async def get_mode(request: Request, tank: str = Query(DEFAULT_TANK_ID, description="Tank id")):
+            return self._snapshot_response(
+                request, tank, "mode",
+                lambda: {"mode": _enum_value(self._latest(tank).get("mode")), "timestamp": time.time()},
+            )
 
         @self._app.get(f"{self._api_prefix}/levels")
-        async def get_levels():
-            return {"levels": self._latest_received.get("levels", []), "timestamp": time.time()}
+        async def get_levels(
+            request: Request,
+            start: Optional[float] = Query(None, alias="from", description="Range start (Unix seconds)"),
+            end: Optional[float] = Query(None, alias="to", description="Range end (Unix seconds)"),
+            limit: Optional[int] = Query(None, ge=0, description="Only the most recent readings of the range"),
+            points: Optional[int] = Query(None, ge=3, description="Downsample to about this many points/buckets"),
+            bucket: Optional[float] = Query(None, gt=0, description="Bucket width in seconds (buckets mode, instead of points)"),
+            downsample: Literal["buckets", "lttb"] = Query("buckets", description="Downsampling method"),
+            tank: str = Query(DEFAULT_TANK_ID, description="Tank id"),
+        ):
+            ranged = start is not None or end is not None or limit is not None
+            if points is not None and bucket is not None:
+                raise HTTPException(status_code=400, detail="Give either 'points' or 'bucket', not both")
+            if not ranged and points is None and bucket is None:
+                return self._snapshot_response(request, tank, "levels", lambda: self._levels_snapshot(tank))
+
+            if ranged:
+                # Range query on the persistent history
+                level_store = self._level_stores.get(tank)
+                if level_store is None:
+                    raise HTTPException(status_code=503, detail=f"Level history store not configured for tank '{tank}'")
+                if start is not None and end is not None and start > end:
+                    raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+                levels, timestamps = level_store.query(start, end, limit)
+            else:
+                history: Optional[LevelHistory] = self._latest(tank).get("levels")
+                levels, timestamps = history.window() if history is not None else (np.empty(0), np.empty(0))
+                if bucket is not None:
+                    # The in-memory history keeps the device timestamps, in milliseconds
+                    bucket *= 1000.0
+
+            response: Dict[str, Any] = {"from": start, "to": end, "timestamp": time.time()}
+            if downsample == "lttb" and points is not None:
+                timestamps, levels = lttb(timestamps, levels, points)
+            elif points is not None or bucket is not None:
+                response["buckets"] = _buckets_to_list(bucket_aggregate(timestamps, levels, width=bucket, buckets=points))
+                return response
+            response["levels"] = readings_to_list(levels, timestamps)
+            return response
+
+        @self._app.get(f"{self._api_prefix}/analytics")
+        async def get_analytics(request: Request, tank: str = Query(DEFAULT_TANK_ID, description="Tank id")):
+            return self._snapshot_response(
+                request, tank, "analytics",
+                lambda: {"analytics": self._latest(tank).get("analytics", {}), "timestamp": time.time()},
+            )
 
         @self._app.get(f"{self._api_prefix}/valve")
-        async def get_valve():
-            return {"valve": self._latest_received.get("valve", 0.0), "timestamp": time.time()}
+        async def get_valve(request: Request, tank: str = Query(DEFAULT_TANK_ID, description="Tank id")):
+            return self._snapshot_response(
+                request, tank, "valve",
+                lambda: {"valve": self._latest(tank).get("valve", 0.0), "timestamp": time.time()},
+            )
+
+        @self._app.get(f"{self._api_prefix}/stream")
+        async def stream(tank: str = Query(DEFAULT_TANK_ID, description="Tank id")):
+            return StreamingResponse(
+                self._stream.subscribe(tank),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        @self._app.get("/metrics", include_in_schema=False)
+        async def get_metrics():
+            return Response(await self._metrics(), media_type=CONTENT_TYPE)
+
+        @self._app.get(f"{self._api_prefix}/traces")
+        async def get_traces(limit: int = Query(20, ge=0, le=1000, description="Recent traces returned")):
+            return await self._traces(limit)
 
         # POST endpoints
         @self._app.post(f"{self._api_prefix}/pot")
         async def set_valve(payload: dict):
-            pot = payload.get("pot")
-            if pot is not None:
-                self.bus.publish(POT_TOPIC, pot=pot)
-                return {"status": "success", "sent": pot}
-            return {"status": "error", "message": "Missing pot value"}, 400
+            return await self._submit("pot", payload)
 
         @self._app.post(f"{self._api_prefix}/change")
         async def set_btn(payload: dict):
-            btn = payload.get("btn", False)
-            if btn:
-                self.bus.publish(MODE_CHANGE_TOPIC, btn=btn)
-                return {"status": "success", "sent": btn}
-            return {"status": "error", "message": "Button not pressed"}, 400
+            return await self._submit("change", payload)
+
+        @self._app.post(f"{self._api_prefix}/commands")
+        async def run_commands(batch: CommandBatch):
+            return await self._submit("commands", batch)
+
+    async def _metrics(self) -> str:
+        """Metrics of the control process, in the Prometheus text format."""
+        return METRICS.render()
+
+    async def _traces(self, limit: int) -> Dict[str, Any]:
+        """Sensor-to-actuator latency: percentiles per stage and the most recent traces."""
+        return {"stages": TRACER.summary(), "traces": TRACER.recent(limit), "timestamp": time.time()}
+
+    # ===================== Commands =====================
+    async def _submit(self, kind: str, payload: Union[dict, CommandBatch]) -> Any:
+        """Apply a command (see CommandProcessor.submit) and return the response body."""
+        try:
+            return self._commands.submit(kind, payload)
+        except CommandError as e:
+            raise HTTPException(status_code=400, detail=e.errors)
+
+    # ===================== Snapshot cache =====================
+    def _levels_snapshot(self, tank_id: str) -> Dict[str, Any]:
+        levels: Optional[LevelHistory] = self._latest(tank_id).get("levels")
+        return {"levels": levels.to_list() if levels is not None else [], "timestamp": time.time()}
+
+    def _status(self, tank_id: str, since: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Consistent view of a tank, read in one step on the event loop.
+        `seq` counts the readings received so far; with `since`, the readings
+        after that sequence number are included. `complete` is False when they
+        are not all available any more (overwritten in the history, or a
+        sequence number of a previous run): the client should then reload.
+        """
+        latest = self._latest(tank_id)
+        mode = latest.get("mode")
+        history: Optional[LevelHistory] = latest.get("levels")
+        current = history.latest() if history is not None else None
+        seq = history.total if history is not None else 0
+        status: Dict[str, Any] = {
+            "tank": tank_id,
+            "mode": _enum_value(mode),
+            "substate": _enum_value(latest.get("substate")) if mode == SystemState.AUTOMATIC else None,
+            "valve": latest.get("valve", 0.0),
+            "level": {"water_level": current[0], "timestamp": current[1]} if current is not None else None,
+            "seq": seq,
+            "timestamp": time.time(),
+        }
+        if since is not None:
+            new = seq - since
+            complete = 0 <= new <= (len(history) if history is not None else 0)
+            status["levels"] = history.to_list(new if complete else None) if history is not None else []
+            status["complete"] = complete
+        return status
+
+    def _snapshot_response(self, request: Request, tank_id: str, resource: str,
+                           build: Callable[[], Dict[str, Any]]) -> Response:
+        """
+        Serve the cached JSON of a resource, serialized once per version.
+        Answers 304 when the client's If-None-Match already names the version.
+        """
+        if tank_id not in self._latest_received:
+            # Nothing received for this tank (yet): don't cache arbitrary query values
+            return Response(serialize(build()), media_type="application/json")
+
+        snapshot = self._snapshots.get(tank_id, resource, build)
+        compress = (self._snapshots.should_compress(snapshot)
+                    and "gzip" in request.headers.get("accept-encoding", ""))
+        headers = {
+            "ETag": snapshot.gzip_etag if compress else snapshot.etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if snapshot.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+            return Response(snapshot.gzip_body(), media_type="application/json", headers=headers)
+        return Response(snapshot.body, media_type="application/json", headers=headers)
 
     # ===================== Periodic publishing =====================
     def configure_periodic_publishing(self, topic: str, data_generator: Callable):
@@ -118,18 +297,11 @@ class HttpService(BaseService):
 
     # ===================== Service lifecycle =====================
     async def run(self):
-        """Avvia il server Uvicorn + loop di pubblicazione periodica."""
+        """Avvia il server Uvicorn + job di pubblicazione periodica."""
         self._server_task = asyncio.create_task(self._run_server())
-
-        while self._running:
-            now = time.monotonic()
-            if now - self._last_publish_time >= self._publish_interval:
-                await self._periodic_publish()
-                self._last_publish_time = now
-            await asyncio.sleep(1)
-
-        if self._server_task:
-            await self._server_task
+        if self._publish_topics:
+            self.every(self._publish_interval, self._periodic_publish, first=0.0)
+        await self._server_task
 
     async def _run_server(self):
         config_uvicorn = uvicorn.Config(
@@ -149,19 +321,92 @@ class HttpService(BaseService):
 
     async def stop(self):
         """Arresto pulito del server Uvicorn."""
+        self._stream.close()
         if self._server:
             self._server.should_exit = True
         await super().stop()
 
     # ===================== Event Bus callbacks =====================
-    def on_valve_update(self, opening: float):
-        logger.info(f"[{self.name}] Valve update received: {opening}")
-        self._latest_received["valve"] = opening
+    # Subscribed to "<topic>/+": the captured level is the tank id.
+    def _latest(self, tank_id: str) -> Dict[str, Any]:
+        return self._latest_received.get(tank_id, {})
+
+    def _tank_state(self, wildcards: Tuple[str, ...]) -> Dict[str, Any]:
+        tank_id = _tank_id(wildcards)
+        state = self._latest_received.get(tank_id)
+        if state is None:
+            state = self._latest_received[tank_id] = {}
+        return state
+
+    def _invalidate(self, wildcards: Tuple[str, ...], resource: str):
+        """Bump the cached version of a resource and, unless it is analytics, of /status."""
+        tank_id = _tank_id(wildcards)
+        self._snapshots.invalidate(tank_id, resource)
+        if resource != "analytics":
+            self._snapshots.invalidate(tank_id, "status")
+
+    def on_substate_update(self, substate: str, wildcards: Tuple[str, ...] = ()):
+        logger.debug(f"[{self.name}] Substate update received: {substate} {wildcards}")
+        self._tank_state(wildcards)["substate"] = substate
+        self._invalidate(wildcards, "substate")
+        self._stream.broadcast(_tank_id(wildcards), "substate", {"substate": _enum_value(substate)})
+
+    def on_valve_update(self, opening: float, wildcards: Tuple[str, ...] = ()):
+        logger.info(f"[{self.name}] Valve update received: {opening} {wildcards}")
+        self._tank_state(wildcards)["valve"] = opening
+        self._invalidate(wildcards, "valve")
+        self._stream.broadcast(_tank_id(wildcards), "valve", {"valve": opening})
+
+    def on_mode_update(self, mode: str, wildcards: Tuple[str, ...] = ()):
+        logger.info(f"[{self.name}] Mode update received: {mode} {wildcards}")
+        self._tank_state(wildcards)["mode"] = mode
+        self._invalidate(wildcards, "mode")
+        self._stream.broadcast(_tank_id(wildcards), "mode", {"mode": _enum_value(mode)})
 
-    def on_mode_update(self, mode: str):
-        logger.info(f"[{self.name}] Mode update received: {mode}")
-        self._latest_received["mode"] = mode
+    def on_analytics_update(self, analytics: dict, wildcards: Tuple[str, ...] = ()):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[{self.name}] Analytics update received: {analytics}")
+        self._tank_state(wildcards)["analytics"] = analytics
+        self._invalidate(wildcards, "analytics")
+        self._stream.broadcast(_tank_id(wildcards), "analytics", {"analytics": analytics})
 
-    def on_levels_out(self, levels: deque):
-        logger.info(f"[{self.name}] Levels update received: {levels}")
-        self._latest_received["levels"] = levels
+    def on_levels_out(self, levels: LevelHistory, wildcards: Tuple[str, ...] = ()):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[{self.name}] Levels update received: {len(levels)} readings")
+        self._tank_state(wildcards)["levels"] = levels
+        self._invalidate(wildcards, "levels")
+        self._stream_levels(_tank_id(wildcards), levels)
+
+    def _stream_levels(self, tank_id: str, levels: LevelHistory):
+        """
+        Push the readings appended since the last update. Updates are conflated,
+        so one event may carry several readings; readings already overwritten in
+        the history are skipped.
+        """
+        streamed = self._streamed_levels.get(tank_id, 0)
+        self._streamed_levels[tank_id] = levels.total
+        if not self._stream.has_clients(tank_id):
+            return
+        new = min(levels.total - streamed, len(levels))
+        if new > 0:
+            self._stream.broadcast(tank_id, "levels", {"levels": readings_to_list(*levels.window(new)), "seq": levels.total},
+                                   replay=False)
+
+
+def _tank_id(wildcards: Tuple[str, ...]) -> str:
+    return wildcards[0] if wildcards else DEFAULT_TANK_ID
+
+
+def _enum_value(value: Any) -> Any:
+    return getattr(value, "value", value)
+
+
+def _buckets_to_list(buckets: Dict[str, np.ndarray]) -> List[Dict[str, float]]:
+    """Aggregated bucket columns as JSON-ready rows."""
+    return [
+        {"timestamp": t, "min": lo, "max": hi, "avg": avg, "count": count}
+        for t, lo, hi, avg, count in zip(
+            buckets["timestamp"].tolist(), buckets["min"].tolist(), buckets["max"].tolist(),
+            buckets["avg"].tolist(), buckets["count"].tolist(),
+        )
+    ]
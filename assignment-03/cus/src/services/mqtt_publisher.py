@@ -0,0 +1,116 @@
+import asyncio
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from models.codecs import JSON_CODEC, Codec
+from utils.metrics import METRICS
+
+_SKIPPED = METRICS.counter(
+    "cus_mqtt_unchanged_skipped_total", "Outgoing MQTT payloads not published: same content as the last one").labels()
+_COALESCED = METRICS.counter(
+    "cus_mqtt_coalesced_total", "Outgoing MQTT payloads superseded by a newer one within the window").labels()
+
+
+class OutgoingPublisher:
+    """
+    Outgoing side of the MQTTService: publishes the state of each MQTT topic
+    only when it changes.
+
+    - Coalescing: the first update of an idle topic is published at once and
+      opens a `window`; updates arriving within it only replace the pending
+      state, which is published when the window ends (latest wins).
+    - Change detection: each state is serialized once (with the topic's codec) and its hash compared
+      with the one of the last payload the broker accepted; equal payloads
+      are not published again.
+    - The serialized bytes of each topic are kept, so the whole state can be
+      re-sent (e.g. after a reconnect) without serializing it again.
+
+    Must be used from the event loop thread.
+    """
+
+    def __init__(self, send: Callable[[str, bytes], bool], window: float = 0.05):
+        """
+        :param send: Publishes a payload on a topic; returns False if it could not be sent.
+        :param window: Coalescing window in seconds (0: publish every change at once).
+        """
+        self._send = send
+        self._window = window
+        # { topic: (hash, payload) } latest serialized state
+        self._payloads: Dict[str, Tuple[int, bytes]] = {}
+        # { topic: hash } of the payloads accepted by the broker connection
+        self._published: Dict[str, int] = {}
+        # { topic: (state, codec) } waiting for the end of the window
+        self._pending: Dict[str, Tuple[Any, Codec]] = {}
+        # { topic: loop time } end of the topic's current window
+        self._window_end: Dict[str, float] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def offer(self, topic: str, state: Any, codec: Codec = JSON_CODEC):
+        """New state of a topic, serialized with `codec`."""
+        if self._window <= 0:
+            self._publish(topic, state, codec)
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No running loop (e.g. in scripts): nothing to coalesce with
+            self._publish(topic, state, codec)
+            return
+
+        now = loop.time()
+        if topic in self._pending or now < self._window_end.get(topic, 0.0):
+            if topic in self._pending:
+                _COALESCED.value += 1
+            self._pending[topic] = (state, codec)
+            self._arm(loop, self._window_end[topic])
+            return
+        self._window_end[topic] = now + self._window
+        self._publish(topic, state, codec)
+
+    def republish(self):
+        """Send the latest state of every topic again (e.g. after reconnecting)."""
+        self._published.clear()
+        for topic, (digest, payload) in self._payloads.items():
+            if self._send(topic, payload):
+                self._published[topic] = digest
+
+    def close(self):
+        """Publish the pending states now and stop the window timer."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+        for topic, (state, codec) in pending.items():
+            self._publish(topic, state, codec)
+
+    def _arm(self, loop: asyncio.AbstractEventLoop, when: float):
+        """Have the timer fire at `when` at the latest (it follows the earliest pending window end)."""
+        if self._timer is not None:
+            if self._timer.when() <= when:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_at(when, self._flush, loop)
+
+    def _flush(self, loop: asyncio.AbstractEventLoop):
+        """Publish the pending topics whose window is over; the others wait for their own."""
+        self._timer = None
+        now = loop.time()
+        due = [topic for topic in self._pending if self._window_end[topic] <= now]
+        for topic in due:
+            state, codec = self._pending.pop(topic)
+            self._window_end[topic] = now + self._window
+            self._publish(topic, state, codec)
+        if self._pending:
+            self._arm(loop, min(self._window_end[topic] for topic in self._pending))
+
+    def _publish(self, topic: str, state: Any, codec: Codec):
+        payload = codec.encode(state)
+        digest = hash(payload)
+        self._payloads[topic] = (digest, payload)
+        if self._published.get(topic) == digest:
+            _SKIPPED.value += 1
+            return
+        if self._send(topic, payload):
+            self._published[topic] = digest
@@ -1,28 +1,49 @@
 import asyncio
 import enum
-import json
-import time
+import logging
 import paho.mqtt.client as mqtt
-from typing import Dict, Optional
-from services.event_bus import EventBus
+from typing import Dict, Optional, Tuple
+from models.codecs import JSON_CODEC, Codec
+from services.event_bus import EventBus, ThreadSafeIngress
 from .base_service import BaseService
+from .mqtt_publisher import OutgoingPublisher
+from .mqtt_transport import AsyncMqttClient
 from utils.logger import get_logger
+from utils.metrics import METRICS
+from utils.topic_matcher import TopicMatcher, fill_wildcards, is_wildcard
+from utils.tracing import CURRENT_TRACE, TRACER
 
 logger = get_logger(__name__)
 
+# Received/invalid are only updated by paho's network I/O (its thread or the loop), the others on the loop
+_RECEIVED = METRICS.counter("cus_mqtt_messages_received_total", "MQTT messages received").labels()
+_RECEIVED_BYTES = METRICS.counter("cus_mqtt_received_bytes_total", "Payload bytes of the MQTT messages received").labels()
+_INVALID = METRICS.counter("cus_mqtt_invalid_messages_total", "MQTT messages that could not be decoded").labels()
+_PUBLISHED = METRICS.counter("cus_mqtt_messages_published_total", "MQTT messages published").labels()
+_PUBLISHED_BYTES = METRICS.counter("cus_mqtt_published_bytes_total", "Payload bytes of the MQTT messages published").labels()
+_CONNECTED = METRICS.gauge("cus_mqtt_connected", "1 while connected to the MQTT broker").labels()
+
 class QOSLevel(enum.Enum):
     """MQTT Quality of Service Levels."""
     AT_MOST_ONCE = 0
     AT_LEAST_ONCE = 1
     EXACTLY_ONCE = 2
 
+
+class MQTTTransport(enum.Enum):
+    """How the paho client's network I/O is driven."""
+    THREAD = "thread"    # paho's network thread (loop_start), messages handed off to the loop
+    ASYNCIO = "asyncio"  # the socket is watched by the event loop (see AsyncMqttClient)
+
 class MQTTService(BaseService):
     """
     MQTT Infrastructure Adapter.
     Acts as a bridge between an external MQTT Broker and the internal EventBus.
     """
 
-    def __init__(self, broker: str, port: int, event_bus: EventBus, qos: QOSLevel = QOSLevel.AT_MOST_ONCE, publish_interval: float = 5.0):
+    def __init__(self, broker: str, port: int, event_bus: EventBus, qos: QOSLevel = QOSLevel.AT_MOST_ONCE,
+                 coalesce_window: float = 0.05, retain: bool = True,
+                 transport: MQTTTransport = MQTTTransport.THREAD):
         """
         Initialize the MQTT service.
         
@@ -30,41 +51,69 @@ class MQTTService(BaseService):
         :param port: MQTT broker port.
         :param event_bus: Injected instance of EventBus.
         :param qos: Quality of Service level.
-        :param publish_interval: Interval in seconds for periodic publishing.
+        :param coalesce_window: Seconds within which the updates of an outgoing
+            topic are coalesced (latest wins); unchanged states are not republished.
+        :param retain: Publish the outgoing states as retained messages, so
+            subscribers get the current state as soon as they subscribe.
+        :param transport: Network I/O on paho's thread, or on the event loop
+            (falls back to the thread if the loop cannot watch sockets).
         """
         super().__init__("mqtt_service", event_bus)
         self.broker = broker
         self.port = port
         self.qos = qos.value
-        self._publish_interval = publish_interval
-        self._last_publish_time = 0.0
+        self._retain = retain
+        self._transport = transport
         
         # Paho Client setup
         self._client = mqtt.Client()
         self._connected = False
         
-        # Topic Mapping: { "mqtt/topic": "bus.topic" }
+        # Topic Mapping: { "mqtt/topic": "bus.topic" }, keys may use + and # wildcards
         self._incoming_map: Dict[str, str] = {}
+        self._incoming_matcher: TopicMatcher[Tuple[str, Codec]] = TopicMatcher()
         # Internal topics to listen to for publishing to MQTT: { "bus.topic": "mqtt/topic" }
         self._outgoing_map: Dict[str, str] = {}
-        self._last_bus_data: Dict[str, dict] = {}
+        # Payload format per MQTT topic (or filter / template), JSON if not listed
+        self._codecs: Dict[str, Codec] = {}
+        # Outgoing states, published on change (serialized once, re-sent after reconnecting)
+        self._outgoing = OutgoingPublisher(self._send, coalesce_window)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Hand-off from paho's network thread to the event loop (created in setup)
+        self._ingress: Optional[ThreadSafeIngress] = None
+        # Event loop driven client (ASYNCIO transport, created in setup)
+        self._async_client: Optional[AsyncMqttClient] = None
 
         # Configure Callbacks
         self._client.on_connect = self._on_mqtt_connect
         self._client.on_message = self._on_mqtt_message
         self._client.on_disconnect = self._on_mqtt_disconnect
 
-    def configure_messaging(self, incoming: Optional[Dict[str, str]] = None, outgoing: Optional[Dict[str, str]] = None):
+    def configure_messaging(self, incoming: Optional[Dict[str, str]] = None, outgoing: Optional[Dict[str, str]] = None,
+                            codecs: Optional[Dict[str, Codec]] = None):
         """
         Wire MQTT topics to internal Event Bus topics.
         
         :param incoming: Map of { "mqtt/topic": "internal.bus.topic" }
-                        MQTT riceve da broker → pubblica su bus
+                        MQTT riceve da broker → pubblica su bus.
+                        Keys may be wildcard filters ("tank/+/level", "site/#"):
+                        if the bus topic is a template ("level_in/+") the captured
+                        levels fill it, otherwise they are published as ``wildcards``.
         :param outgoing: Map of { "internal.bus.topic": "external/mqtt/topic" }
                         Bus riceve eventi → pubblica su MQTT broker
+                        Wildcard bus topics ("mode/+") fill the MQTT topic template
+                        ("tank/+/mode") with the captured levels.
+        :param codecs: Map of { "mqtt/topic": Codec } with the payload format of
+                        incoming and outgoing MQTT topics, as written in the maps
+                        above (JSON for the topics not listed).
         """
+        if codecs:
+            self._codecs = codecs
         if incoming:
             self._incoming_map = incoming
+            self._incoming_matcher = TopicMatcher()
+            for mqtt_topic, bus_topic in incoming.items():
+                self._incoming_matcher.add(mqtt_topic, (bus_topic, self._codecs.get(mqtt_topic, JSON_CODEC)))
             logger.info(f"[{self.name}] Incoming mapping: {incoming}")
         
         if outgoing:
@@ -79,10 +128,17 @@ class MQTTService(BaseService):
     async def setup(self):
         """Establish connection with the MQTT broker."""
         logger.debug(f"[{self.name}] setup() called - incoming map: {self._incoming_map}")
+        loop = self._loop = asyncio.get_running_loop()
+        if self._transport is MQTTTransport.ASYNCIO:
+            if hasattr(asyncio, "ProactorEventLoop") and isinstance(loop, asyncio.ProactorEventLoop):
+                logger.warning(f"[{self.name}] Event loop cannot watch sockets, using paho's network thread")
+            else:
+                await self._connect_async()
+                return
+        self._ingress = ThreadSafeIngress(self.bus, loop)
         try:
             logger.info(f"[{self.name}] Attempting to connect to broker {self.broker}:{self.port}...")
             # Connect using the thread executor to prevent blocking the event loop
-            loop = asyncio.get_running_loop()
             await loop.run_in_executor(None, lambda: self._client.connect(self.broker, self.port, keepalive=60))
             
             # Start the background threaded loop provided by paho-mqtt
@@ -91,89 +147,127 @@ class MQTTService(BaseService):
         except Exception as e:
             logger.error(f"[{self.name}] Failed to connect to MQTT broker: {e}")
 
-    async def run(self):
-        """Monitor connection status and maintain the service alive."""
-        logger.info(f"[{self.name}] run() started, entering main loop...")
-        while self._running:
-            if self._connected:
-                now = time.monotonic()
-                if now - self._last_publish_time >= self._publish_interval:
-                    await self._periodic_publish()
-                    self._last_publish_time = now
-            else:
-                # Connection logic is handled by paho's loop_start auto-reconnect
-                await asyncio.sleep(5)
-            await asyncio.sleep(1)
-        logger.info(f"[{self.name}] run() exiting...")
-    
-    async def _periodic_publish(self):
-        """Pubblica periodicamente i dati in cache su MQTT."""
+    async def _connect_async(self):
+        """Connect with the event loop driven client; it keeps reconnecting in the background."""
+        self._async_client = AsyncMqttClient(self._client, self.scheduler)
         try:
-            for bus_topic, data in self._last_bus_data.items():
-                mqtt_topic = self._outgoing_map.get(bus_topic)
-                if mqtt_topic and data:
-                    payload = json.dumps(data)
-                    self._client.publish(mqtt_topic, payload, qos=self.qos)
-                    logger.debug(f"[{self.name}] Periodic publish to {mqtt_topic}")
-        except Exception as e:
-            logger.error(f"[{self.name}] Error in periodic publish: {e}")
+            logger.info(f"[{self.name}] Connecting to broker {self.broker}:{self.port} (asyncio transport)...")
+            await self._async_client.connect(self.broker, self.port, keepalive=60)
+        except (OSError, asyncio.TimeoutError) as e:
+            logger.error(f"[{self.name}] Failed to connect to MQTT broker: {e}")
+
+    async def run(self):
+        """Outgoing states are published on change; connections are re-established by the transport."""
+        await self.wait_until_stopped()
 
     def _on_mqtt_connect(self, client, userdata, flags, rc):
         """Callback invoked when connected to the broker."""
         if rc == 0:
             self._connected = True
+            _CONNECTED.set(1)
             logger.info(f"[{self.name}] Successfully connected to MQTT broker.")
             for mqtt_topic in self._incoming_map.keys():
                 client.subscribe(mqtt_topic, qos=self.qos)
                 logger.info(f"[{self.name}] Subscribed to MQTT: {mqtt_topic}")
+            # Bring the broker up to date: states may have changed (or not been sent) while disconnected
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._outgoing.republish)
         else:
             logger.error(f"[{self.name}] Connection failed with result code {rc}")
 
     def _on_mqtt_disconnect(self, client, userdata, rc):
         """Callback invoked when disconnected."""
         self._connected = False
+        _CONNECTED.set(0)
         logger.warning(f"[{self.name}] Disconnected from broker (rc: {rc}).")
 
     def _on_mqtt_message(self, client, userdata, msg):
-        """Handle incoming MQTT messages and publish them to the internal Event Bus."""
+        """
+        Handle incoming MQTT messages and publish them to the internal Event Bus.
+        With the THREAD transport it runs on paho's network thread: the payload
+        is decoded here, while the bus dispatch is handed off to the event loop
+        through the ingress queue. With the ASYNCIO transport it runs on the
+        loop and publishes directly.
+        Each message starts a latency trace, carried along by the ingress.
+        """
+        _RECEIVED.value += 1
+        _RECEIVED_BYTES.value += len(msg.payload)
+        trace = TRACER.start(msg.topic)
+        token = CURRENT_TRACE.set(trace)
+        # ASYNCIO transport: already on the loop thread, no hand-off needed
+        publish = self.bus.publish if self._async_client is not None else self._ingress.publish
         try:
             mqtt_topic = msg.topic
-            bus_topic = self._incoming_map.get(mqtt_topic)
-            
-            if bus_topic:
-                payload = json.loads(msg.payload.decode("utf-8"))
-                logger.info(f"[{self.name}] MQTT -> Bus: {mqtt_topic} to {bus_topic}, payload type: {type(payload)}, payload: {payload}")
-                
+            routes = self._incoming_matcher.match(mqtt_topic)
+            if not routes:
+                return
+
+            # Decoded once per payload format (routes of one topic normally share it)
+            decoded: Dict[Codec, object] = {}
+            for (bus_topic, codec), wildcards in routes:
+                if codec not in decoded:
+                    payload = codec.decode(msg.payload)
+                    trace.mark("decoded")
+                    if isinstance(payload, list):
+                        # Batch of readings (e.g. sent after a reconnect): forwarded as one event
+                        payload = {"readings": payload}
+                    decoded[codec] = payload
+                payload = decoded[codec]
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info(f"[{self.name}] MQTT -> Bus: {mqtt_topic} to {bus_topic}, payload type: {type(payload)}, payload: {payload}")
+
                 # Handle different payload types
                 if isinstance(payload, dict):
                     # Fix timestamp if present (ESP sends uptime, we need absolute time)
                     # Use the injected bus to notify the rest of the system
-                    self.bus.publish(bus_topic, **payload)
+                    if is_wildcard(bus_topic):
+                        publish(fill_wildcards(bus_topic, wildcards), **payload)
+                    elif wildcards:
+                        publish(bus_topic, wildcards=wildcards, **payload)
+                    else:
+                        publish(bus_topic, **payload)
                 else:
                     # Skip non-dict payloads (e.g., simple integers or strings)
                     logger.warning(f"[{self.name}] Skipping non-dict payload from {mqtt_topic}: {payload}")
-                    
+
         except Exception as e:
+            _INVALID.value += 1
             logger.error(f"[{self.name}] Error processing MQTT message: {e}")
+        finally:
+            CURRENT_TRACE.reset(token)
 
     def _make_outgoing_handler(self, bus_topic: str):
         """Factory per creare callback specifiche per ogni topic in uscita."""
         mqtt_topic = self._outgoing_map[bus_topic]
+        codec = self._codecs.get(mqtt_topic, JSON_CODEC)
         
         def handler(**kwargs):
             try:
-                self._last_bus_data[bus_topic] = kwargs
-                
-                payload = json.dumps(kwargs)
-                self._client.publish(mqtt_topic, payload, qos=self.qos)
-                logger.debug(f"[{self.name}] Bus({bus_topic}) → MQTT({mqtt_topic})")
+                wildcards = kwargs.pop("wildcards", ())
+                topic = fill_wildcards(mqtt_topic, wildcards) if wildcards else mqtt_topic
+                self._outgoing.offer(topic, kwargs, codec)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"[{self.name}] Bus({bus_topic}) → MQTT({topic})")
             except Exception as e:
                 logger.error(f"[{self.name}] Error publishing to MQTT: {e}")
         
         return handler
 
+    def _send(self, mqtt_topic: str, payload: bytes) -> bool:
+        """Publish a serialized state; False if paho did not accept it (e.g. not connected)."""
+        info = self._client.publish(mqtt_topic, payload, qos=self.qos, retain=self._retain)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            return False
+        _PUBLISHED.value += 1
+        _PUBLISHED_BYTES.value += len(payload)
+        return True
+
     async def cleanup(self):
         """Cleanly disconnect from the broker."""
         logger.info(f"[{self.name}] Cleaning up MQTT resources...")
+        self._outgoing.close()
+        if self._async_client is not None:
+            await self._async_client.close()
+            return
         self._client.loop_stop()
         self._client.disconnect()
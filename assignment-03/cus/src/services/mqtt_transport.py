@@ -0,0 +1,227 @@
+import asyncio
+import socket
+from typing import Any, Dict, Optional
+
+import paho.mqtt.client as mqtt
+
+from .base_service import Job, Scheduler
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AsyncMqttClient:
+    """
+    Drives a paho client from the asyncio event loop instead of paho's
+    network thread (loop_start): the socket is watched with add_reader and,
+    while paho has data queued, add_writer, and loop_read/loop_write/loop_misc
+    run on the loop thread. Paho callbacks (on_connect, on_message...) thus
+    run on the loop too, in order with the rest of the bus.
+
+    connect, subscribe and publish are awaitable; a failed or lost connection
+    is re-established in the background with exponential backoff.
+    Requires an event loop with add_reader (not the Windows proactor loop).
+    """
+
+    def __init__(self, client: mqtt.Client, scheduler: Scheduler, misc_interval: float = 1.0,
+                 reconnect_min_delay: float = 1.0, reconnect_max_delay: float = 60.0):
+        """
+        :param client: Paho client, not started (no loop_start).
+        :param scheduler: Scheduler of the keepalive job.
+        :param misc_interval: Seconds between loop_misc calls (keepalive pings, timeouts).
+        :param reconnect_min_delay: First delay before reconnecting after a lost connection.
+        :param reconnect_max_delay: Upper bound of the doubling reconnect delay.
+        """
+        self._client = client
+        self._scheduler = scheduler
+        self._misc_interval = misc_interval
+        self._reconnect_min_delay = reconnect_min_delay
+        self._reconnect_max_delay = reconnect_max_delay
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._address = ""
+        self._sock: Optional[socket.socket] = None
+        self._writing = False
+        self._misc_job: Optional[Job] = None
+        self._connecting = False
+        self._closing = False
+        self._connected: Optional[asyncio.Future] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        # { mid: future } of the subscriptions and publications waiting for the broker
+        self._pending: Dict[int, asyncio.Future] = {}
+
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+        client.on_publish = self._on_publish
+        client.on_subscribe = self._on_subscribe
+
+    @property
+    def is_connected(self) -> bool:
+        return self._client.is_connected()
+
+    # ===================== Awaitable operations =====================
+    async def connect(self, host: str, port: int = 1883, keepalive: int = 60, timeout: float = 10.0):
+        """Connect and wait for the broker's CONNACK (ConnectionError if refused or lost)."""
+        self._loop = asyncio.get_running_loop()
+        self._closing = False
+        self._address = f"{host}:{port}"
+        self._client.connect_async(host, port, keepalive)
+        try:
+            await self._open(timeout)
+        except (OSError, asyncio.TimeoutError):
+            self._schedule_reconnect()
+            raise
+
+    async def subscribe(self, topic: str, qos: int = 0) -> Any:
+        """Subscribe and wait for the SUBACK; returns the granted QoS."""
+        rc, mid = self._client.subscribe(topic, qos)
+        if rc != mqtt.MQTT_ERR_SUCCESS:
+            raise ConnectionError(f"MQTT subscribe to {topic} failed: {mqtt.error_string(rc)}")
+        return await self._wait_for(mid)
+
+    async def publish(self, topic: str, payload: Any, qos: int = 0, retain: bool = False):
+        """Publish and wait until written (QoS 0) or acknowledged by the broker (QoS > 0)."""
+        info = self.publish_nowait(topic, payload, qos, retain)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            raise ConnectionError(f"MQTT publish to {topic} failed: {mqtt.error_string(info.rc)}")
+        if not info.is_published():
+            await self._wait_for(info.mid)
+
+    def publish_nowait(self, topic: str, payload: Any, qos: int = 0, retain: bool = False) -> mqtt.MQTTMessageInfo:
+        """Queue a publication; it is written when the socket is writable."""
+        return self._client.publish(topic, payload, qos=qos, retain=retain)
+
+    async def close(self, timeout: float = 2.0):
+        """Disconnect cleanly (DISCONNECT written before the socket is closed) and stop reconnecting."""
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._sock is None:
+            return
+        closed = self._loop.create_future()
+        self._connected = closed  # Resolved (as failed) by _on_socket_close
+        self._client.disconnect()
+        try:
+            await asyncio.wait_for(asyncio.shield(closed), timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        if self._sock is not None:
+            self._detach(self._sock)
+
+    # ===================== Connection =====================
+    async def _open(self, timeout: float):
+        self._connected = self._loop.create_future()
+        # Name resolution and the TCP handshake are blocking in paho: done off the loop.
+        # The socket callbacks called meanwhile (from the executor) are ignored, and
+        # the socket is attached once the executor is done.
+        self._connecting = True
+        try:
+            await self._loop.run_in_executor(None, self._client.reconnect)
+        finally:
+            self._connecting = False
+        sock = self._client.socket()
+        if sock is None:
+            raise ConnectionError("MQTT socket closed while connecting")
+        self._attach(sock)
+        try:
+            await asyncio.wait_for(asyncio.shield(self._connected), timeout)
+        except asyncio.TimeoutError:
+            # No CONNACK: drop the socket (paho closes it again harmlessly on the next attempt)
+            if self._sock is sock:
+                self._detach(sock)
+                sock.close()
+            raise
+
+    def _attach(self, sock: socket.socket):
+        self._sock = sock
+        self._loop.add_reader(sock, self._on_readable)
+        if self._client.want_write():
+            self._start_writing()
+        self._misc_job = self._scheduler.every(self._misc_interval, self._client.loop_misc, "mqtt.loop_misc")
+
+    def _detach(self, sock: socket.socket):
+        if sock is not self._sock:
+            return
+        self._loop.remove_reader(sock)
+        if self._writing:
+            self._loop.remove_writer(sock)
+            self._writing = False
+        if self._misc_job is not None:
+            self._misc_job.cancel()
+            self._misc_job = None
+        self._sock = None
+
+    def _on_readable(self):
+        self._client.loop_read()
+        connected = self._connected
+        if connected is not None and not connected.done() and self._client.is_connected():
+            connected.set_result(None)
+
+    def _start_writing(self):
+        if not self._writing:
+            self._writing = True
+            self._loop.add_writer(self._sock, self._client.loop_write)
+
+    def _schedule_reconnect(self):
+        if not self._closing and self._reconnect_task is None:
+            self._reconnect_task = self._loop.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = self._reconnect_min_delay
+        try:
+            while not self._closing:
+                await asyncio.sleep(delay)
+                try:
+                    logger.info(f"[AsyncMqttClient] Reconnecting to {self._address}...")
+                    await self._open(timeout=10.0)
+                    return
+                except (OSError, asyncio.TimeoutError) as e:
+                    logger.warning(f"[AsyncMqttClient] Reconnect failed: {e}")
+                    delay = min(delay * 2, self._reconnect_max_delay)
+        finally:
+            self._reconnect_task = None
+
+    # ===================== Paho callbacks =====================
+    def _on_socket_open(self, client, userdata, sock):
+        if not self._connecting and self._loop is not None and self._sock is None:
+            self._attach(sock)  # Reopened by paho itself on the loop (e.g. protocol downgrade)
+
+    def _on_socket_close(self, client, userdata, sock):
+        if self._connecting or sock is not self._sock:
+            return
+        self._detach(sock)
+        if self._connected is not None and not self._connected.done():
+            self._connected.set_exception(ConnectionError("MQTT connection closed"))
+            self._connected.exception()  # Retrieved: nobody may be waiting
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("MQTT connection closed"))
+        self._schedule_reconnect()
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        if not self._connecting and sock is self._sock:
+            self._start_writing()
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        if not self._connecting and sock is self._sock and self._writing:
+            self._loop.remove_writer(sock)
+            self._writing = False
+
+    def _on_publish(self, client, userdata, mid):
+        self._resolve(mid, None)
+
+    def _on_subscribe(self, client, userdata, mid, granted_qos):
+        self._resolve(mid, granted_qos[0] if len(granted_qos) == 1 else granted_qos)
+
+    def _wait_for(self, mid: int) -> asyncio.Future:
+        # Registered right after queueing the packet: paho acknowledges it on a later read/write
+        future = self._pending[mid] = self._loop.create_future()
+        return future
+
+    def _resolve(self, mid: int, result: Any):
+        future = self._pending.pop(mid, None)  # None for publish_nowait
+        if future is not None and not future.done():
+            future.set_result(result)
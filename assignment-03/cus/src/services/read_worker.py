@@ -0,0 +1,175 @@
+"""
+Read-side HTTP API worker process (see services.worker_gateway).
+
+Started by the WorkerGateway of the control process as
+    uvicorn services.read_worker:create_app --factory --workers N
+with the shared snapshot name and the command address in the environment.
+"""
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Union
+
+from fastapi import FastAPI, HTTPException
+
+from models.schemas import CommandBatch
+from models.shared_snapshot import SharedSnapshot, TankSnapshot
+from services.event_bus import EventBus
+from .http_service import HttpService
+from .worker_gateway import API_PREFIX_ENV, COMMANDS_ENV, SNAPSHOT_ENV
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ReadReplica(HttpService):
+    """
+    HttpService of a worker process: the same API, fed from the SharedSnapshot
+    written by the control process instead of the event bus.
+
+    The snapshot is checked before every request (a single counter comparison
+    when nothing changed), and every `stream_interval` seconds while event
+    stream clients are connected; changed tanks go through the regular
+    HttpService callbacks, so caching, ETags and streaming work unchanged.
+    Commands are forwarded to the control process. Range queries on the
+    persistent history are not available (the stores belong to the control
+    process).
+    """
+
+    def __init__(self, snapshot_name: str, command_address: str, api_prefix: str = "/api/v1",
+                 stream_interval: float = 0.05):
+        """
+        :param snapshot_name: Name of the shared memory segment of the snapshot.
+        :param command_address: "host:port" of the WorkerGateway command socket.
+        :param api_prefix: Prefix of the API routes.
+        :param stream_interval: Seconds between snapshot checks for event stream clients.
+        """
+        super().__init__(EventBus(), api_prefix=api_prefix)
+        self.name = f"read_worker/{os.getpid()}"
+        self._shared = SharedSnapshot.attach(snapshot_name)
+        host, port = command_address.rsplit(":", 1)
+        self._command_host, self._command_port = host, int(port)
+        self._command_stream: Optional[tuple] = None
+        self._command_lock = asyncio.Lock()
+        self._stream_interval = stream_interval
+        self._generation = -1
+        self._slot_seqs: Dict[int, int] = {}
+        self._mirrored: Dict[str, TankSnapshot] = {}
+
+        @self._app.middleware("http")
+        async def refresh_snapshot(request, call_next):
+            self._refresh()
+            return await call_next(request)
+
+        self._app.router.lifespan_context = self._lifespan
+
+    @property
+    def app(self) -> FastAPI:
+        return self._app
+
+    @asynccontextmanager
+    async def _lifespan(self, app: FastAPI):
+        self._refresh()
+        self.every(self._stream_interval, self._refresh_streams)
+        try:
+            yield
+        finally:
+            self.cancel_jobs()
+            self._stream.close()
+            if self._command_stream is not None:
+                self._command_stream[1].close()
+            self._shared.close()
+
+    # ===================== Snapshot =====================
+    def _refresh_streams(self):
+        if self._stream.client_count:
+            self._refresh()
+
+    def _refresh(self):
+        """Apply the tanks changed in the shared snapshot since the last check."""
+        generation = self._shared.generation
+        if generation == self._generation:
+            return
+        self._generation = generation
+        for index in range(self._shared.tank_count):
+            seq = self._shared.slot_seq(index)
+            if self._slot_seqs.get(index) == seq:
+                continue
+            self._slot_seqs[index] = seq
+            self._mirror(self._shared.read(index))
+
+    def _mirror(self, tank: TankSnapshot):
+        previous = self._mirrored.get(tank.tank_id)
+        self._mirrored[tank.tank_id] = tank
+        wildcards = (tank.tank_id,)
+        if tank.substate is not None and (previous is None or tank.substate != previous.substate):
+            self.on_substate_update(tank.substate, wildcards)
+        if tank.mode is not None and (previous is None or tank.mode != previous.mode):
+            self.on_mode_update(tank.mode, wildcards)
+        if tank.valve is not None and (previous is None or tank.valve != previous.valve):
+            self.on_valve_update(tank.valve, wildcards)
+        if tank.analytics is not None and (previous is None or tank.analytics != previous.analytics):
+            self.on_analytics_update(tank.analytics, wildcards)
+        if tank.levels is not None and (
+            previous is None or previous.levels is None or tank.levels.total != previous.levels.total
+        ):
+            self.on_levels_out(tank.levels, wildcards)
+
+    async def _metrics(self) -> str:
+        """The metrics of the control process (those of the workers are not exported)."""
+        return await self._query("metrics")
+
+    async def _traces(self, limit: int) -> Dict[str, Any]:
+        return await self._query("traces", {"limit": limit})
+
+    async def _query(self, kind: str, payload: Optional[dict] = None) -> Any:
+        try:
+            response = await self._forward({"kind": kind, "payload": payload})
+        except (OSError, ValueError) as e:
+            logger.error(f"[{self.name}] {kind} request failed: {e}")
+            raise HTTPException(status_code=503, detail="Control process unreachable")
+        return response["body"]
+
+    # ===================== Commands =====================
+    async def _submit(self, kind: str, payload: Union[dict, CommandBatch]) -> Any:
+        """Forward the command to the control process and relay its answer."""
+        if isinstance(payload, CommandBatch):
+            payload = payload.model_dump()
+        try:
+            response = await self._forward({"kind": kind, "payload": payload})
+        except (OSError, ValueError) as e:
+            logger.error(f"[{self.name}] Command forwarding failed: {e}")
+            raise HTTPException(status_code=503, detail="Control process unreachable")
+        if response["status"] != 200:
+            raise HTTPException(status_code=response["status"], detail=response["body"].get("detail"))
+        return response["body"]
+
+    async def _forward(self, request: dict) -> dict:
+        # One request at a time on a persistent connection. A failed request is
+        # not retried: the command may have been applied already.
+        async with self._command_lock:
+            if self._command_stream is None:
+                self._command_stream = await asyncio.open_connection(self._command_host, self._command_port)
+            reader, writer = self._command_stream
+            try:
+                writer.write(json.dumps(request).encode() + b"\n")
+                await writer.drain()
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError("Connection closed by the control process")
+                return json.loads(line)
+            except (OSError, ValueError):
+                writer.close()
+                self._command_stream = None
+                raise
+
+
+def create_app() -> FastAPI:
+    """uvicorn factory: the API of one worker process."""
+    replica = ReadReplica(
+        os.environ[SNAPSHOT_ENV],
+        os.environ[COMMANDS_ENV],
+        api_prefix=os.environ.get(API_PREFIX_ENV, "/api/v1"),
+    )
+    return replica.app
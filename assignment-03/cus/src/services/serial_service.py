@@ -1,20 +1,38 @@
 import asyncio
-import json
 import serial
-import time
-from typing import Optional, Dict, Any, Callable
+from typing import Optional, Dict, Any, Callable, List, Tuple
 
+from models.codecs import serial_codecs
 from services.event_bus import EventBus
-from .base_service import BaseService
+from .base_service import BaseService, Job
 from utils.logger import get_logger
+from utils.metrics import METRICS
+from utils.topic_matcher import join_topic
+from utils.tracing import CURRENT_TRACE, TRACER, Trace
+from config import DEFAULT_TANK_ID, MODE_CHANGE_TOPIC, POT_TOPIC
 
 logger = get_logger(__name__)
 
+_BYTES_RECEIVED = METRICS.counter("cus_serial_received_bytes_total", "Bytes read from the serial port", ("port",))
+_BYTES_SENT = METRICS.counter("cus_serial_sent_bytes_total", "Bytes written to the serial port", ("port",))
+_LINES_RECEIVED = METRICS.counter("cus_serial_received_lines_total", "Lines read from the serial port", ("port",))
+_LINES_SENT = METRICS.counter("cus_serial_sent_lines_total", "Lines written to the serial port", ("port",))
+_INVALID_LINES = METRICS.counter("cus_serial_invalid_lines_total", "Lines (frames) read that could not be decoded", ("port",))
+
+# Start of a binary frame: FRAME_START, payload length (1 byte), payload
+FRAME_START = 0xA5
+
 
 class SerialService(BaseService):
     """
     Serial infrastructure adapter.
     Handles hardware communication and translates between Serial data and Event Bus topics.
+    Each port drives the WCS of a single tank: its events go to that tank's topics.
+    Incoming data is read when the port becomes readable; the state is sent
+    on every change and, as a heartbeat, every `send_interval` seconds.
+    Latency traces of the events that changed the state end with its write.
+    Messages are JSON lines by default; with a binary codec they are sent as
+    frames (FRAME_START, length, payload), since the payload may contain newlines.
     """
 
     def __init__(
@@ -23,8 +41,14 @@ class SerialService(BaseService):
         baudrate: int,
         event_bus: EventBus,
         send_interval: float = 0.5,
+        tank_id: str = DEFAULT_TANK_ID,
+        codec: str = "json",
     ):
+        """
+        :param codec: Message format of the port: "json", "struct" or "cbor" (see models.codecs).
+        """
         super().__init__("serial_service", event_bus)
+        self.tank_id = tank_id
 
         self.port = port
         self.baudrate = baudrate
@@ -32,8 +56,16 @@ class SerialService(BaseService):
 
         # Serial internals
         self._serial: Optional[serial.Serial] = None
-        self._read_buffer = ""
-        self._last_send_time = 0.0
+        self._read_buffer = bytearray()
+        self._decoder, self._encoder = serial_codecs(codec)
+        self._send_job: Optional[Job] = None
+        # Traces of the state changes not written yet
+        self._pending_traces: List[Trace] = []
+        self._bytes_received = _BYTES_RECEIVED.labels(port)
+        self._bytes_sent = _BYTES_SENT.labels(port)
+        self._lines_received = _LINES_RECEIVED.labels(port)
+        self._lines_sent = _LINES_SENT.labels(port)
+        self._invalid_lines = _INVALID_LINES.labels(port)
 
         self._state: Dict[str, Any] = {
             "mode": "UNCONNECTED",
@@ -45,9 +77,10 @@ class SerialService(BaseService):
             "valve": float,
         }
 
-        self._pub_topics: Dict[str, str] = {
-            "pot": "pot",
-            "btn": "btn",
+        # { json key: (bus topic, event argument) }
+        self._pub_topics: Dict[str, Tuple[str, str]] = {
+            "pot": (join_topic(POT_TOPIC, tank_id), "pot"),
+            "btn": (join_topic(MODE_CHANGE_TOPIC, tank_id), "btn"),
         }
 
     async def setup(self):
@@ -68,25 +101,13 @@ class SerialService(BaseService):
             self._serial = None
 
     async def run(self):
-        """Main loop managing periodic sending and continuous reading."""
-        while self._running:
-            if self._serial is None or not self._serial.is_open:
-                await asyncio.sleep(2)
-                continue
-
-            try:
-                await self._read_serial_data()
-
-                now = time.monotonic()
-                if now - self._last_send_time >= self._send_interval:
-                    await self._write_serial_data(self._state)
-                    self._last_send_time = now
-
-            except Exception as e:
-                logger.error(f"[{self.name}] Runtime error: {e}")
-                self._serial = None
-
-            await asyncio.sleep(0.01)
+        """Register the read and send jobs; without an open port the service stays idle."""
+        if self._serial is not None and self._serial.is_open:
+            if self.when_readable(self._serial, self._read_serial_data) is None:
+                # The event loop cannot watch the port (e.g. on Windows): poll it
+                self.every(0.01, self._read_serial_data)
+            self._send_job = self.every(self._send_interval, self._send_state, first=0.0)
+        await self.wait_until_stopped()
 
     async def cleanup(self):
         if self._serial:
@@ -104,6 +125,12 @@ class SerialService(BaseService):
         logger.debug(
             f"[{self.name}] State updated: {field}={self._state[field]}"
         )
+        if self._send_job is not None:
+            trace = CURRENT_TRACE.get()
+            if trace is not None and trace not in self._pending_traces:  # e.g. mode and valve changed
+                trace.mark("serial_queued")
+                self._pending_traces.append(trace)
+            self._send_job.trigger()
 
     def on_mode_change(self, mode: Any):
         self.on_event("mode", mode)
@@ -111,56 +138,105 @@ class SerialService(BaseService):
     def on_valve_command(self, opening: float):
         self.on_event("valve", opening)
 
-    async def _read_serial_data(self):
+    def _read_serial_data(self):
+        """Consume the bytes already received: reading only what is waiting never blocks."""
         if self._serial is None:
             return
 
-        loop = asyncio.get_running_loop()
-        ser = self._serial
-
         try:
-            waiting = await loop.run_in_executor(None, lambda: ser.in_waiting)
+            waiting = self._serial.in_waiting
             if waiting > 0:
-                raw = await loop.run_in_executor(None, lambda: ser.read(waiting))
-                self._read_buffer += raw.decode("utf-8", errors="ignore")
-
-                while "\n" in self._read_buffer:
-                    line, self._read_buffer = self._read_buffer.split("\n", 1)
-                    await self._process_incoming_line(line.strip())
+                raw = self._serial.read(waiting)
+                self._bytes_received.value += len(raw)
+                self._read_buffer += raw
+                if self._decoder.binary:
+                    self._split_frames()
+                else:
+                    self._split_lines()
 
         except Exception as e:
             logger.error(f"[{self.name}] Serial read error: {e}")
-            self._serial = None
+            self._on_port_error()
+
+    def _split_lines(self):
+        buffer = self._read_buffer
+        start = 0
+        end = buffer.find(b"\n")
+        while end >= 0:
+            self._process_incoming_line(bytes(buffer[start:end]).strip())
+            start = end + 1
+            end = buffer.find(b"\n", start)
+        del buffer[:start]
+
+    def _split_frames(self):
+        buffer = self._read_buffer
+        while buffer:
+            if buffer[0] != FRAME_START:
+                # Out of sync (e.g. a partial frame after opening the port): skip to the next frame
+                start = buffer.find(FRAME_START)
+                del buffer[:start if start >= 0 else len(buffer)]
+                continue
+            if len(buffer) < 2 or len(buffer) < 2 + buffer[1]:
+                return
+            end = 2 + buffer[1]
+            self._process_incoming_line(bytes(buffer[2:end]))
+            del buffer[:end]
 
-    async def _process_incoming_line(self, line: str):
+    def _process_incoming_line(self, line: bytes):
         if not line:
             return
 
+        self._lines_received.value += 1
         try:
-            data = json.loads(line)
+            data = self._decoder.decode(line)
+            if not isinstance(data, dict):
+                # e.g. a struct frame holding several records
+                raise ValueError(f"Expected one message, got {type(data).__name__}")
             for key, value in data.items():
                 if key in self._pub_topics:
-                    topic = self._pub_topics[key]
-                    self.bus.publish(key, **{topic: value})
+                    topic, arg = self._pub_topics[key]
+                    self.bus.publish(topic, **{arg: value})
                     logger.debug(
-                        f"[{self.name}] Published: {key} → {topic}={value}"
+                        f"[{self.name}] Published: {key} → {topic} {arg}={value}"
                     )
 
-        except json.JSONDecodeError:
-            logger.warning(f"[{self.name}] Invalid JSON: {line}")
-
-    async def _write_serial_data(self, data: dict):
+        except ValueError:
+            self._invalid_lines.value += 1
+            logger.warning(f"[{self.name}] Invalid message: {line!r}")
+
+    async def _send_state(self):
+        traces, self._pending_traces = self._pending_traces, []
+        for trace in traces:
+            trace.mark("serial_writing")
+        if await self._write_serial_data(self._state):
+            for trace in traces:
+                TRACER.finish(trace, "serial_written")
+
+    def _on_port_error(self):
+        """Stop using a failed port: the service stays idle until restarted."""
+        self._serial = None
+        self._send_job = None
+        self._pending_traces.clear()
+        self.cancel_jobs()
+
+    async def _write_serial_data(self, data: dict) -> bool:
+        """Write the data as a line (or frame) in the port's format; returns False if it could not be written."""
         if self._serial is None:
-            return
+            return False
 
         try:
             loop = asyncio.get_running_loop()
-            payload = (json.dumps(data) + "\n").encode("utf-8")
+            payload = self._encoder.encode(data)
+            payload = bytes((FRAME_START, len(payload))) + payload if self._encoder.binary else payload + b"\n"
             await loop.run_in_executor(None, self._serial.write, payload)
             await loop.run_in_executor(None, self._serial.flush)
+            self._bytes_sent.value += len(payload)
+            self._lines_sent.value += 1
 
             logger.debug(f"[{self.name}] Sent: {data}")
+            return True
 
         except Exception as e:
             logger.error(f"[{self.name}] Serial write error: {e}")
-            self._serial = None
+            self._on_port_error()
+            return False
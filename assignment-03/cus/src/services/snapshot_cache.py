@@ -0,0 +1,79 @@
+import gzip
+import json
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+
+class Snapshot:
+    """JSON bytes of one resource at one version, with its lazily compressed form."""
+
+    __slots__ = ("version", "etag", "body", "_gzip_body")
+
+    def __init__(self, version: int, etag: str, body: bytes):
+        self.version = version
+        self.etag = etag
+        self.body = body
+        self._gzip_body: Optional[bytes] = None
+
+    @property
+    def gzip_etag(self) -> str:
+        # Another representation of the same version: it needs its own strong ETag
+        return self.etag[:-1] + '-gzip"'
+
+    def gzip_body(self) -> bytes:
+        if self._gzip_body is None:
+            self._gzip_body = gzip.compress(self.body, compresslevel=5)
+        return self._gzip_body
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True if an If-None-Match header names this version (in any encoding)."""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or self.etag in tags or self.gzip_etag in tags
+
+
+class SnapshotCache:
+    """
+    Versioned, pre-serialized read models of the HTTP API.
+
+    Bus callbacks only bump the version of what changed (`invalidate`), which
+    is O(1). The JSON body is built on the first read of a new version and
+    then served as-is, with an ETag derived from the version, until the next
+    change: repeated reads cost a dict lookup, and clients revalidating with
+    If-None-Match get a 304 without any serialization.
+    """
+
+    def __init__(self, gzip_min_size: Optional[int] = 1024):
+        """
+        :param gzip_min_size: Bodies at least this large are also served gzip-compressed
+            to clients accepting it (None: never compress).
+        """
+        self.gzip_min_size = gzip_min_size
+        # Distinguishes the versions of this process from those of a previous run
+        self._epoch = format(time.time_ns() // 1_000_000, "x")
+        # { (tank_id, resource): version }
+        self._versions: Dict[Tuple[str, str], int] = {}
+        self._snapshots: Dict[Tuple[str, str], Snapshot] = {}
+
+    def invalidate(self, tank_id: str, resource: str):
+        key = (tank_id, resource)
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def get(self, tank_id: str, resource: str, build: Callable[[], dict]) -> Snapshot:
+        """Snapshot of the current version, serializing `build()` only if it changed."""
+        key = (tank_id, resource)
+        version = self._versions.get(key, 0)
+        snapshot = self._snapshots.get(key)
+        if snapshot is None or snapshot.version != version:
+            snapshot = self._snapshots[key] = Snapshot(
+                version, f'"{self._epoch}-{version}"', serialize(build()),
+            )
+        return snapshot
+
+    def should_compress(self, snapshot: Snapshot) -> bool:
+        return self.gzip_min_size is not None and len(snapshot.body) >= self.gzip_min_size
+
+
+def serialize(payload: dict) -> bytes:
+    return json.dumps(payload, separators=(",", ":")).encode()
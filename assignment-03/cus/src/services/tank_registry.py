@@ -0,0 +1,201 @@
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+from services.base_service import BaseService
+from services.event_bus import EventBus
+from services.timer_service import TimerService
+from services.tank_service import TankService, default_thresholds
+from core.system_states import AUTOMATIC_STATE
+from models.level_store import LevelStore
+from models.schemas import TankThresholds
+from utils.clock import SYSTEM_CLOCK, Clock
+from utils.logger import get_logger
+from utils.topic_matcher import SEPARATOR, SINGLE_LEVEL, is_wildcard, join_topic
+import config
+
+logger = get_logger(__name__)
+
+# Unknown tank ids warned about once each; past this many, the others are ignored silently
+_WARNED_LIMIT = 1024
+
+
+class TankRegistry(BaseService):
+    """
+    Multi-tank controller.
+    Owns one TankService FSM context per tank id and routes the per-tank input
+    topics ("level_in/<id>", "pot/<id>", "btn/<id>") to it. All tanks share
+    one timer service for their T1/T2 timeouts.
+    """
+
+    def __init__(
+        self,
+        event_bus: EventBus,
+        tanks: Optional[Mapping[str, dict]] = None,
+        thresholds: Optional[TankThresholds] = None,
+        auto_register: bool = True,
+        max_tanks: int = 10000,
+        level_store_dir: Optional[str] = None,
+        segment_records: int = 1 << 20,
+        timers: Optional[TimerService] = None,
+        clock: Optional[Clock] = None,
+    ):
+        """
+        :param event_bus: Injected instance of EventBus.
+        :param tanks: { tank_id: threshold overrides } of the tanks created upfront.
+        :param thresholds: Default control policy of every tank (from config if None).
+        :param auto_register: Create unknown tanks on their first reading.
+        :param max_tanks: Upper bound on the number of tanks.
+        :param level_store_dir: If given, each tank persists its readings in <dir>/<tank_id>.
+        :param segment_records: Readings per store segment file.
+        :param timers: Timer service for the T1/T2 timeouts; without it they are polled every second.
+        :param clock: Time source shared by all tanks (system clock by default).
+        """
+        super().__init__("tank_registry", event_bus)
+        self._overrides: Dict[str, dict] = dict(tanks or {})
+        self._auto_register = auto_register
+        self._max_tanks = max_tanks
+        self._level_store_dir = level_store_dir
+        self._segment_records = segment_records
+        self._timers = timers
+        self._clock = clock or SYSTEM_CLOCK
+        self._defaults = thresholds or default_thresholds()
+
+        self._tanks: Dict[str, TankService] = {}
+        # Ids whose events were ignored, logged once each
+        self._warned: Set[str] = set()
+        # Shared with readers (e.g. HttpService) that serve per-tank history
+        self.level_stores: Dict[str, LevelStore] = {}
+
+        for tank_id in self._overrides:
+            self.create(tank_id)
+
+    def subscribe(self):
+        """Subscribe to the per-tank input topics of every tank."""
+        self.bus.subscribe(join_topic(config.LEVEL_IN_TOPIC, SINGLE_LEVEL), self.on_level_event)
+        self.bus.subscribe(join_topic(config.POT_TOPIC, SINGLE_LEVEL), self.on_manual_valve)
+        self.bus.subscribe(join_topic(config.MODE_CHANGE_TOPIC, SINGLE_LEVEL), self.on_button_pressed)
+
+    # ===================== Registry =====================
+    def create(self, tank_id: str, thresholds: Optional[TankThresholds] = None) -> TankService:
+        """Create (or return) the FSM context of a tank."""
+        tank = self._tanks.get(tank_id)
+        if tank is not None:
+            return tank
+        if not tank_id or SEPARATOR in tank_id or is_wildcard(tank_id):
+            raise ValueError(f"Invalid tank id '{tank_id}'")
+        if len(self._tanks) >= self._max_tanks:
+            raise ValueError(f"Tank limit reached ({self._max_tanks}), cannot create '{tank_id}'")
+
+        if thresholds is None:
+            thresholds = self._defaults.model_copy(update=self._overrides.get(tank_id, {}))
+        level_store = None
+        if self._level_store_dir:
+            level_store = LevelStore(str(Path(self._level_store_dir) / tank_id), segment_records=self._segment_records)
+            self.level_stores[tank_id] = level_store
+
+        tank = TankService(self.bus, level_store=level_store, tank_id=tank_id, thresholds=thresholds,
+                           timers=self._timers, clock=self._clock)
+        self._tanks[tank_id] = tank
+        self._warned.discard(tank_id)
+        logger.info(f"[{self.name}] Registered tank '{tank_id}' ({len(self._tanks)} tanks)")
+        return tank
+
+    def get(self, tank_id: str) -> Optional[TankService]:
+        return self._tanks.get(tank_id)
+
+    def __len__(self) -> int:
+        return len(self._tanks)
+
+    def __iter__(self) -> Iterator[TankService]:
+        return iter(tuple(self._tanks.values()))
+
+    def _resolve(self, wildcards: Tuple[str, ...], create: bool) -> Optional[TankService]:
+        tank_id = wildcards[0]
+        tank = self._tanks.get(tank_id)
+        if tank is None and create and self._auto_register:
+            try:
+                tank = self.create(tank_id)
+            except ValueError as e:
+                self._warn_once(tank_id, f"{e}, its events are ignored")
+                return None
+        if tank is None:
+            self._warn_once(tank_id, f"Event for unknown tank '{tank_id}' ignored")
+        return tank
+
+    def _warn_once(self, tank_id: str, message: str):
+        if tank_id not in self._warned and len(self._warned) < _WARNED_LIMIT:
+            self._warned.add(tank_id)
+            logger.warning(f"[{self.name}] {message}")
+
+    # ===================== Event Bus callbacks =====================
+    def on_level_event(self, wildcards: Tuple[str, ...], reading: Optional[dict] = None,
+                       readings: Optional[List[dict]] = None):
+        """One reading (`reading`) or a batch of them (`readings`, oldest first)."""
+        tank = self._resolve(wildcards, create=True)
+        if tank is None:
+            return
+        if readings is not None:
+            tank._on_level_batch(readings)
+        elif reading is not None:
+            tank._on_level_event(reading)
+
+    def handle_levels(self, readings: Iterable[Tuple[str, dict]]):
+        """
+        Process many (tank_id, reading) pairs at once.
+        Readings are split in rounds holding at most one reading per tank, so
+        each tank still sees its own readings in order; within a round the
+        tanks in AUTOMATIC are evaluated together on the transition table.
+        """
+        rounds: List[List[Tuple[TankService, dict]]] = []
+        seen: Dict[str, int] = {}
+        for tank_id, reading in readings:
+            tank = self._resolve((tank_id,), create=True)
+            if tank is None:
+                continue
+            index = seen.get(tank_id, 0)
+            seen[tank_id] = index + 1
+            if index == len(rounds):
+                rounds.append([])
+            rounds[index].append((tank, reading))
+
+        for batch in rounds:
+            levels: List[float] = []
+            automatic: List[TankService] = []
+            for tank, reading in batch:
+                level, timestamp = tank._record_level(reading)
+                if tank.fsm.state is AUTOMATIC_STATE:
+                    levels.append(level)
+                    automatic.append(tank)
+                else:
+                    tank.fsm.state.handle_level_event(level, timestamp, tank)
+            if automatic:
+                AUTOMATIC_STATE.handle_level_batch(levels, automatic)
+
+    def on_manual_valve(self, pot, wildcards: Tuple[str, ...]):
+        tank = self._resolve(wildcards, create=False)
+        if tank is not None:
+            tank._on_manual_valve(pot)
+
+    def on_button_pressed(self, btn, wildcards: Tuple[str, ...]):
+        tank = self._resolve(wildcards, create=False)
+        if tank is not None:
+            tank._on_button_pressed(btn)
+
+    # ===================== Service lifecycle =====================
+    async def run(self):
+        """One periodic job flushing the stores (and polling timeouts if there is no timer service)."""
+        if self._timers is None or self._level_store_dir:
+            self.every(1.0, self._tick)
+        await self.wait_until_stopped()
+
+    def _tick(self):
+        if self._timers is None:
+            now = self._clock.time()
+            for tank in tuple(self._tanks.values()):
+                tank.check_timeout(now)
+        for store in self.level_stores.values():
+            store.flush()
+
+    async def cleanup(self):
+        for store in self.level_stores.values():
+            store.close()
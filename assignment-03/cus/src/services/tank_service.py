@@ -1,12 +1,18 @@
-import asyncio
-from collections import deque
-from collections import deque
-import time
-from typing import Deque, List
+import logging
+import numpy as np
+from typing import Optional
 from services.base_service import BaseService
 from services.event_bus import EventBus
-from models.schemas import LevelReading
+from services.timer_service import TimerService
+from models.level_analytics import LevelAnalytics
+from models.level_history import LevelHistory
+from models.level_store import LevelStore
+from models.schemas import TankThresholds
+from utils.clock import SYSTEM_CLOCK, Clock
 from utils.logger import get_logger
+from utils.metrics import METRICS
+from utils.topic_matcher import join_topic
+from utils.tracing import mark
 import config
 
 # Import system states after config to avoid circular dependency
@@ -14,6 +20,11 @@ from core.system_states import *
 
 logger = get_logger(__name__)
 
+# Seconds the analytics clock may drift from the host clock before it is re-anchored
+ANALYTICS_RESYNC_SECONDS = 5.0
+
+_TRANSITIONS = METRICS.counter("cus_fsm_transitions_total", "System state transitions of all tanks", ("from", "to"))
+
 
 class TankService(BaseService):
     """
@@ -26,56 +37,214 @@ class TankService(BaseService):
     - Track timestamps for timeout checks
     
     All business logic is in state classes.
+    Every output is published on the tank's own topics ("<topic>/<tank_id>").
     """
 
-    def __init__(self, event_bus: EventBus):
-        super().__init__("tank_service", event_bus)
+    # Output topics, qualified with the tank id by publish()
+    OUTPUT_TOPICS = (config.LEVELS_OUT_TOPIC, config.ANALYTICS_TOPIC, config.MODE_TOPIC, config.OPENING_TOPIC,
+                     config.SUBSTATE_TOPIC)
+
+    def __init__(
+        self,
+        event_bus: EventBus,
+        level_store: Optional[LevelStore] = None,
+        tank_id: str = config.DEFAULT_TANK_ID,
+        thresholds: Optional[TankThresholds] = None,
+        timers: Optional[TimerService] = None,
+        clock: Optional[Clock] = None,
+        pot_window: float = config.POT_COALESCE_WINDOW,
+    ):
+        """
+        :param event_bus: Injected instance of EventBus.
+        :param level_store: Optional persistent store, every reading is appended to it.
+        :param tank_id: Identifier of the controlled tank.
+        :param thresholds: Control policy parameters (defaults from config).
+        :param timers: Timer service firing the T1/T2 timeouts on time. Without it
+                       T2 is polled every second and T1 is checked on readings only.
+        :param clock: Time source (system clock by default, virtual in replays).
+        :param pot_window: Coalescing window of manual valve commands in seconds
+                           (0, or no timer service: every command is applied).
+        """
+        super().__init__(f"tank_service/{tank_id}", event_bus)
+        self.tank_id = tank_id
+        self.thresholds = thresholds or default_thresholds()
+        self._topics = {topic: join_topic(topic, tank_id) for topic in self.OUTPUT_TOPICS}
+        self._timers = timers
+        self.clock = clock or SYSTEM_CLOCK
         
-        # State management
-        self._current_state: SystemStateBase = UnconnectedState()
-        self._last_level_timestamp = time.time()  # Unix timestamp in seconds
+        # State management: shared state singletons + this tank's FSM data
+        self.fsm = FsmContext(UNCONNECTED_STATE, self.clock.monotonic_ms())
+        self._last_level_timestamp = self.clock.time()  # Unix timestamp in seconds
         # Track last value from each source (who) for pot
         self._last_pot_msg: dict[str, float] = {}  # {source_id: last_value}
-        # Water level history
-        self._water_levels: Deque[LevelReading] = deque(maxlen=20)
+        # Pot coalescing: newest value received while the window is open
+        self._pot_window = pot_window if timers is not None else 0.0
+        self._pot_timer = None
+        self._pot_pending: Optional[float] = None
+        # Water level history (columnar ring buffer)
+        self._water_levels = LevelHistory(config.MAX_READINGS)
+        self._level_store = level_store
+        # Incremental statistics (EWMA, rolling mean/variance, rate of rise)
+        self._analytics = LevelAnalytics(config.ANALYTICS_WINDOWS, config.ANALYTICS_EWMA_ALPHA)
+        # Analytics clock: device timestamp (ms) and sample time (s) of the last reading
+        self._last_device_timestamp: Optional[float] = None
+        self._last_sample_time = float("-inf")
         
         # NOTE: Topic subscriptions are done in main.py, not here
         
-        logger.info(f"[{self.name}] FSM initialized: {self._current_state.get_state_name()}")
+        logger.info(f"[{self.name}] FSM initialized: {self.fsm.state.get_state_name()}")
 
     async def run(self):
         """
         Event-driven FSM: reacts to events via pubsub callbacks.
-        Periodic loop only checks for connectivity timeout.
+        A periodic job only checks for connectivity timeout (if no timer service) and flushes the store.
         """
-        while self._running:
-            # Check timeout (convert to milliseconds for config comparison)
-            current_time = time.time()
-            elapsed_ms = int((current_time - self._last_level_timestamp) * 1000)
-            self._current_state.check_timeout(elapsed_ms, self)
-            
-            await asyncio.sleep(1.0)
+        if self._timers is None or self._level_store is not None:
+            self.every(1.0, self._tick)
+        await self.wait_until_stopped()
+
+    def _tick(self):
+        if self._timers is None:
+            self.check_timeout()
+        if self._level_store is not None:
+            self._level_store.flush()
+
+    def check_timeout(self, now: Optional[float] = None):
+        """Let the current state check for connectivity timeouts."""
+        # Convert to milliseconds for config comparison
+        current_time = self.clock.time() if now is None else now
+        elapsed_ms = int((current_time - self._last_level_timestamp) * 1000)
+        self.fsm.state.check_timeout(elapsed_ms, self)
+
+    def seconds_since_last_level(self) -> float:
+        return self.clock.time() - self._last_level_timestamp
+
+    def start_timer(self, name: str, delay: float):
+        """(Re)arm a named timer: on expiry the current state's handle_timeout(name) runs."""
+        if self._timers is None:
+            return
+        self.cancel_timer(name)
+        self.fsm.timers[name] = self._timers.call_later(delay, self._on_timer, name)
+
+    def cancel_timer(self, name: str):
+        timer = self.fsm.timers.pop(name, None)
+        if timer is not None:
+            self._timers.cancel(timer)
+
+    def _on_timer(self, name: str):
+        self.fsm.timers.pop(name, None)
+        self.fsm.state.handle_timeout(name, self)
+
+    def publish(self, topic: str, **kwargs):
+        """Publish an output event on this tank's qualified topic."""
+        self.bus.publish(self._topics[topic], **kwargs)
+
+    async def cleanup(self):
+        if self._level_store is not None:
+            self._level_store.flush()
 
     def _on_level_event(self, reading: dict):
         """Delegate sensor.level event to current state."""
-        logger.debug(f"[{self.name}] 📊 Level event received: {reading}")
+        level, timestamp = self._record_level(reading)
+        
+        # Delegate to state
+        self.fsm.state.handle_level_event(level, timestamp, self)
 
+    def _record_level(self, reading: dict) -> tuple[float, float]:
+        """Store a reading and publish the derived outputs, without running the FSM."""
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"[{self.name}] Level event received: {reading}")
         # Update timestamp
-        logger.info(f"[{self.name}] Level event received: {reading}")
-        self._last_level_timestamp = time.time()
+        self._last_level_timestamp = self.clock.time()
         # Store in history
-        measure = LevelReading(water_level=reading["level"], timestamp=reading["timestamp"])
-        self._water_levels.append(measure)
-        self.bus.publish(config.LEVELS_OUT_TOPIC, levels=self._water_levels)
-        
-        # Delegate to state
-        self._current_state.handle_level_event(measure.water_level, measure.timestamp, self)
+        level = float(reading["level"])
+        timestamp = float(reading["timestamp"])
+        self._water_levels.append(level, timestamp)
+        if self._level_store is not None:
+            self._persist(level)
+        self.publish(config.LEVELS_OUT_TOPIC, levels=self._water_levels)
+        sample_time = float(self._sample_times(np.array((timestamp,)), self._last_level_timestamp)[0])
+        analytics = self._analytics.update(level, sample_time)
+        self.publish(config.ANALYTICS_TOPIC, analytics=analytics)
+        return level, timestamp
+
+    def _on_level_batch(self, readings: list):
+        """
+        Handle many readings of one message (e.g. the backlog an ESP sends after
+        reconnecting), oldest first: one history/store append, one LEVELS_OUT and
+        ANALYTICS publication, and the FSM stepped over the whole batch.
+        """
+        try:
+            levels = np.fromiter((reading["level"] for reading in readings), np.float64, len(readings))
+            timestamps = np.fromiter((reading["timestamp"] for reading in readings), np.float64, len(readings))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"[{self.name}] Malformed level batch dropped: {e}")
+            return
+        if not len(levels):
+            return
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"[{self.name}] Level batch received: {len(levels)} readings")
+
+        previous = self._last_level_timestamp
+        self._last_level_timestamp = now = self.clock.time()
+        # Reception time of each reading: the newest one arrived now, the older ones
+        # are spaced back by their device timestamps (ms), never before the last reading
+        received = now - (timestamps[-1] - timestamps) / 1000.0
+        received = np.maximum.accumulate(np.clip(received, previous, now))
+
+        self._water_levels.extend(levels, timestamps)
+        if self._level_store is not None:
+            try:
+                self._level_store.extend(levels, received)
+            except (OSError, ValueError) as e:
+                logger.error(f"[{self.name}] Failed to persist level batch: {e}")
+        self.publish(config.LEVELS_OUT_TOPIC, levels=self._water_levels)
+        analytics = self._analytics.update_many(levels.tolist(), self._sample_times(timestamps, now).tolist())
+        self.publish(config.ANALYTICS_TOPIC, analytics=analytics)
+
+        # Run the FSM over the batch; AUTOMATIC jumps straight to the next transition
+        i = 0
+        while i < len(levels):
+            state = self.fsm.state
+            if state is AUTOMATIC_STATE:
+                i = state.handle_level_run(levels, i, self)
+            else:
+                state.handle_level_event(float(levels[i]), float(timestamps[i]), self)
+                i += 1
+
+    def _sample_times(self, timestamps: np.ndarray, now: float) -> np.ndarray:
+        """
+        Analytics time (seconds) of new readings: spaced by their device
+        timestamps (ms), so rates do not depend on network jitter or on the
+        readings arriving one by one or batched. The clock is anchored to the
+        host clock (the newest reading arrived `now`) on the first reading, when
+        the device timestamps go back (restart) and when it drifts away by more
+        than ANALYTICS_RESYNC_SECONDS; it never goes back.
+        """
+        previous = self._last_device_timestamp
+        times = None
+        if previous is not None and timestamps[0] >= previous:
+            times = self._last_sample_time + (timestamps - previous) / 1000.0
+            if abs(times[-1] - now) > ANALYTICS_RESYNC_SECONDS:
+                times = None
+        if times is None:
+            times = np.maximum(now - (timestamps[-1] - timestamps) / 1000.0, self._last_sample_time)
+        self._last_device_timestamp = float(timestamps[-1])
+        self._last_sample_time = float(times[-1])
+        return times
+
+    def _persist(self, level: float):
+        """Append the reading to the persistent store, stamped with its reception time."""
+        try:
+            self._level_store.append(level, self._last_level_timestamp)
+        except (OSError, ValueError) as e:
+            logger.error(f"[{self.name}] Failed to persist level reading: {e}")
 
     def _on_button_pressed(self, btn):
         """Delegate button.pressed event to current state."""
         if btn:
             logger.debug(f"[{self.name}] 🔘 Button pressed!")
-            self._current_state.handle_button_pressed(self)
+            self.fsm.state.handle_button_pressed(self)
 
     def _on_manual_valve(self, pot):
         """
@@ -85,7 +254,8 @@ class TankService(BaseService):
         - New format: pot={"val": X, "who": "source_id"}
         - Legacy format: value=X (for backward compatibility)
         
-        Only propagates value changes from specific sources.
+        Only propagates value changes from specific sources, coalesced across
+        sources (see _apply_pot).
         """
         # Handle legacy format
         if isinstance(pot, dict) and "val" in pot and "who" in pot:
@@ -96,30 +266,78 @@ class TankService(BaseService):
                 return  # Ignore duplicate
             self._last_pot_msg[source_id] = value
             logger.debug(f"[{self.name}] 🎛️ Manual valve command received: {value} from source '{source_id}'")
-            self._current_state.handle_manual_valve(value, self)
+            self._apply_pot(value)
+
+    def _apply_pot(self, value: float):
+        """
+        Latest-wins coalescing of manual valve commands. A command arriving
+        while the input is idle is applied at once and opens a window of
+        `pot_window` seconds; commands arriving during the window only replace
+        the pending value, which is applied when the window closes (opening a
+        new one). A slider drag thus drives the valve at most once per window.
+        """
+        if self._pot_window <= 0:
+            self.fsm.state.handle_manual_valve(value, self)
+        elif self._pot_timer is None:
+            self.fsm.state.handle_manual_valve(value, self)
+            self._pot_timer = self._timers.call_later(self._pot_window, self._on_pot_window)
+        else:
+            self._pot_pending = value
+
+    def _on_pot_window(self):
+        value, self._pot_pending = self._pot_pending, None
+        if value is None:
+            self._pot_timer = None  # Input idle: the next command applies at once
+            return
+        self._pot_timer = self._timers.call_later(self._pot_window, self._on_pot_window)
+        self.fsm.state.handle_manual_valve(value, self)
 
     def transition_to(self, new_state: SystemStateBase):
         """
         Transition to a new system state.
         Called by states themselves (not by external code).
         """
-        old_state = self._current_state
+        old_state = self.fsm.state
         old_state.on_exit(self)
         
-        self._current_state = new_state
-        logger.info(f"State transition: {old_state.get_state_name().value} → {new_state.get_state_name().value}")
+        self.fsm.state = new_state
+        old, new = old_state.get_state_name().value, new_state.get_state_name().value
+        logger.info(f"[{self.name}] State transition: {old} → {new}")
+        _TRANSITIONS.labels(old, new).inc()
+        mark("transition")
         
         new_state.on_enter(self)
 
     # Public accessors for status queries
     @property
     def state(self):
-        return self._current_state.get_state_name()
+        return self.fsm.state.get_state_name()
+
+    @property
+    def substate(self):
+        """AUTOMATIC substate, None in the other modes."""
+        if self.fsm.state is AUTOMATIC_STATE:
+            return self.fsm.substate.get_state_name()
+        return None
     
     @property
-    def water_levels(self) -> List[LevelReading]:
+    def water_levels(self) -> LevelHistory:
         return self._water_levels
     
+    @property
+    def analytics(self) -> LevelAnalytics:
+        return self._analytics
+
     @property
     def current_level(self) -> float:
-        return self._water_levels[-1].water_level if self._water_levels else 0.0
+        return self._water_levels.latest_level()
+
+
+def default_thresholds() -> TankThresholds:
+    """Control policy parameters from the global configuration."""
+    return TankThresholds(
+        l1_threshold=config.L1_THRESHOLD,
+        l2_threshold=config.L2_THRESHOLD,
+        t1_duration=config.T1_DURATION,
+        t2_timeout=config.T2_TIMEOUT,
+    )
@@ -0,0 +1,109 @@
+import asyncio
+import math
+from typing import Any, Callable, Optional
+
+from services.base_service import BaseService
+from services.event_bus import EventBus
+from utils.clock import SYSTEM_CLOCK, Clock
+from utils.logger import get_logger
+from utils.timing_wheel import Timer, TimingWheel
+
+logger = get_logger(__name__)
+
+
+class TimerService(BaseService):
+    """
+    One-shot timers with millisecond resolution (e.g. the FSM T1/T2 timeouts).
+
+    Timers live in a hierarchical timing wheel (O(1) arm and cancel whatever
+    their number); the event loop is woken by a single call_at handle set to
+    the wheel's next deadline, so nothing polls while no timer is due.
+    Timers can be armed before the service starts; they fire once it runs.
+    With a virtual clock the service is not started: the owner fires the
+    due timers itself through next_deadline() and advance().
+    """
+
+    def __init__(self, event_bus: EventBus, clock: Optional[Clock] = None):
+        """
+        :param event_bus: Injected instance of EventBus.
+        :param clock: Time source; must be the system clock when the service runs on the event loop.
+        """
+        super().__init__("timer_service", event_bus)
+        self._clock = clock or SYSTEM_CLOCK
+        self._wheel = TimingWheel(self._now_ms())
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._handle_tick: Optional[int] = None
+
+    def _now_ms(self) -> int:
+        # The system monotonic clock is also asyncio's loop.time()
+        return self._clock.monotonic_ms()
+
+    def __len__(self) -> int:
+        return len(self._wheel)
+
+    def call_later(self, delay: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        """
+        Run callback(*args) after `delay` seconds (rounded up to the millisecond).
+
+        :return: Handle to pass to cancel().
+        """
+        deadline = math.ceil((self._clock.monotonic() + delay) * 1000)
+        timer = self._wheel.schedule(deadline, callback, *args)
+        if self._handle_tick is None or timer.deadline < self._handle_tick:
+            self._arm()
+        return timer
+
+    def cancel(self, timer: Optional[Timer]) -> bool:
+        """Cancel a timer; the wake-up already set for it, if any, is left to expire idle."""
+        return timer is not None and self._wheel.cancel(timer)
+
+    def next_deadline(self) -> Optional[float]:
+        """Clock time (seconds) at which advance() next has work to do, None if no timer is pending."""
+        tick = self._wheel.next_tick()
+        return None if tick is None else tick / 1000
+
+    def advance(self, until: Optional[float] = None) -> int:
+        """
+        Fire the timers due at `until` (clock seconds, default: now).
+        Returns the number of timers fired.
+        """
+        # Tolerate the rounding of tick / 1000 * 1000 for deadlines from next_deadline()
+        now_ms = self._now_ms() if until is None else math.floor(until * 1000 + 1e-3)
+        return self._wheel.advance(now_ms)
+
+    def _arm(self):
+        """Point the loop wake-up at the wheel's next tick."""
+        if self._loop is None:
+            return
+        tick = self._wheel.next_tick()
+        if tick == self._handle_tick:
+            return
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = None if tick is None else self._loop.call_at(tick / 1000, self._on_wakeup, tick)
+        self._handle_tick = tick
+
+    def _on_wakeup(self, tick: int):
+        self._handle = None
+        self._handle_tick = None
+        # The handle was set for `tick`: it is due even if the clock reads a hair earlier
+        self._wheel.advance(max(self._now_ms(), tick))
+        self._arm()
+
+    # ===================== Service lifecycle =====================
+    async def setup(self):
+        self._loop = asyncio.get_running_loop()
+        self._wheel.advance(self._now_ms())
+        self._arm()
+
+    async def run(self):
+        """Timers fire from loop callbacks: just wait for stop()."""
+        await self.wait_until_stopped()
+
+    async def cleanup(self):
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = None
+        self._handle_tick = None
+        self._loop = None
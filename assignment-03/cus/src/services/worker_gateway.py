@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from models.level_history import LevelHistory
+from models.shared_snapshot import SharedSnapshot
+from services.event_bus import EventBus
+from .base_service import BaseService
+from .commands import CommandError, CommandProcessor
+from utils.logger import get_logger
+from utils.metrics import METRICS
+from utils.tracing import TRACER
+
+try:
+    from config import DEFAULT_TANK_ID, MAX_READINGS
+except ImportError:
+    DEFAULT_TANK_ID = "default"
+    MAX_READINGS = 100
+
+logger = get_logger(__name__)
+
+# Environment of the worker processes (see services.read_worker.create_app)
+SNAPSHOT_ENV = "CUS_SNAPSHOT"
+COMMANDS_ENV = "CUS_COMMANDS"
+API_PREFIX_ENV = "CUS_API_PREFIX"
+
+_SRC_DIR = Path(__file__).resolve().parent.parent
+
+
+class WorkerGateway(BaseService):
+    """
+    Control-process side of the multi-process HTTP API.
+
+    Instead of serving HTTP on the control event loop, it mirrors the dashboard
+    state (mode, substate, valve, analytics, recent readings) into a
+    SharedSnapshot and runs uvicorn with `workers` processes serving the API
+    from it (services.read_worker). Commands received by the workers are
+    forwarded over a local TCP socket, one JSON line per request and response,
+    and applied here by the same CommandProcessor as HttpService uses; so are
+    the /metrics and /traces requests.
+    Request bursts thus cost worker CPU, not control-loop latency.
+    """
+
+    def __init__(self, event_bus: EventBus, host: str = "0.0.0.0", port: int = 8000, workers: int = 2,
+                 api_prefix: str = "/api/v1", max_tanks: int = 64, capacity: int = MAX_READINGS,
+                 command_port: int = 0, idempotency_keys: int = 4096):
+        """
+        :param event_bus: Injected instance of EventBus.
+        :param host: HTTP host of the workers.
+        :param port: HTTP port, shared by the workers.
+        :param workers: Number of uvicorn worker processes.
+        :param api_prefix: Prefix of the API routes.
+        :param max_tanks: Tank slots of the shared snapshot.
+        :param capacity: Recent readings per tank in the shared snapshot.
+        :param command_port: Local port receiving the commands of the workers (0: any free port).
+        :param idempotency_keys: Idempotency keys of applied commands remembered to discard retries.
+        """
+        super().__init__("worker_gateway", event_bus)
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self._api_prefix = api_prefix
+        self._max_tanks = max_tanks
+        self._capacity = capacity
+        self._command_port = command_port
+        self._commands = CommandProcessor(event_bus, idempotency_keys)
+        # Created now so that bus updates received before start() are kept
+        self._snapshot = SharedSnapshot.create(slots=max_tanks, capacity=capacity)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+
+    @property
+    def snapshot_name(self) -> str:
+        return self._snapshot.name
+
+    # ===================== Service lifecycle =====================
+    async def setup(self):
+        self._server = await asyncio.start_server(self._serve_commands, "127.0.0.1", self._command_port)
+        command_port = self._server.sockets[0].getsockname()[1]
+        env = dict(os.environ)
+        env[SNAPSHOT_ENV] = self._snapshot.name
+        env[COMMANDS_ENV] = f"127.0.0.1:{command_port}"
+        env[API_PREFIX_ENV] = self._api_prefix
+        self._process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "services.read_worker:create_app", "--factory",
+            "--app-dir", str(_SRC_DIR), "--host", self.host, "--port", str(self.port),
+            "--workers", str(self.workers), "--log-level", "warning",
+            env=env,
+        )
+        logger.info(f"[{self.name}] {self.workers} HTTP worker(s) on {self.host}:{self.port}, "
+                    f"snapshot '{self._snapshot.name}', commands on port {command_port}")
+
+    async def run(self):
+        """Wait for the worker supervisor: it only exits if the workers could not run."""
+        code = await self._process.wait()
+        logger.error(f"[{self.name}] HTTP workers exited with code {code}")
+
+    async def cleanup(self):
+        if self._process is not None and self._process.returncode is None:
+            self._process.terminate()
+            try:
+                await asyncio.wait_for(self._process.wait(), 10.0)
+            except asyncio.TimeoutError:
+                self._process.kill()
+        if self._server is not None:
+            self._server.close()
+        self._snapshot.close()
+
+    # ===================== Forwarded commands =====================
+    async def _serve_commands(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                writer.write(json.dumps(self._apply(line)).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _apply(self, line: bytes) -> dict:
+        try:
+            request = json.loads(line)
+            if request["kind"] == "metrics":
+                return {"status": 200, "body": METRICS.render()}
+            if request["kind"] == "traces":
+                limit = int(request["payload"]["limit"])
+                return {"status": 200, "body": {"stages": TRACER.summary(), "traces": TRACER.recent(limit),
+                                                "timestamp": time.time()}}
+            return {"status": 200, "body": self._commands.submit(request["kind"], request["payload"])}
+        except CommandError as e:
+            return {"status": 400, "body": {"detail": e.errors}}
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"[{self.name}] Invalid forwarded command: {e}")
+            return {"status": 422, "body": {"detail": str(e)}}
+
+    # ===================== Event Bus callbacks =====================
+    # Same subscriptions as HttpService ("<topic>/+": the captured level is the tank id)
+    def on_valve_update(self, opening: float, wildcards: Tuple[str, ...] = ()):
+        self._snapshot.write(_tank_id(wildcards), valve=opening)
+
+    def on_mode_update(self, mode: Any, wildcards: Tuple[str, ...] = ()):
+        self._snapshot.write(_tank_id(wildcards), mode=mode)
+
+    def on_substate_update(self, substate: Any, wildcards: Tuple[str, ...] = ()):
+        self._snapshot.write(_tank_id(wildcards), substate=substate)
+
+    def on_analytics_update(self, analytics: dict, wildcards: Tuple[str, ...] = ()):
+        self._snapshot.write(_tank_id(wildcards), analytics=analytics)
+
+    def on_levels_out(self, levels: LevelHistory, wildcards: Tuple[str, ...] = ()):
+        self._snapshot.write(_tank_id(wildcards), levels=levels)
+
+
+def _tank_id(wildcards: Tuple[str, ...]) -> str:
+    return wildcards[0] if wildcards else DEFAULT_TANK_ID
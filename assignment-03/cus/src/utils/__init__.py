@@ -1,3 +1,4 @@
 from .logger import get_logger
+from .topic_matcher import TopicMatcher
 
-__all__ = ['get_logger']
+__all__ = ['get_logger', 'TopicMatcher']
@@ -0,0 +1,46 @@
+import time
+
+
+class Clock:
+    """
+    Time source of the control stack (TankService, FSM states, TimerService).
+    The default reads the system clocks; replays inject a VirtualClock.
+    """
+
+    def time(self) -> float:
+        """Wall-clock time, Unix seconds."""
+        return time.time()
+
+    def monotonic(self) -> float:
+        """Monotonic time in seconds, for durations and timers."""
+        return time.monotonic()
+
+    def monotonic_ms(self) -> int:
+        return int(self.monotonic() * 1000)
+
+
+class VirtualClock(Clock):
+    """
+    Clock that only moves when told to. Wall and monotonic time are the same
+    virtual instant, so recorded Unix timestamps can be replayed as they are.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self._now = start
+
+    def time(self) -> float:
+        return self._now
+
+    def monotonic(self) -> float:
+        return self._now
+
+    def set(self, now: float):
+        """Move to `now`; the clock never goes backwards."""
+        if now > self._now:
+            self._now = now
+
+    def advance(self, seconds: float):
+        self.set(self._now + seconds)
+
+
+SYSTEM_CLOCK = Clock()
@@ -0,0 +1,91 @@
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+
+def bucket_aggregate(
+    timestamps: np.ndarray,
+    values: np.ndarray,
+    width: Optional[float] = None,
+    buckets: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Aggregate a time series into fixed-width time buckets.
+
+    :param timestamps: Sorted (non-decreasing) timestamps.
+    :param values: Values aligned with timestamps.
+    :param width: Bucket width in timestamp units.
+    :param buckets: Number of buckets over the series span (only used if width is None).
+    :return: Columns "timestamp" (bucket start), "min", "max", "avg" and "count",
+             with one row per non-empty bucket.
+    """
+    if len(timestamps) == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return {"timestamp": empty, "min": empty, "max": empty, "avg": empty,
+                "count": np.empty(0, dtype=np.int64)}
+    derived = width is None
+    if derived:
+        if not buckets or buckets < 1:
+            raise ValueError("Either a positive width or a positive number of buckets is required")
+        span = float(timestamps[-1] - timestamps[0])
+        width = span / buckets if span > 0 else 1.0
+    if width <= 0:
+        raise ValueError("Bucket width must be positive")
+
+    origin = timestamps[0]
+    index = np.floor((timestamps - origin) / width).astype(np.int64)
+    if derived:
+        # The last sample falls exactly on the upper edge: keep it in the last bucket
+        np.minimum(index, buckets - 1, out=index)
+    # Data is sorted, so every bucket is a contiguous run
+    starts = np.flatnonzero(np.concatenate(([True], index[1:] != index[:-1])))
+    counts = np.diff(np.append(starts, len(values)))
+    sums = np.add.reduceat(values, starts)
+    return {
+        "timestamp": origin + index[starts] * width,
+        "min": np.minimum.reduceat(values, starts),
+        "max": np.maximum.reduceat(values, starts),
+        "avg": sums / counts,
+        "count": counts,
+    }
+
+
+def lttb(timestamps: np.ndarray, values: np.ndarray, threshold: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Largest-Triangle-Three-Buckets reduction to `threshold` points.
+
+    Keeps the first and last points and, for every intermediate bucket, the
+    point forming the largest triangle with the previously selected point
+    and the average of the next bucket. Triangle areas of a bucket are
+    computed in one vectorized step.
+
+    :return: (timestamps, values) of the selected points.
+    """
+    n = len(timestamps)
+    if threshold >= n or threshold < 3:
+        return timestamps, values
+
+    x = np.asarray(timestamps, dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    # Bucket edges over the n - 2 intermediate points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    # Averages of every bucket (the "next bucket" average of bucket i is avg[i + 1])
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    avg_x = np.append(sums_x / sizes, x[-1])
+    avg_y = np.append(sums_y / sizes, y[-1])
+
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        cx, cy = avg_x[i + 1], avg_y[i + 1]
+        areas = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        a = lo + int(np.argmax(areas))
+        selected[i + 1] = a
+
+    return x[selected], y[selected]
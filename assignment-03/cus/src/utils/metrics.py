@@ -0,0 +1,231 @@
+"""
+Low-overhead instrumentation, exposed in the Prometheus text format.
+
+Metrics are registered once (usually at module level) and their labelled
+children are created on first use and kept: recording is an attribute
+increment, or a bisect into preallocated bucket counters for histograms.
+There are no locks, so each child must only be updated from one thread
+(the event loop, or e.g. paho's network thread for its own counters).
+"""
+import math
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a fast inline handler up to a blocked loop
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+# Collect callback: yields (label values, value) at scrape time
+Collector = Callable[[], Iterable[Tuple[Tuple[Any, ...], float]]]
+
+
+class CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class GaugeValue(CounterValue):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+
+class HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last: above the largest bound (+Inf)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+
+class Metric(ABC):
+    """A named metric family; `labels(...)` returns the child of a label set."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 collect: Optional[Collector] = None):
+        """
+        :param name: Metric name.
+        :param documentation: HELP text.
+        :param labels: Label names.
+        :param collect: Optional callback giving the values at scrape time,
+            for values the instrumented code already keeps (e.g. queue sizes).
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._collect = collect
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def _init_unlabelled(self):
+        # A metric without labels is exported from the start, even if never updated
+        if not self.label_names and self._collect is None:
+            self.labels()
+
+    def labels(self, *values: Any):
+        """Child of the given label values (created on first use); keep it on hot paths."""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """A new child, for a label set not used before."""
+        pass
+
+    def _values(self) -> Iterable[Tuple[Tuple[str, ...], Any]]:
+        yield from self._children.items()
+        if self._collect is not None:
+            for values, value in self._collect():
+                yield tuple(str(v) for v in values), value
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {_escape_help(self.documentation)}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        for values, child in self._values():
+            value = child.value if isinstance(child, CounterValue) else child
+            lines.append(f"{self.name}{_labels(self.label_names, values)} {_number(value)}")
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self) -> CounterValue:
+        return CounterValue()
+
+    def inc(self, amount: float = 1):
+        """Increment the metric without labels."""
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> GaugeValue:
+        return GaugeValue()
+
+    def set(self, value: float):
+        """Set the metric without labels."""
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        """Record a value of the metric without labels."""
+        self.labels().observe(value)
+
+    def render(self, lines: List[str]):
+        lines.append(f"# HELP {self.name} {_escape_help(self.documentation)}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        label_names = self.label_names + ("le",)
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(label_names, values + (_number(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {cumulative}")
+
+
+class MetricsRegistry:
+    """
+    The metrics of a process. Registering an existing name returns the
+    existing metric, so components created several times share it.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = (),
+                collect: Optional[Collector] = None) -> Counter:
+        return self._register(Counter, name, documentation, labels, collect=collect)
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = (),
+              collect: Optional[Collector] = None) -> Gauge:
+        return self._register(Gauge, name, documentation, labels, collect=collect)
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labels, buckets=buckets)
+
+    def _register(self, cls, name: str, documentation: str, labels: Sequence[str], **kwargs) -> Any:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, documentation, labels, **kwargs)
+            metric._init_unlabelled()
+        elif not isinstance(metric, cls) or metric.label_names != tuple(labels):
+            raise ValueError(f"Metric {name} already registered as a different {metric.kind}")
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            metric.render(lines)
+        lines.append("")
+        return "\n".join(lines)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+# Process-wide registry, rendered by GET /metrics
+METRICS = MetricsRegistry()
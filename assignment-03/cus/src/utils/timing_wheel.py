@@ -0,0 +1,189 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Each level has 2**SLOT_BITS slots; level L slots span 2**(SLOT_BITS * L) ticks
+SLOT_BITS = 8
+SLOTS = 1 << SLOT_BITS
+SLOT_MASK = SLOTS - 1
+LEVELS = 4  # 2**32 ticks, i.e. ~49 days at 1 ms per tick
+
+
+class Timer:
+    """Handle of a scheduled callback, returned by TimingWheel.schedule."""
+
+    __slots__ = ("deadline", "callback", "args", "_slot", "_level", "_index")
+
+    def __init__(self, deadline: int, callback: Callable[..., Any], args: Tuple[Any, ...]):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self._slot: Optional[Dict["Timer", None]] = None
+        self._level = -1
+        self._index = -1
+
+    @property
+    def active(self) -> bool:
+        return self._slot is not None
+
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel (Varghese & Lauck), driven by integer ticks.
+
+    Timers go into the level whose slot span covers their distance from the
+    current tick: level 0 slots hold exact deadlines, upper level slots are
+    redistributed ("cascaded") to the lower levels when the wheel reaches
+    them. Scheduling and cancelling are O(1); an occupancy bitmap per level
+    lets advance() and next_tick() jump over empty slots instead of visiting
+    every tick. Deadlines beyond the top level wait in an overflow set.
+    """
+
+    def __init__(self, now: int = 0):
+        """
+        :param now: Current tick; timers fire when the wheel is advanced past their deadline.
+        """
+        self._now = now
+        self._wheels: List[List[Dict[Timer, None]]] = [[{} for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self._occupied = [0] * LEVELS   # bit i set if slot i of the level is non-empty
+        self._overflow: Dict[Timer, None] = {}
+        self._size = 0
+
+    @property
+    def now(self) -> int:
+        return self._now
+
+    def __len__(self) -> int:
+        return self._size
+
+    def schedule(self, deadline: int, callback: Callable[..., Any], *args: Any) -> Timer:
+        """
+        Run callback(*args) once the wheel is advanced to `deadline`.
+        Deadlines not after the current tick fire on the next tick.
+        """
+        timer = Timer(max(deadline, self._now + 1), callback, args)
+        self._place(timer)
+        self._size += 1
+        return timer
+
+    def cancel(self, timer: Timer) -> bool:
+        """Cancel a pending timer. Returns False if it already fired or was cancelled."""
+        slot = timer._slot
+        if slot is None:
+            return False
+        del slot[timer]
+        if not slot and timer._level >= 0:
+            self._occupied[timer._level] &= ~(1 << timer._index)
+        timer._slot = None
+        self._size -= 1
+        return True
+
+    def _place(self, timer: Timer):
+        deadline = timer.deadline
+        now = self._now
+        for level in range(LEVELS):
+            shift = SLOT_BITS * (level + 1)
+            if deadline >> shift == now >> shift:
+                # Same rotation of the level above: fits in this level
+                index = (deadline >> (SLOT_BITS * level)) & SLOT_MASK
+                slot = self._wheels[level][index]
+                slot[timer] = None
+                self._occupied[level] |= 1 << index
+                timer._slot, timer._level, timer._index = slot, level, index
+                return
+        self._overflow[timer] = None
+        timer._slot, timer._level, timer._index = self._overflow, -1, -1
+
+    def next_tick(self) -> Optional[int]:
+        """
+        Next tick at which advance() has work to do: the exact deadline of the
+        earliest level 0 timer, or the start of the upper slot to cascade.
+        None if no timer is pending.
+        """
+        if not self._size:
+            return None
+        now = self._now
+        best: Optional[int] = None
+        for level in range(LEVELS):
+            bits = self._occupied[level]
+            if not bits:
+                continue
+            shift = SLOT_BITS * level
+            current = (now >> shift) & SLOT_MASK
+            ahead = bits >> (current + 1)
+            if not ahead:
+                continue
+            index = current + 1 + ((ahead & -ahead).bit_length() - 1)
+            # Start of that slot within the current rotation of the level above
+            tick = ((now >> (shift + SLOT_BITS)) << (shift + SLOT_BITS)) | (index << shift)
+            if best is None or tick < best:
+                best = tick
+        if self._overflow:
+            top = SLOT_BITS * LEVELS
+            tick = ((now >> top) + 1) << top
+            if best is None or tick < best:
+                best = tick
+        return best
+
+    def advance(self, now: int) -> int:
+        """
+        Move the wheel to tick `now`, running every timer whose deadline is reached.
+        Callbacks may schedule or cancel timers. Returns the number of timers fired.
+
+        :param now: Current tick, ticks in the past are ignored.
+        """
+        fired = 0
+        while True:
+            tick = self.next_tick()
+            if tick is None or tick > now:
+                break
+            fired += self._process(tick)
+        if now > self._now:
+            self._now = now
+        return fired
+
+    def _process(self, tick: int) -> int:
+        self._now = tick
+        due: List[Timer] = []
+        # Cascade the upper slots starting at this tick, highest level first
+        if self._overflow and tick & ((1 << (SLOT_BITS * LEVELS)) - 1) == 0:
+            due.extend(self._redistribute(self._overflow))
+        for level in range(LEVELS - 1, 0, -1):
+            shift = SLOT_BITS * level
+            if tick & ((1 << shift) - 1):
+                continue
+            index = (tick >> shift) & SLOT_MASK
+            if self._occupied[level] >> index & 1:
+                self._occupied[level] &= ~(1 << index)
+                due.extend(self._redistribute(self._wheels[level][index]))
+
+        index = tick & SLOT_MASK
+        slot = self._wheels[0][index]
+        if slot:
+            self._occupied[0] &= ~(1 << index)
+            due.extend(slot)
+            slot.clear()
+
+        for timer in due:
+            timer._slot = None
+            self._size -= 1
+        for timer in due:
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                logger.exception(f"Timer callback {timer.callback!r} failed: {e}")
+        return len(due)
+
+    def _redistribute(self, slot: Dict[Timer, None]) -> List[Timer]:
+        """Re-place the timers of a slot relative to the current tick; return those already due."""
+        timers = list(slot)
+        slot.clear()
+        due = []
+        for timer in timers:
+            if timer.deadline <= self._now:
+                due.append(timer)
+            else:
+                self._place(timer)
+        return due
@@ -0,0 +1,168 @@
+from collections import OrderedDict
+from typing import Dict, Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+SEPARATOR = "/"
+SINGLE_LEVEL = "+"
+MULTI_LEVEL = "#"
+
+# Topics kept in the lookup cache, least recently matched evicted first
+_CACHE_LIMIT = 1 << 12
+
+
+def is_wildcard(topic_filter: str) -> bool:
+    """Return True if the filter contains MQTT wildcards (+ or #)."""
+    return SINGLE_LEVEL in topic_filter or MULTI_LEVEL in topic_filter
+
+
+def join_topic(*levels: str) -> str:
+    """Build a topic from its levels, e.g. join_topic("mode", "t1") == "mode/t1"."""
+    return SEPARATOR.join(levels)
+
+
+def fill_wildcards(template: str, captures: Tuple[str, ...]) -> str:
+    """
+    Replace the wildcard levels of a topic template with captured levels, in order.
+    E.g. fill_wildcards("level_in/+", ("t1",)) == "level_in/t1".
+
+    :raises ValueError: If the template has more wildcards than captures.
+    """
+    if not is_wildcard(template):
+        return template
+    levels = template.split(SEPARATOR)
+    remaining = iter(captures)
+    try:
+        filled = [next(remaining) if level in (SINGLE_LEVEL, MULTI_LEVEL) else level for level in levels]
+    except StopIteration:
+        raise ValueError(f"Not enough captured levels {captures} for template '{template}'") from None
+    return SEPARATOR.join(filled)
+
+
+def validate_filter(topic_filter: str) -> List[str]:
+    """
+    Split an MQTT-style filter into levels, checking wildcard placement.
+
+    :param topic_filter: Filter such as "tank/+/level" or "site/#".
+    :return: The filter levels.
+    :raises ValueError: If a wildcard does not occupy a whole level or '#' is not last.
+    """
+    if not topic_filter:
+        raise ValueError("Topic filter must not be empty")
+    levels = topic_filter.split(SEPARATOR)
+    for i, level in enumerate(levels):
+        if level == MULTI_LEVEL:
+            if i != len(levels) - 1:
+                raise ValueError(f"'#' must be the last level in filter '{topic_filter}'")
+        elif level != SINGLE_LEVEL and (SINGLE_LEVEL in level or MULTI_LEVEL in level):
+            raise ValueError(f"Wildcards must occupy a whole level in filter '{topic_filter}'")
+    return levels
+
+
+class _Node(Generic[T]):
+    __slots__ = ("children", "single", "multi", "values")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node[T]"] = {}
+        self.single: Optional["_Node[T]"] = None   # '+' child
+        self.multi: List[T] = []                   # values of a trailing '#'
+        self.values: List[T] = []                  # values of filters ending here
+
+
+class TopicMatcher(Generic[T]):
+    """
+    Trie of MQTT-style topic filters ('+' matches one level, '#' the rest).
+
+    A lookup walks at most one exact and one '+' branch per level, so its cost
+    depends on the topic depth rather than on the number of filters.
+    Results are cached per concrete topic (bounded LRU) until the filter set changes.
+    Each match carries the captured wildcard levels, e.g. matching
+    "tank/+/level" against "tank/t1/level" captures ("t1",).
+    """
+
+    def __init__(self):
+        self._root: _Node[T] = _Node()
+        self._size = 0
+        self._cache: "OrderedDict[str, Tuple[Tuple[T, Tuple[str, ...]], ...]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, topic_filter: str, value: T):
+        """Register a value under a topic filter."""
+        node = self._root
+        for level in validate_filter(topic_filter):
+            if level == MULTI_LEVEL:
+                node.multi.append(value)
+                break
+            if level == SINGLE_LEVEL:
+                if node.single is None:
+                    node.single = _Node()
+                node = node.single
+            else:
+                node = node.children.setdefault(level, _Node())
+        else:
+            node.values.append(value)
+        self._size += 1
+        self._cache.clear()
+
+    def remove(self, topic_filter: str, value: T) -> bool:
+        """Unregister a value. Returns False if it was not registered under the filter."""
+        node = self._root
+        for level in validate_filter(topic_filter):
+            if level == MULTI_LEVEL:
+                bucket = node.multi
+                break
+            node = node.single if level == SINGLE_LEVEL else node.children.get(level)
+            if node is None:
+                return False
+        else:
+            bucket = node.values
+
+        if value not in bucket:
+            return False
+        bucket.remove(value)
+        self._size -= 1
+        self._cache.clear()
+        return True
+
+    def match(self, topic: str) -> Tuple[Tuple[T, Tuple[str, ...]], ...]:
+        """
+        Return every (value, captures) pair whose filter matches the topic.
+        Topics starting with '$' are not matched by leading wildcards (MQTT rule).
+        """
+        cached = self._cache.get(topic)
+        if cached is not None:
+            self._cache.move_to_end(topic)
+            return cached
+
+        levels = topic.split(SEPARATOR)
+        results: List[Tuple[T, Tuple[str, ...]]] = []
+        system_topic = topic.startswith("$")
+        # Iterative walk: (node, depth, captures)
+        stack: List[Tuple[_Node[T], int, Tuple[str, ...]]] = [(self._root, 0, ())]
+        while stack:
+            node, depth, captures = stack.pop()
+            wildcards_allowed = depth > 0 or not system_topic
+
+            if node.multi and wildcards_allowed:
+                # '#' also matches the parent level itself ("site/#" matches "site")
+                rest = (SEPARATOR.join(levels[depth:]),)
+                results.extend((value, captures + rest) for value in node.multi)
+
+            if depth == len(levels):
+                results.extend((value, captures) for value in node.values)
+                continue
+
+            level = levels[depth]
+            child = node.children.get(level)
+            if child is not None:
+                stack.append((child, depth + 1, captures))
+            if node.single is not None and wildcards_allowed:
+                stack.append((node.single, depth + 1, captures + (level,)))
+
+        result = tuple(results)
+        if len(self._cache) >= _CACHE_LIMIT:
+            self._cache.popitem(last=False)
+        self._cache[topic] = result
+        return result
@@ -0,0 +1,115 @@
+"""
+End-to-end latency tracing of the control loop (sensor reading -> actuator).
+
+A Trace is created where a reading enters the system and made current in a
+ContextVar. The event loop dispatch is synchronous from the ingress queue
+down to the listeners (TankService, SerialService...), so every stage on
+that path sees the trace without it being passed around; the stages that
+continue later (e.g. the serial write) keep a reference and finish it.
+"""
+import itertools
+import time
+from collections import deque
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.metrics import METRICS
+
+# Trace of the event being handled, if any
+CURRENT_TRACE: ContextVar[Optional['Trace']] = ContextVar("cus_trace", default=None)
+
+_STAGE_SECONDS = METRICS.histogram(
+    "cus_trace_stage_seconds", "Time from a sensor reading's arrival to each stage of its handling", ("stage",))
+
+_ids = itertools.count(1)
+
+
+class Trace:
+    """Stages of one event: (name, seconds since its arrival)."""
+
+    __slots__ = ("trace_id", "origin", "received_at", "start", "stages", "finished")
+
+    def __init__(self, origin: str):
+        """
+        :param origin: Where the event came from (e.g. the MQTT topic).
+        """
+        self.trace_id = next(_ids)
+        self.origin = origin
+        self.received_at = time.time()
+        self.start = perf_counter()
+        self.stages: List[Tuple[str, float]] = [("received", 0.0)]
+        self.finished = False
+
+    def mark(self, stage: str):
+        self.stages.append((stage, perf_counter() - self.start))
+
+    @property
+    def duration(self) -> float:
+        return self.stages[-1][1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.trace_id,
+            "origin": self.origin,
+            "received_at": self.received_at,
+            "duration": self.duration,
+            "stages": [{"stage": stage, "elapsed": elapsed} for stage, elapsed in self.stages],
+        }
+
+
+class Tracer:
+    """Keeps the most recent finished traces and summarizes their stages."""
+
+    def __init__(self, capacity: int = 1024):
+        """
+        :param capacity: Finished traces kept for the percentiles and the debug endpoint.
+        """
+        self._finished: Deque[Trace] = deque(maxlen=capacity)
+
+    def start(self, origin: str) -> Trace:
+        return Trace(origin)
+
+    def finish(self, trace: Trace, stage: str):
+        """Record the final stage of a trace (only the first call counts)."""
+        if trace.finished:
+            return
+        trace.mark(stage)
+        trace.finished = True
+        self._finished.append(trace)
+        for name, elapsed in trace.stages[1:]:
+            _STAGE_SECONDS.labels(name).observe(elapsed)
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """The last `limit` finished traces, newest first."""
+        traces = list(self._finished)[-limit:] if limit > 0 else []
+        return [trace.to_dict() for trace in reversed(traces)]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        { stage: {count, p50, p99, max} } of the seconds from arrival to each
+        stage, over the kept traces (stages in order of first appearance).
+        """
+        samples: Dict[str, List[float]] = {}
+        for trace in self._finished:
+            for stage, elapsed in trace.stages[1:]:
+                samples.setdefault(stage, []).append(elapsed)
+        summary = {}
+        for stage, values in samples.items():
+            p50, p99 = np.percentile(values, (50, 99))
+            summary[stage] = {"count": len(values), "p50": float(p50), "p99": float(p99), "max": max(values)}
+        return summary
+
+
+def mark(stage: str) -> Optional[Trace]:
+    """Record a stage of the current trace, if any; returns it."""
+    trace = CURRENT_TRACE.get()
+    if trace is not None:
+        trace.mark(stage)
+    return trace
+
+
+# Process-wide tracer, exposed by GET /traces
+TRACER = Tracer()
@@ -0,0 +1,101 @@
+"""
+WCS serial messages through every codec: encoded as the Arduino sends them,
+decoded by the SerialService and applied by the tank FSM.
+
+Usage (from the cus folder):
+    python -m pytest tests
+"""
+import asyncio
+import struct
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from models.codecs import serial_codecs  # noqa: E402
+from services.event_bus import EventBus  # noqa: E402
+from services.serial_service import FRAME_START, SerialService  # noqa: E402
+from services.tank_registry import TankRegistry  # noqa: E402
+from services.timer_service import TimerService  # noqa: E402
+from utils.topic_matcher import join_topic  # noqa: E402
+from config import DEFAULT_TANK_ID, LEVEL_IN_TOPIC, OPENING_TOPIC  # noqa: E402
+
+
+class FakePort:
+    """The bytes the WCS wrote, read by SerialService._read_serial_data."""
+
+    def __init__(self, data: bytes):
+        self._data = bytearray(data)
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self._data)
+
+    def read(self, size: int) -> bytes:
+        data = bytes(self._data[:size])
+        del self._data[:size]
+        return data
+
+
+def _frame(codec, message: dict) -> bytes:
+    payload = codec.encode(message)
+    return bytes((FRAME_START, len(payload))) + payload if codec.binary else payload + b"\n"
+
+
+@pytest.mark.parametrize("name", ["json", "struct"])
+def test_wcs_messages_drive_the_fsm(name):
+    async def scenario():
+        bus = EventBus()
+        timers = TimerService(bus)
+        await timers.start()
+        registry = TankRegistry(bus, timers=timers)
+        registry.subscribe()
+        valve = []
+        bus.subscribe(join_topic(OPENING_TOPIC, DEFAULT_TANK_ID), lambda opening: valve.append(opening))
+        # A first reading registers the tank (AUTOMATIC); pot commands are applied at once
+        bus.publish(join_topic(LEVEL_IN_TOPIC, DEFAULT_TANK_ID), reading={"level": 0.1, "timestamp": 1})
+        tank = registry.get(DEFAULT_TANK_ID)
+        tank._pot_window = 0.0
+
+        serial = SerialService("wcs", 115200, bus, codec=name)
+        incoming, _ = serial_codecs(name)
+        # Button pressed (AUTOMATIC -> MANUAL), then the potentiometer moved
+        serial._serial = FakePort(
+            _frame(incoming, {"pot": {"val": 0, "who": "wcs"}, "btn": True})
+            + _frame(incoming, {"pot": {"val": 42, "who": "wcs"}, "btn": False})
+        )
+        serial._read_serial_data()
+        await timers.stop()
+        await bus.close()
+        return tank.fsm.state.get_state_name().value, valve, serial._serial
+
+    state, valve, port = asyncio.run(scenario())
+    assert state == "MANUAL"
+    assert valve[-1] == 42
+    assert port is not None  # the port is still in use
+
+
+def test_struct_pot_decodes_to_the_json_shape():
+    incoming, _ = serial_codecs("struct")
+    assert incoming.decode(struct.pack("<h?", 512, True)) == {"pot": {"val": 512, "who": "wcs"}, "btn": True}
+
+
+@pytest.mark.parametrize("name, payload", [
+    ("struct", struct.pack("<h?h?", 1, True, 2, False)),  # two records in one frame
+    ("json", b"[1, 2]"),
+    ("json", b"7"),
+])
+def test_messages_that_are_not_one_object_are_rejected(name, payload):
+    async def scenario():
+        serial = SerialService("wcs-invalid", 115200, EventBus(), codec=name)
+        incoming, _ = serial_codecs(name)
+        data = bytes((FRAME_START, len(payload))) + payload if incoming.binary else payload + b"\n"
+        serial._serial = FakePort(data)
+        serial._read_serial_data()
+        return serial
+
+    serial = asyncio.run(scenario())
+    assert serial._serial is not None  # invalid message dropped, the port is still in use
+    assert serial._invalid_lines.value >= 1
@@ -0,0 +1,46 @@
+"""
+POST /pot and /change payloads are validated like the commands of a batch.
+
+Usage (from the cus folder):
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services.commands import DEFAULT_TANK_ID, MODE_CHANGE_TOPIC, POT_TOPIC, CommandError, CommandProcessor  # noqa: E402
+from services.event_bus import EventBus  # noqa: E402
+
+
+def _processor():
+    bus = EventBus()
+    published = []
+    bus.subscribe(f"{POT_TOPIC}/+", lambda pot, wildcards: published.append(("pot", wildcards[0], pot)))
+    bus.subscribe(f"{MODE_CHANGE_TOPIC}/+", lambda btn, wildcards: published.append(("change", wildcards[0], btn)))
+    return CommandProcessor(bus), published
+
+
+@pytest.mark.parametrize("kind, payload", [
+    ("pot", {"pot": 10, "tank": "a/b"}),
+    ("pot", {"pot": 10, "tank": "+"}),
+    ("pot", {"pot": 10, "tank": ""}),
+    ("pot", {"tank": "t1"}),
+    ("change", {"btn": "x"}),
+    ("change", {"btn": False}),
+    ("change", {"btn": True, "tank": "#"}),
+])
+def test_invalid_single_commands_are_rejected(kind, payload):
+    processor, published = _processor()
+    with pytest.raises(CommandError):
+        processor.submit(kind, payload)
+    assert published == []
+
+
+def test_valid_single_commands_are_published():
+    processor, published = _processor()
+    assert processor.submit("pot", {"pot": 42, "tank": "t1"}) == {"status": "success", "sent": 42}
+    assert processor.submit("change", {"btn": True}) == {"status": "success", "sent": True}
+    assert published == [("pot", "t1", 42), ("change", DEFAULT_TANK_ID, True)]
@@ -0,0 +1,43 @@
+"""
+LevelStore range queries across segment boundaries.
+
+Usage (from the cus folder):
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from models.level_store import LevelStore  # noqa: E402
+
+
+def _store(directory, timestamps, segment_records=4) -> LevelStore:
+    store = LevelStore(str(directory), segment_records=segment_records, index_stride=2)
+    for timestamp in timestamps:
+        store.append(float(timestamp), float(timestamp))
+    return store
+
+
+def test_query_includes_equal_timestamps_ending_the_previous_segment(tmp_path):
+    store = _store(tmp_path, [1, 2, 3, 5, 5, 6, 7, 8])
+    levels, timestamps = store.query(5)
+    assert timestamps.tolist() == [5, 5, 6, 7, 8]
+    assert store.query(5, 5)[1].tolist() == [5, 5]
+    assert store.query(5, limit=10)[1].tolist() == [5, 5, 6, 7, 8]
+    store.close()
+
+
+def test_reopened_store_keeps_the_order_after_an_empty_trailing_segment(tmp_path):
+    store = _store(tmp_path, [8, 9, 10, 11])
+    store.close()
+    (tmp_path / "00000001.seg").touch()  # rolled over, then crashed before the first flush
+
+    store = LevelStore(str(tmp_path), segment_records=4, index_stride=2)
+    with pytest.raises(ValueError):
+        store.append(3.0, 3.0)
+    store.append(12.0, 12.0)
+    assert store.query()[1].tolist() == [8, 9, 10, 11, 12]
+    store.close()
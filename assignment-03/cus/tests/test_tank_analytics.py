@@ -0,0 +1,42 @@
+"""
+Level analytics follow the device timestamps, not the arrival times.
+
+Usage (from the cus folder):
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services.event_bus import EventBus  # noqa: E402
+from services.tank_registry import TankRegistry  # noqa: E402
+from utils.clock import VirtualClock  # noqa: E402
+
+# One unit every 10 ms of device time: 100 units/s
+READINGS = [{"level": 10.0 + i, "timestamp": 5_000 + 10 * i} for i in range(40)]
+
+
+def _analytics(batched: bool) -> dict:
+    clock = VirtualClock(1_000.0)
+    bus = EventBus()
+    registry = TankRegistry(bus, clock=clock)
+    registry.subscribe()
+    published = []
+    bus.subscribe("analytics/+", lambda analytics, wildcards: published.append(analytics))
+    bus.publish("level_in/default", reading=READINGS[0])
+    if batched:
+        clock.advance(0.7)
+        bus.publish("level_in/default", readings=READINGS[1:])
+    else:
+        for i, reading in enumerate(READINGS[1:]):
+            clock.advance(0.05 if i % 2 else 0.001)  # network jitter
+            bus.publish("level_in/default", reading=reading)
+    return published[-1]
+
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_rate_of_rise_uses_device_time(batched):
+    assert _analytics(batched)["rate_of_rise"] == pytest.approx(100.0)
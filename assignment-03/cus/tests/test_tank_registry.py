@@ -0,0 +1,32 @@
+"""
+Events of tanks the registry cannot hold are logged once per tank id.
+
+Usage (from the cus folder):
+    python -m pytest tests
+"""
+import logging
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services.event_bus import EventBus  # noqa: E402
+from services.tank_registry import TankRegistry  # noqa: E402
+
+READING = {"level": 50.0, "timestamp": 1_000}
+
+
+def test_tank_limit_warns_once_per_tank(caplog):
+    bus = EventBus()
+    registry = TankRegistry(bus, max_tanks=1)
+    registry.subscribe()
+    with caplog.at_level(logging.WARNING, logger="services.tank_registry"):
+        for _ in range(100):
+            for tank_id in ("t1", "t2", "t3"):
+                bus.publish(f"level_in/{tank_id}", reading=READING)
+            bus.publish("pot/t4", pot={"val": 10, "who": "wcs"})
+
+    assert len(registry) == 1
+    warnings = [record.getMessage() for record in caplog.records if record.name == "services.tank_registry"]
+    assert len(warnings) == 3
+    assert all(any(f"'{tank_id}'" in message for message in warnings) for tank_id in ("t2", "t3", "t4"))
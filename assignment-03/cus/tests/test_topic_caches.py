@@ -0,0 +1,31 @@
+"""
+Per-topic caches of the bus and of the topic matcher stay bounded.
+
+Usage (from the cus folder):
+    python -m pytest tests
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services import event_bus  # noqa: E402
+from services.event_bus import EventBus  # noqa: E402
+from utils import topic_matcher  # noqa: E402
+
+
+def test_unknown_topics_do_not_grow_the_caches():
+    bus = EventBus()
+    received = []
+    bus.subscribe("level_in/+", lambda wildcards, **kwargs: received.append(wildcards))
+    bus.subscribe("level_in/t1", lambda **kwargs: None)
+
+    for i in range(3 * event_bus._ROUTE_CACHE_LIMIT):
+        bus.publish(f"level_in/x{i}")
+        # A hot topic stays cached while unknown ones come and go
+        bus.publish("level_in/t1")
+
+    assert len(received) == 6 * event_bus._ROUTE_CACHE_LIMIT
+    assert len(bus._routes) <= event_bus._ROUTE_CACHE_LIMIT
+    assert len(bus._matcher._cache) <= topic_matcher._CACHE_LIMIT
+    assert "level_in/t1" in bus._routes